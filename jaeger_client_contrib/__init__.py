@@ -11,4 +11,5 @@ __version__ = '0.1.2.dev0'
 
 from .tracer import Tracer  # noqa
 from .config import Config  # noqa
-from .sampler import ProbabilisticSampler  # noqa
+from .sampler import (AdaptiveSampler, FileSampler,  # noqa
+                      PerOperationSampler, ProbabilisticSampler)
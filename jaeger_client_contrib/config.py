@@ -5,21 +5,35 @@ import threading
 
 import opentracing
 from jaeger_client import config as base_config
-from jaeger_client import ConstSampler, RateLimitingSampler
-from jaeger_client.constants import (SAMPLER_TYPE_CONST,
-                                     SAMPLER_TYPE_PROBABILISTIC,
-                                     SAMPLER_TYPE_RATE_LIMITING)
+from jaeger_client import ConstSampler
 from jaeger_client.reporter import CompositeReporter, LoggingReporter
 from jaeger_client.utils import get_boolean
 from opentracing import Format
 
 from . import Tracer
-from .sampler import ProbabilisticSampler
+from .id_generator import TraceIdGenerator
+from .sampler import AdaptiveSampler, FileSampler, create_sampler
 from .zipkin.codecs import B3Codec
-from .zipkin.reporter import ZipkinReporter
+from .zipkin.agent import (DEFAULT_AGENT_JAEGER_PORT, DEFAULT_AGENT_PORT,
+                           DEFAULT_MAX_PACKET_SIZE, FORMAT_JAEGER,
+                           FORMAT_ZIPKIN, PROTOCOL_BINARY, PROTOCOL_COMPACT,
+                           AgentSender)
+from .zipkin.batching import AdaptiveBatching
+from .zipkin.encoding import (ENCODING_AGENT, ENCODING_AGENT_BINARY,
+                              ENCODING_AGENT_JAEGER, ENCODING_THRIFT)
+from .zipkin.http_transport import HTTPTransport
+from .zipkin.reporter import ThreadedZipkinReporter, ZipkinReporter
+from .zipkin.spool import DEFAULT_SPOOL_MAX_BYTES, Spool
+from .zipkin.tail_sampling import (DEFAULT_MAX_SPANS,
+                                   DEFAULT_MAX_SPANS_PER_TRACE,
+                                   DEFAULT_MAX_TRACE_AGE, DEFAULT_MAX_TRACES,
+                                   TailSamplingReporter)
 
 logger = logging.getLogger('jaeger_tracing')
 
+PROPAGATION_B3 = 'b3'
+PROPAGATION_B3_SINGLE = 'b3_single'
+
 
 class Config(base_config.Config):
     _initialized = False
@@ -32,25 +46,188 @@ class Config(base_config.Config):
 
     @property
     def sampler(self):
-        sampler_config = self.config.get('sampler', {})
-        sampler_type = sampler_config.get('type', None)
-        sampler_param = sampler_config.get('param', None)
-        if not sampler_type:
+        return create_sampler(self.config.get('sampler', {}))
+
+    @property
+    def reporter_max_batch_bytes(self):
+        max_batch_bytes = self.config.get('reporter_max_batch_bytes', None)
+        return int(max_batch_bytes) if max_batch_bytes else None
+
+    @property
+    def reporter_encoding(self):
+        return self.config.get('reporter_encoding', ENCODING_THRIFT)
+
+    @property
+    def reporter_compression(self):
+        return self.config.get('reporter_compression', None)
+
+    @property
+    def reporter_compression_level(self):
+        return int(self.config.get('reporter_compression_level', 6))
+
+    @property
+    def reporter_compression_min_bytes(self):
+        return int(self.config.get('reporter_compression_min_bytes', 1024))
+
+    @property
+    def reporter_collector_url(self):
+        return self.config.get('reporter_collector_url', None)
+
+    @property
+    def reporter_http_max_connections(self):
+        return int(self.config.get('reporter_http_max_connections', 2))
+
+    @property
+    def reporter_http_timeout(self):
+        return float(self.config.get('reporter_http_timeout', 5.0))
+
+    @property
+    def reporter_agent_host(self):
+        return self.config.get('reporter_agent_host', None)
+
+    @property
+    def reporter_agent_format(self):
+        span_format = self.config.get('reporter_agent_format', FORMAT_ZIPKIN)
+        if span_format not in (FORMAT_ZIPKIN, FORMAT_JAEGER):
+            raise ValueError('Unknown agent span format %s' % span_format)
+        return span_format
+
+    @property
+    def reporter_agent_port(self):
+        default_port = DEFAULT_AGENT_JAEGER_PORT \
+            if self.reporter_agent_format == FORMAT_JAEGER \
+            else DEFAULT_AGENT_PORT
+        return int(self.config.get('reporter_agent_port', default_port))
+
+    @property
+    def reporter_agent_protocol(self):
+        protocol = self.config.get('reporter_agent_protocol', PROTOCOL_COMPACT)
+        if protocol not in (PROTOCOL_COMPACT, PROTOCOL_BINARY):
+            raise ValueError('Unknown agent protocol %s' % protocol)
+        return protocol
+
+    @property
+    def reporter_agent_max_packet_size(self):
+        return int(self.config.get('reporter_agent_max_packet_size',
+                                   DEFAULT_MAX_PACKET_SIZE))
+
+    @property
+    def reporter_spool_dir(self):
+        return self.config.get('reporter_spool_dir', None)
+
+    @property
+    def reporter_spool_max_bytes(self):
+        return int(self.config.get('reporter_spool_max_bytes',
+                                   DEFAULT_SPOOL_MAX_BYTES))
+
+    @property
+    def reporter_spool_replay_rate(self):
+        return float(self.config.get('reporter_spool_replay_rate', 10))
+
+    @property
+    def reporter_priority_shedding(self):
+        return get_boolean(
+            self.config.get('reporter_priority_shedding', False), False)
+
+    @property
+    def reporter_adaptive_batching(self):
+        return get_boolean(
+            self.config.get('reporter_adaptive_batching', False), False)
+
+    @property
+    def reporter_max_batch_size(self):
+        return int(self.config.get('reporter_max_batch_size',
+                                   max(1, self.reporter_queue_size // 2)))
+
+    @property
+    def reporter_min_flush_interval(self):
+        return float(self.config.get(
+            'reporter_min_flush_interval',
+            min(0.1, self.reporter_flush_interval)))
+
+    @property
+    def reporter_batching(self):
+        """
+        With reporter_adaptive_batching, batches are sized between
+        reporter_batch_size and reporter_max_batch_size, and partial batches
+        flushed after between reporter_min_flush_interval and
+        reporter_flush_interval, depending on traffic. Batches grow to half
+        of reporter_queue_size at most, so that they are sent before the
+        queue fills up.
+        """
+        if not self.reporter_adaptive_batching:
             return None
-        elif sampler_type == SAMPLER_TYPE_CONST:
-            return ConstSampler(decision=get_boolean(sampler_param, False))
-        elif sampler_type == SAMPLER_TYPE_PROBABILISTIC:
-            return ProbabilisticSampler(rate=float(sampler_param))
-        elif sampler_type in [SAMPLER_TYPE_RATE_LIMITING, 'rate_limiting']:
-            return RateLimitingSampler(max_traces_per_second=float(sampler_param))
+        min_batch_size = self.reporter_batch_size
+        return AdaptiveBatching(
+            min_batch_size=min_batch_size,
+            max_batch_size=max(min_batch_size, min(
+                self.reporter_max_batch_size,
+                self.reporter_queue_size // 2)),
+            min_flush_interval=self.reporter_min_flush_interval,
+            max_flush_interval=self.reporter_flush_interval)
 
-        raise ValueError('Unknown sampler type %s' % sampler_type)
+    @property
+    def tail_sampling(self):
+        """
+        Keyword arguments of TailSamplingReporter from the 'tail_sampling'
+        section, or None if it is missing or has enabled set to false.
+        """
+        tail_config = self.config.get('tail_sampling', None)
+        if tail_config is None or \
+                not get_boolean(tail_config.get('enabled', True), True):
+            return None
+        latency_threshold = tail_config.get('latency_threshold', None)
+        return dict(
+            latency_threshold=float(latency_threshold)
+            if latency_threshold is not None else None,
+            probability=float(tail_config.get('probability', 0.0)),
+            max_traces=int(tail_config.get('max_traces',
+                                           DEFAULT_MAX_TRACES)),
+            max_spans=int(tail_config.get('max_spans', DEFAULT_MAX_SPANS)),
+            max_spans_per_trace=int(tail_config.get(
+                'max_spans_per_trace', DEFAULT_MAX_SPANS_PER_TRACE)),
+            max_trace_age=float(tail_config.get('max_trace_age',
+                                                DEFAULT_MAX_TRACE_AGE)))
+
+    @property
+    def propagation(self):
+        """
+        'b3' to inject X-B3-* headers, or 'b3_single' for the b3 header
+        alone. Both are extracted either way.
+        """
+        propagation = self.config.get('propagation', PROPAGATION_B3)
+        if propagation not in (PROPAGATION_B3, PROPAGATION_B3_SINGLE):
+            raise ValueError('Unknown propagation %s' % propagation)
+        return propagation
+
+    @property
+    def generate_128bit_trace_id(self):
+        return get_boolean(self.config.get('generate_128bit_trace_id', True), True)
+
+    @property
+    def time_ordered_trace_id(self):
+        return get_boolean(self.config.get('time_ordered_trace_id', False), False)
+
+    @property
+    def trace_id_generator(self):
+        return TraceIdGenerator(trace_id_128bit=self.generate_128bit_trace_id,
+                                time_ordered=self.time_ordered_trace_id)
 
     def initialize_tracer(self, transport_handler=None, io_loop=None):  # pragma: nocover
         """
         Initialize Jaeger Tracer based on the passed `jaeger_client.Config`.
         Save it to `opentracing.tracer` global variable.
         Only the first call to this method has any effect.
+
+        Spans are reported from io_loop if given, otherwise from a background
+        thread. Without a transport_handler, spans are posted to
+        reporter_collector_url if it is configured, or else sent to the
+        jaeger-agent at reporter_agent_host over UDP, as Zipkin or Jaeger
+        spans according to reporter_agent_format. Batches that fail to send
+        are kept in a spool under reporter_spool_dir, if it is configured,
+        which processes such as prefork workers can share.
+        With a tail_sampling section, the spans of each trace are held back
+        until it is decided whether to keep them.
         """
 
         with Config._initialized_lock:
@@ -63,16 +240,75 @@ class Config(base_config.Config):
                 sampler = ConstSampler(True)
             logger.info('Using sampler %s', sampler)
 
-            reporter = ZipkinReporter(
+            encoding = self.reporter_encoding
+            max_batch_bytes = self.reporter_max_batch_bytes
+            compression = self.reporter_compression
+            if transport_handler is None and self.reporter_collector_url:
+                transport_handler = HTTPTransport(
+                    url=self.reporter_collector_url,
+                    encoding=encoding,
+                    io_loop=io_loop,
+                    max_connections=self.reporter_http_max_connections,
+                    request_timeout=self.reporter_http_timeout,
+                    logger=logger,
+                    metrics_factory=self._metrics_factory,
+                    error_reporter=self.error_reporter
+                )
+            elif transport_handler is None and self.reporter_agent_host:
+                max_packet_size = self.reporter_agent_max_packet_size
+                transport_handler = AgentSender(
+                    host=self.reporter_agent_host,
+                    port=self.reporter_agent_port,
+                    max_packet_size=max_packet_size)
+                # one emitZipkinBatch or emitBatch call per datagram, Jaeger
+                # batches are always compact
+                if self.reporter_agent_format == FORMAT_JAEGER:
+                    encoding = ENCODING_AGENT_JAEGER
+                elif self.reporter_agent_protocol == PROTOCOL_BINARY:
+                    encoding = ENCODING_AGENT_BINARY
+                else:
+                    encoding = ENCODING_AGENT
+                max_batch_bytes = min(max_batch_bytes or max_packet_size,
+                                      max_packet_size)
+                compression = None
+
+            spool = None
+            if self.reporter_spool_dir:
+                spool = Spool(self.reporter_spool_dir,
+                              max_bytes=self.reporter_spool_max_bytes,
+                              metrics_factory=self._metrics_factory)
+
+            reporter_kwargs = dict(
                 transport_handler=transport_handler,
-                io_loop=io_loop,
                 queue_capacity=self.reporter_queue_size,
                 batch_size=self.reporter_batch_size,
                 flush_interval=self.reporter_flush_interval,
+                max_batch_bytes=max_batch_bytes,
+                encoding=encoding,
+                compression=compression,
+                compression_level=self.reporter_compression_level,
+                compression_min_bytes=self.reporter_compression_min_bytes,
+                spool=spool,
+                spool_replay_rate=self.reporter_spool_replay_rate,
+                priority_shedding=self.reporter_priority_shedding,
+                batching=self.reporter_batching,
                 logger=logger,
                 metrics_factory=self._metrics_factory,
                 error_reporter=self.error_reporter
             )
+            if io_loop is None:
+                # no IOLoop to run on, e.g. sync WSGI workers
+                reporter = ThreadedZipkinReporter(**reporter_kwargs)
+            else:
+                reporter = ZipkinReporter(io_loop=io_loop, **reporter_kwargs)
+            if isinstance(sampler, (AdaptiveSampler, FileSampler)):
+                sampler.reporter = reporter
+
+            tail_sampling = self.tail_sampling
+            if tail_sampling is not None:
+                reporter = TailSamplingReporter(
+                    reporter, metrics_factory=self._metrics_factory,
+                    **tail_sampling)
 
             if self.logging:
                 reporter = CompositeReporter(reporter, LoggingReporter(logger))
@@ -84,7 +320,8 @@ class Config(base_config.Config):
 
     def create_tracer(self, reporter, sampler):  # pragma: nocover
         extra_codecs = {
-            Format.HTTP_HEADERS: B3Codec(),
+            Format.HTTP_HEADERS: B3Codec(
+                single_header=self.propagation == PROPAGATION_B3_SINGLE),
         }
         return Tracer(
             service_name=self.service_name,
@@ -96,4 +333,5 @@ class Config(base_config.Config):
             debug_id_header=self.debug_id_header,
             extra_codecs=extra_codecs,
             tags=self.tags,
+            trace_id_generator=self.trace_id_generator,
         )
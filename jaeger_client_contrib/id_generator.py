@@ -0,0 +1,134 @@
+from __future__ import absolute_import
+
+import os
+import struct
+import threading
+import time
+import weakref
+
+__all__ = ('RandomIdPool', 'TraceIdGenerator')
+
+# pools to reset in a forked child, so that it never serves the same ids as
+# its parent
+_pools = weakref.WeakSet()
+# pools locked by the thread calling fork(), until it returns
+_forking = []
+
+
+def _lock_pools():
+    _forking[:] = list(_pools)
+    for pool in _forking:
+        pool._lock.acquire()
+
+
+def _unlock_pools():
+    for pool in _forking:
+        pool._lock.release()
+    del _forking[:]
+
+
+def _reset_pools():
+    # the only thread of the child, no other one can hold the old locks
+    for pool in list(_pools):
+        pool._reset()
+    del _forking[:]
+
+
+if hasattr(os, 'register_at_fork'):  # pragma: no cover
+    os.register_at_fork(before=_lock_pools, after_in_parent=_unlock_pools,
+                        after_in_child=_reset_pools)
+    _check_pid = False
+elif hasattr(threading, '_after_fork'):  # pragma: no cover
+    # before Python 3.7, os.fork() calls threading._after_fork() in the child
+    _threading_after_fork = threading._after_fork
+
+    def _after_fork():
+        _threading_after_fork()
+        _reset_pools()
+
+    threading._after_fork = _after_fork
+    _check_pid = False
+else:  # pragma: no cover
+    # no fork hooks, compare pids on every call instead
+    _check_pid = True
+
+
+class RandomIdPool(object):
+    """
+    Serves random 64 bit ids out of a block of os.urandom() entropy, instead
+    of making one os.urandom() syscall per id.
+
+    Ids are exactly as unpredictable as os.urandom(8) ones, since each id is
+    taken verbatim from the block and served only once. Thread-safe; the
+    buffered entropy is discarded in forked children.
+    """
+
+    def __init__(self, block_size=4096):
+        """
+        :param block_size: how many bytes of entropy to read at once,
+            rounded down to a multiple of 8
+        """
+        if block_size < 8:
+            raise ValueError('block_size must be at least 8 bytes')
+        self.block_size = block_size - block_size % 8
+        self._reset()
+        _pools.add(self)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._ids = []
+        self._pid = os.getpid()
+
+    def next_id(self):
+        """Returns a random 64 bit unsigned integer."""
+        with self._lock:
+            if _check_pid and self._pid != os.getpid():
+                self._ids = []
+                self._pid = os.getpid()
+            ids = self._ids
+            if not ids:
+                block = os.urandom(self.block_size)
+                ids.extend(struct.unpack('!%dQ' % (len(block) // 8), block))
+            return ids.pop()
+
+    def __str__(self):
+        return 'RandomIdPool(%s)' % self.block_size
+
+
+class TraceIdGenerator(object):
+    """
+    Generates trace ids whose low 64 bits are uniformly random, which is
+    what ProbabilisticSampler samples on.
+
+    128 bit ids get either a random high half, or, when time_ordered is set,
+    a high half that starts with the 32 bit epoch seconds (followed by 32
+    random bits), so that ids sort roughly by creation time.
+    """
+
+    def __init__(self, id_pool=None, trace_id_128bit=True, time_ordered=False):
+        """
+        :param id_pool: a RandomIdPool to draw random bits from
+        :param trace_id_128bit: whether to generate 128 bit trace ids
+            instead of 64 bit ones
+        :param time_ordered: whether the high half of 128 bit trace ids
+            is time-ordered
+        """
+        self.id_pool = id_pool or RandomIdPool()
+        self.trace_id_128bit = trace_id_128bit
+        self.time_ordered = time_ordered
+
+    def next_id(self):
+        """Returns a new trace id."""
+        lo = self.id_pool.next_id()
+        if not self.trace_id_128bit:
+            return lo
+        if self.time_ordered:
+            hi = (int(time.time()) & 0xffffffff) << 32 | \
+                self.id_pool.next_id() >> 32
+        else:
+            hi = self.id_pool.next_id()
+        return hi << 64 | lo
+
+    def __str__(self):
+        return 'TraceIdGenerator(%s, %s)' % (
+            128 if self.trace_id_128bit else 64, self.time_ordered)
@@ -1,8 +1,33 @@
+from __future__ import division
+
+import collections
 import functools
+import json
+import logging
+import os
+import threading
+import time
+
+from jaeger_client import (ConstSampler, ProbabilisticSampler,
+                           RateLimitingSampler)
+from jaeger_client.constants import (SAMPLER_TYPE_CONST,
+                                     SAMPLER_TYPE_PROBABILISTIC,
+                                     SAMPLER_TYPE_RATE_LIMITING)
+from jaeger_client.sampler import (DEFAULT_LOWER_BOUND, DEFAULT_MAX_OPERATIONS,
+                                   DEFAULT_SAMPLING_PROBABILITY,
+                                   SAMPLER_PARAM_TAG_KEY, SAMPLER_TYPE_TAG_KEY,
+                                   GuaranteedThroughputProbabilisticSampler,
+                                   Sampler)
+from jaeger_client.utils import get_boolean
+
+__all__ = ('ProbabilisticSampler', 'AdaptiveSampler', 'PerOperationSampler',
+           'FileSampler', 'create_sampler')
 
-from jaeger_client import ProbabilisticSampler
+logger = logging.getLogger('jaeger_tracing')
 
-__all__ = ('ProbabilisticSampler',)
+SAMPLER_TYPE_ADAPTIVE = 'adaptive'
+SAMPLER_TYPE_PER_OPERATION = 'per_operation'
+SAMPLER_TYPE_FILE = 'file'
 
 
 @functools.wraps(ProbabilisticSampler.is_sampled)
@@ -13,3 +38,354 @@ def _is_sampled(self, trace_id, operation=''):
 
 # Ugly, but instead of sub-classing all related sampler classes, it should be OK.
 ProbabilisticSampler.is_sampled = _is_sampled
+
+
+class AdaptiveSampler(ProbabilisticSampler):
+    """
+    A probabilistic sampler that adjusts its rate for the reporter to export
+    about target_spans_per_second spans, and backs off when the reporter
+    cannot keep up, so that traffic spikes lower the sampling rate rather
+    than make the reporter drop spans at random.
+
+    Every adjust_interval seconds, the spans the reporter was given at the
+    current rate estimate how many spans per second sampling everything
+    would produce. The rate is aimed at the target from a moving average of
+    that estimate. Spans dropped by the reporter, or its queue filling past
+    high_watermark, cut the rate further at once. The rate is kept between
+    min_rate and max_rate.
+
+    Sampled spans are tagged as probabilistic with the current rate.
+    """
+
+    def __init__(self, target_spans_per_second, reporter=None,
+                 min_rate=0.0001, max_rate=1.0, initial_rate=None,
+                 smoothing=0.3, adjust_interval=1.0, high_watermark=0.5):
+        """
+        :param target_spans_per_second: how many spans to aim at exporting
+        :param reporter: a Zipkin reporter to read the load of, which may
+            also be set later through the reporter attribute. The rate does
+            not change until it is.
+        :param min_rate: the floor of the sampling rate, above 0
+        :param max_rate: the ceiling of the sampling rate, at most 1
+        :param initial_rate: the rate to start at, defaults to max_rate
+        :param smoothing: weight of each adjust_interval in the moving
+            average of the spans sampling everything would produce, between
+            0 and 1
+        :param adjust_interval: seconds between adjustments
+        :param high_watermark: fraction of the reporter's queue capacity
+            past which the rate is cut
+        """
+        assert target_spans_per_second > 0, 'Target must be positive'
+        assert 0.0 < min_rate <= max_rate <= 1.0, \
+            'Sampling rates must satisfy 0.0 < min <= max <= 1.0'
+        assert 0.0 < smoothing <= 1.0, 'Smoothing must be between 0 and 1'
+        assert 0.0 < high_watermark < 1.0, \
+            'High watermark must be between 0 and 1'
+        super(AdaptiveSampler, self).__init__(
+            max_rate if initial_rate is None else
+            min(max(initial_rate, min_rate), max_rate))
+        self.target_spans_per_second = target_spans_per_second
+        self.reporter = reporter
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.smoothing = smoothing
+        self.adjust_interval = adjust_interval
+        self.high_watermark = high_watermark
+        self._lock = threading.Lock()
+        self._next_adjustment = time.time() + adjust_interval
+        # reporter totals and time of the previous adjustment
+        self._last_load = None
+        # moving average of spans per second at a rate of 1.0
+        self.demand = None
+
+    def is_sampled(self, trace_id, operation=''):
+        if time.time() >= self._next_adjustment:
+            self.adjust()
+        return _is_sampled(self, trace_id, operation)
+
+    def adjust(self, now=None):
+        """
+        Aims the rate at the target given the reporter's load since the
+        previous adjustment. Called by is_sampled() every adjust_interval.
+
+        :param now: the current time, defaults to time.time()
+        """
+        # one thread adjusts, the others carry on with the current rate
+        if not self._lock.acquire(False):
+            return
+        try:
+            now = time.time() if now is None else now
+            self._next_adjustment = now + self.adjust_interval
+            if self.reporter is None:
+                return
+            reported, dropped, occupancy = self.reporter.load()
+            last = self._last_load
+            self._last_load = (reported, dropped, now)
+            if last is None or now <= last[2]:
+                return
+            self._set_rate(self._aim(reported - last[0], dropped - last[1],
+                                     occupancy, now - last[2]))
+        finally:
+            self._lock.release()
+
+    def _aim(self, reported, dropped, occupancy, elapsed):
+        rate = self.rate
+        demand = reported / elapsed / rate
+        if self.demand is not None:
+            demand = self.demand + self.smoothing * (demand - self.demand)
+        self.demand = demand
+        aim = self.target_spans_per_second / demand if demand else \
+            self.max_rate
+        if dropped > 0:
+            # no more than the reporter took
+            aim = min(aim, rate * (reported - dropped) / reported)
+        if occupancy > self.high_watermark:
+            aim = min(aim, rate * (1 - occupancy) / (1 - self.high_watermark))
+        return aim
+
+    def _set_rate(self, rate):
+        rate = min(max(rate, self.min_rate), self.max_rate)
+        self.rate = rate
+        self.boundary = rate * self.max_number
+        self._tags = {
+            SAMPLER_TYPE_TAG_KEY: SAMPLER_TYPE_PROBABILISTIC,
+            SAMPLER_PARAM_TAG_KEY: rate,
+        }
+
+    def __str__(self):
+        return 'AdaptiveSampler(%s)' % self.target_spans_per_second
+
+
+class PerOperationSampler(Sampler):
+    """
+    Samples each operation with its own probability, and at least
+    lower_bound traces per second of it, so that busy operations such as
+    health checks can be sampled less than rare ones without the rare ones
+    going unsampled.
+
+    Operations without a rate of their own use default_rate. Only the
+    max_operations most recently used operations are tracked: the least
+    recently used one is forgotten to make room for a new one, along with
+    the state of its lower bound, so that high-cardinality operation names
+    take bounded memory. Each decision is a dictionary lookup under a lock.
+    """
+
+    def __init__(self, default_rate, lower_bound=DEFAULT_LOWER_BOUND,
+                 operations=None, max_operations=DEFAULT_MAX_OPERATIONS):
+        """
+        :param default_rate: sampling probability of operations without one
+            in operations
+        :param lower_bound: traces per second to sample of each operation
+            whatever its probability, 0 for none
+        :param operations: dictionary of operation name to its sampling
+            probability, or to a (probability, lower_bound) tuple
+        :param max_operations: how many operations to track at most
+        """
+        super(PerOperationSampler, self).__init__()
+        assert 0.0 <= default_rate <= 1.0, \
+            'Sampling rate must be between 0.0 and 1.0'
+        assert lower_bound >= 0, 'Lower bound must not be negative'
+        assert max_operations > 0, 'Max operations must be positive'
+        self.default_rate = default_rate
+        self.lower_bound = lower_bound
+        self.max_operations = max_operations
+        # operation name -> (probability, lower bound)
+        self.operations = {}
+        for operation, strategy in (operations or {}).items():
+            rate, operation_lower_bound = strategy \
+                if isinstance(strategy, tuple) else (strategy, lower_bound)
+            assert 0.0 <= rate <= 1.0, \
+                'Sampling rate must be between 0.0 and 1.0'
+            assert operation_lower_bound >= 0, \
+                'Lower bound must not be negative'
+            self.operations[operation] = (rate, operation_lower_bound)
+        # operation name -> sampler, least recently used first
+        self._samplers = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_sampled(self, trace_id, operation=''):
+        with self._lock:
+            samplers = self._samplers
+            sampler = samplers.pop(operation, None)
+            if sampler is None:
+                if len(samplers) >= self.max_operations:
+                    samplers.popitem(last=False)
+                rate, lower_bound = self.operations.get(
+                    operation, (self.default_rate, self.lower_bound))
+                # a rate limiter of 0 would still let a first trace through
+                sampler = GuaranteedThroughputProbabilisticSampler(
+                    operation, lower_bound, rate) if lower_bound else \
+                    ProbabilisticSampler(rate)
+            samplers[operation] = sampler
+            # the lower bound's rate limiter is not thread safe either
+            return sampler.is_sampled(trace_id, operation)
+
+    def close(self):
+        pass
+
+    def __str__(self):
+        return 'PerOperationSampler(%s, %s)' % (self.default_rate,
+                                                self.lower_bound)
+
+
+class FileSampler(Sampler):
+    """
+    Samples as a sampler configuration in a local JSON file says, and picks
+    up changes to the file without a restart, so that sampling can be cut
+    down in seconds during an incident.
+
+    The file holds the same dictionary as Config's 'sampler' section, e.g.
+    {"type": "per_operation", "param": 0.01, "operations": {"health": 0}}.
+    Every poll_interval seconds, from inside is_sampled(), one caller checks
+    the file's modification time, and reloads it if it changed. The new
+    sampler replaces the old one in a single assignment: other callers are
+    never blocked, and carry on with whichever sampler they read. Files
+    that cannot be read or parsed are logged and ignored, and the previous
+    sampler is kept, default_sampler to begin with.
+
+    Write the file elsewhere and rename it into place, for it not to be
+    read half written.
+    """
+
+    def __init__(self, path, poll_interval=5.0, default_sampler=None):
+        """
+        :param path: the JSON file to read
+        :param poll_interval: seconds between checks of the file
+        :param default_sampler: sampler to use until the file is read,
+            defaults to a ProbabilisticSampler of jaeger_client's default
+            probability
+        """
+        super(FileSampler, self).__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.sampler = default_sampler or \
+            ProbabilisticSampler(DEFAULT_SAMPLING_PROBABILITY)
+        self._reporter = None
+        self._lock = threading.Lock()
+        # (mtime, size, inode) of the file last read, None once it is found
+        # missing
+        self._stat = ()
+        self._next_poll = 0
+        self.poll()
+
+    @property
+    def reporter(self):
+        """The reporter to hand to an AdaptiveSampler read from the file."""
+        return self._reporter
+
+    @reporter.setter
+    def reporter(self, reporter):
+        self._reporter = reporter
+        sampler = self.sampler
+        if isinstance(sampler, AdaptiveSampler):
+            sampler.reporter = reporter
+
+    def is_sampled(self, trace_id, operation=''):
+        if time.time() >= self._next_poll:
+            self.poll()
+        return self.sampler.is_sampled(trace_id, operation)
+
+    def poll(self):
+        """
+        Reloads the file if it changed since it was last read.
+
+        :return: whether a new sampler was loaded
+        """
+        # one thread polls, the others carry on with the current sampler
+        if not self._lock.acquire(False):
+            return False
+        try:
+            self._next_poll = time.time() + self.poll_interval
+            try:
+                st = os.stat(self.path)
+            except OSError as e:
+                if self._stat is not None:
+                    logger.error('Cannot read sampling strategy %s: %s',
+                                 self.path, e)
+                    self._stat = None
+                return False
+            stat = (st.st_mtime, st.st_size, st.st_ino)
+            if stat == self._stat:
+                return False
+            self._stat = stat
+            try:
+                with open(self.path) as f:
+                    sampler = create_sampler(json.load(f))
+                if sampler is None or isinstance(sampler, FileSampler):
+                    raise ValueError('Not a sampler')
+            except Exception as e:
+                logger.error('Cannot load sampling strategy %s: %s',
+                             self.path, e)
+                return False
+            if isinstance(sampler, AdaptiveSampler):
+                sampler.reporter = self._reporter
+            previous, self.sampler = self.sampler, sampler
+            previous.close()
+            logger.info('Loaded sampling strategy %s: %s', self.path, sampler)
+            return True
+        finally:
+            self._lock.release()
+
+    def close(self):
+        self.sampler.close()
+
+    def __str__(self):
+        return 'FileSampler(%s)' % self.path
+
+
+def _per_operation_sampler(sampler_config):
+    """
+    param is the default sampling probability. Each entry of operations maps
+    an operation name to its probability, or to a dictionary with its 'rate'
+    and 'lower_bound'.
+    """
+    lower_bound = float(sampler_config.get('lower_bound', DEFAULT_LOWER_BOUND))
+    operations = {}
+    for operation, strategy in sampler_config.get('operations', {}).items():
+        if isinstance(strategy, dict):
+            operations[operation] = (
+                float(strategy['rate']),
+                float(strategy.get('lower_bound', lower_bound)))
+        else:
+            operations[operation] = (float(strategy), lower_bound)
+    return PerOperationSampler(
+        default_rate=float(sampler_config.get('param')),
+        lower_bound=lower_bound,
+        operations=operations,
+        max_operations=int(sampler_config.get('max_operations',
+                                              DEFAULT_MAX_OPERATIONS)))
+
+
+def create_sampler(sampler_config):
+    """
+    Creates the sampler a Config 'sampler' section describes.
+
+    :param sampler_config: dictionary with the sampler's type and param, and
+        settings particular to the type
+    :return: the sampler, or None if no type is set
+    """
+    sampler_type = sampler_config.get('type', None)
+    sampler_param = sampler_config.get('param', None)
+    if not sampler_type:
+        return None
+    elif sampler_type == SAMPLER_TYPE_CONST:
+        return ConstSampler(decision=get_boolean(sampler_param, False))
+    elif sampler_type == SAMPLER_TYPE_PROBABILISTIC:
+        return ProbabilisticSampler(rate=float(sampler_param))
+    elif sampler_type in [SAMPLER_TYPE_RATE_LIMITING, 'rate_limiting']:
+        return RateLimitingSampler(max_traces_per_second=float(sampler_param))
+    elif sampler_type == SAMPLER_TYPE_ADAPTIVE:
+        # param is the number of spans per second to aim at exporting
+        return AdaptiveSampler(
+            target_spans_per_second=float(sampler_param),
+            min_rate=float(sampler_config.get('min_rate', 0.0001)),
+            max_rate=float(sampler_config.get('max_rate', 1.0)))
+    elif sampler_type == SAMPLER_TYPE_PER_OPERATION:
+        return _per_operation_sampler(sampler_config)
+    elif sampler_type == SAMPLER_TYPE_FILE:
+        # param is the path of the JSON file
+        return FileSampler(
+            sampler_param,
+            poll_interval=float(sampler_config.get('poll_interval', 5.0)))
+
+    raise ValueError('Unknown sampler type %s' % sampler_type)
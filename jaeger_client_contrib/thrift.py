@@ -1,13 +1,26 @@
 from __future__ import absolute_import
 
-from jaeger_client.thrift import (add_zipkin_annotations, id_to_int,
-                                  make_endpoint, timestamp_micros)
-from thrift.protocol.TBinaryProtocol import TBinaryProtocol
+import struct
+
+import six
+from jaeger_client.thrift import (id_to_int, ipv4_to_int,
+                                  make_local_component_tag,
+                                  make_peer_address_tag, make_string_tag,
+                                  port_to_int, timestamp_micros)
+from thrift.protocol.TBinaryProtocol import (TBinaryProtocol,
+                                             TBinaryProtocolAccelerated)
+from thrift.protocol.TCompactProtocol import VALUE_WRITE, TCompactProtocol
 from thrift.Thrift import TType
 from thrift.transport.TTransport import TMemoryBuffer
 
+from .thrift_gen.zipkincore import constants as zipkin_constants
 from .thrift_gen.zipkincore import ttypes as zipkin_types
 
+try:
+    from thrift.protocol import fastbinary
+except ImportError:  # pragma: no cover
+    fastbinary = None
+
 
 def extract_from_trace_id(trace_id):
     """Extract high and low 64 bit parts from trace_id"""
@@ -16,17 +29,100 @@ def extract_from_trace_id(trace_id):
     return hi, lo
 
 
+def make_endpoint(ipv4, port, service_name):
+    """
+    Like jaeger_client.thrift.make_endpoint, but returns our zipkincore
+    Endpoint. jaeger_client's Endpoint predates the ipv6 field, while
+    fastbinary encodes every field listed in our thrift_spec.
+    """
+    if isinstance(ipv4, six.string_types):
+        ipv4 = ipv4_to_int(ipv4)
+    port = port_to_int(port)
+    if port is None:
+        port = 0
+    return zipkin_types.Endpoint(ipv4=ipv4, port=port,
+                                 service_name=service_name.lower())
+
+
+def zipkin_annotations(span, endpoint):
+    """
+    Returns the Zipkin annotations and binary annotations of a span, like
+    jaeger_client.thrift.add_zipkin_annotations adds them, but in new lists
+    so that the span is left as it is. The peer address tag of an RPC span
+    gets one of our Endpoints, see make_endpoint().
+
+    :returns: (annotations, binary_annotations) tuple
+    """
+    annotations = [
+        zipkin_types.Annotation(
+            timestamp=log.timestamp, value=log.value, host=endpoint)
+        for log in span.logs]
+    binary_annotations = list(span.tags)
+    if span.is_rpc():
+        is_client = span.is_rpc_client()
+        annotations.append(zipkin_types.Annotation(
+            timestamp=timestamp_micros(span.end_time),
+            value=zipkin_constants.CLIENT_RECV if is_client
+            else zipkin_constants.SERVER_SEND,
+            host=endpoint))
+        annotations.append(zipkin_types.Annotation(
+            timestamp=timestamp_micros(span.start_time),
+            value=zipkin_constants.CLIENT_SEND if is_client
+            else zipkin_constants.SERVER_RECV,
+            host=endpoint))
+
+        if span.peer:
+            host = make_endpoint(
+                ipv4=span.peer.get('ipv4', 0),
+                port=span.peer.get('port', 0),
+                service_name=span.peer.get('service_name', ''))
+            key = zipkin_constants.SERVER_ADDR if is_client \
+                else zipkin_constants.CLIENT_ADDR
+            binary_annotations.append(
+                make_peer_address_tag(key=key, host=host))
+    else:
+        binary_annotations.append(make_local_component_tag(
+            component_name=span.component or span.tracer.service_name,
+            endpoint=endpoint))
+    return annotations, binary_annotations
+
+
+# (ip_address, service_name) -> (Endpoint, encoded Endpoint bytes)
+_tracer_endpoints = {}
+
+
+def tracer_endpoint(tracer):
+    """
+    Returns the Zipkin Endpoint of a tracer along with its TBinaryProtocol
+    encoding. Neither changes for the life of a tracer, so both are built
+    once and shared by all spans and batches.
+
+    :param tracer: tracer with ip_address and service_name attributes
+    :returns: (Endpoint, bytes) tuple
+    """
+    key = (tracer.ip_address, tracer.service_name)
+    cached = _tracer_endpoints.get(key)
+    if cached is None:
+        endpoint = make_endpoint(ipv4=tracer.ip_address,
+                                 port=0,  # span.port,
+                                 service_name=tracer.service_name)
+        cached = _tracer_endpoints.setdefault(
+            key, (endpoint, encode_endpoint(endpoint)))
+    return cached
+
+
 def make_zipkin_spans(spans):
+    """
+    Returns zipkincore Span structs for jaeger spans, which are left as
+    they are, so that they can be encoded again.
+    """
     zipkin_spans = []
     for span in spans:
-        endpoint = make_endpoint(ipv4=span.tracer.ip_address,
-                                 port=0,  # span.port,
-                                 service_name=span.tracer.service_name)
-        # TODO extend Zipkin Thrift and pass endpoint once only
-        for event in span.logs:
-            event.host = endpoint
+        endpoint, _ = tracer_endpoint(span.tracer)
         with span.update_lock:
-            add_zipkin_annotations(span=span, endpoint=endpoint)
+            # TODO extend Zipkin Thrift and pass endpoint once only
+            annotations, binary_annotations = zipkin_annotations(
+                span=span, endpoint=endpoint)
             hi, lo = extract_from_trace_id(span.trace_id)
             zipkin_span = zipkin_types.Span(
                 trace_id=id_to_int(lo),
@@ -34,8 +130,8 @@ def make_zipkin_spans(spans):
                 name=span.operation_name,
                 id=id_to_int(span.span_id),
                 parent_id=id_to_int(span.parent_id) or None,
-                annotations=span.logs,
-                binary_annotations=span.tags,
+                annotations=annotations,
+                binary_annotations=binary_annotations,
                 debug=span.is_debug(),
                 timestamp=timestamp_micros(span.start_time),
                 duration=timestamp_micros(span.end_time - span.start_time)
@@ -44,16 +140,569 @@ def make_zipkin_spans(spans):
     return zipkin_spans
 
 
-def thrift_objs_in_bytes(thrift_obj_list):  # pragma: no cover
+def _encode_thrift_objs(protocol_class, thrift_obj_list):
+    transport = TMemoryBuffer()
+    protocol = protocol_class(transport)
+    if protocol_class is TCompactProtocol:
+        # TCompactProtocol only expects lists inside structs and messages
+        protocol.state = VALUE_WRITE
+    protocol.writeListBegin(TType.STRUCT, len(thrift_obj_list))
+    for thrift_obj in thrift_obj_list:
+        thrift_obj.write(protocol)
+    return bytes(transport.getvalue())
+
+
+def _can_accelerate():
+    """
+    Checks that fastbinary is importable and encodes our generated
+    zipkincore types exactly like the pure-Python TBinaryProtocol does.
+    fastbinary has to match the Thrift compiler the types were generated
+    with (see Makefile), otherwise it rejects their thrift_spec.
+    """
+    if fastbinary is None:
+        return False
+    endpoint = make_endpoint(ipv4='127.0.0.1', port=0, service_name='probe')
+    event = zipkin_types.Annotation(timestamp=1, value='probe', host=endpoint)
+    tag = make_string_tag('probe', 'probe')
+    tag.host = endpoint
+    span = zipkin_types.Span(trace_id=1, trace_id_high=0, name='probe', id=1,
+                             parent_id=1, annotations=[event],
+                             binary_annotations=[tag], debug=False,
+                             timestamp=1, duration=1)
+    try:
+        accelerated = _encode_thrift_objs(TBinaryProtocolAccelerated, [span])
+    except Exception:
+        return False
+    return accelerated == _encode_thrift_objs(TBinaryProtocol, [span])
+
+
+# Whether thrift_objs_in_bytes() uses the C-accelerated protocol by default.
+ACCELERATED = _can_accelerate()
+
+
+def thrift_objs_in_bytes(thrift_obj_list, accelerated=None, compact=False):
     """
     Returns TBinaryProtocol encoded Thrift objects.
 
     :param thrift_obj_list: thrift objects list to encode
+    :param accelerated: whether to use TBinaryProtocolAccelerated,
+        defaults to ACCELERATED
+    :param compact: encode with TCompactProtocol instead, which is never
+        accelerated
     :returns: thrift objects in TBinaryProtocol format bytes.
     """
-    transport = TMemoryBuffer()
-    protocol = TBinaryProtocol(transport)
-    protocol.writeListBegin(TType.STRUCT, len(thrift_obj_list))
-    for thrift_obj in thrift_obj_list:
-        thrift_obj.write(protocol)
-    return bytes(transport.getvalue())
+    if compact:
+        return _encode_thrift_objs(TCompactProtocol, thrift_obj_list)
+    if accelerated is None:
+        accelerated = ACCELERATED
+    protocol_class = TBinaryProtocolAccelerated if accelerated \
+        else TBinaryProtocol
+    return _encode_thrift_objs(protocol_class, thrift_obj_list)
+
+
+# Pre-built TBinaryProtocol fragments used by the direct span encoder below.
+_pack_i16 = struct.Struct('!h').pack
+_pack_i32 = struct.Struct('!i').pack
+_pack_i64 = struct.Struct('!q').pack
+_pack_list_begin = struct.Struct('!bi').pack
+
+
+def _field_begin(ttype, fid):
+    return struct.pack('!bh', ttype, fid)
+
+
+_FIELD_STOP = struct.pack('!b', TType.STOP)
+_BOOL_TRUE = struct.pack('!b', 1)
+_BOOL_FALSE = struct.pack('!b', 0)
+
+_ENDPOINT_IPV4 = _field_begin(TType.I32, 1)
+_ENDPOINT_PORT = _field_begin(TType.I16, 2)
+_ENDPOINT_SERVICE_NAME = _field_begin(TType.STRING, 3)
+_ENDPOINT_IPV6 = _field_begin(TType.STRING, 4)
+
+_ANNOTATION_TIMESTAMP = _field_begin(TType.I64, 1)
+_ANNOTATION_VALUE = _field_begin(TType.STRING, 2)
+_ANNOTATION_HOST = _field_begin(TType.STRUCT, 3)
+
+_BINARY_ANNOTATION_KEY = _field_begin(TType.STRING, 1)
+_BINARY_ANNOTATION_VALUE = _field_begin(TType.STRING, 2)
+_BINARY_ANNOTATION_TYPE = _field_begin(TType.I32, 3)
+_BINARY_ANNOTATION_HOST = _field_begin(TType.STRUCT, 4)
+
+_SPAN_TRACE_ID = _field_begin(TType.I64, 1)
+_SPAN_NAME = _field_begin(TType.STRING, 3)
+_SPAN_ID = _field_begin(TType.I64, 4)
+_SPAN_PARENT_ID = _field_begin(TType.I64, 5)
+_SPAN_ANNOTATIONS = _field_begin(TType.LIST, 6)
+_SPAN_BINARY_ANNOTATIONS = _field_begin(TType.LIST, 8)
+_SPAN_DEBUG = _field_begin(TType.BOOL, 9)
+_SPAN_TIMESTAMP = _field_begin(TType.I64, 10)
+_SPAN_DURATION = _field_begin(TType.I64, 11)
+_SPAN_TRACE_ID_HIGH = _field_begin(TType.I64, 12)
+
+
+def _write_string(buf, value):
+    if isinstance(value, six.text_type):
+        value = value.encode('utf-8')
+    buf += _pack_i32(len(value))
+    # extend() rather than +=, python-future's newbytes hijacks __radd__
+    buf.extend(value)
+
+
+def encode_endpoint(endpoint):
+    """
+    Returns a Zipkin Endpoint struct in TBinaryProtocol format bytes.
+
+    :param endpoint: a Zipkin thrift Endpoint
+    """
+    buf = bytearray()
+    if endpoint.ipv4 is not None:
+        buf += _ENDPOINT_IPV4
+        buf += _pack_i32(endpoint.ipv4)
+    if endpoint.port is not None:
+        buf += _ENDPOINT_PORT
+        buf += _pack_i16(endpoint.port)
+    if endpoint.service_name is not None:
+        buf += _ENDPOINT_SERVICE_NAME
+        _write_string(buf, endpoint.service_name)
+    if endpoint.ipv6 is not None:
+        buf += _ENDPOINT_IPV6
+        _write_string(buf, endpoint.ipv6)
+    buf += _FIELD_STOP
+    return bytes(buf)
+
+
+def _write_annotation(buf, timestamp, value, host_bytes):
+    if timestamp is not None:
+        buf += _ANNOTATION_TIMESTAMP
+        buf += _pack_i64(timestamp)
+    if value is not None:
+        buf += _ANNOTATION_VALUE
+        _write_string(buf, value)
+    if host_bytes is not None:
+        buf += _ANNOTATION_HOST
+        buf += host_bytes
+    buf += _FIELD_STOP
+
+
+def _write_binary_annotation(buf, key, value, annotation_type, host_bytes):
+    if key is not None:
+        buf += _BINARY_ANNOTATION_KEY
+        _write_string(buf, key)
+    if value is not None:
+        buf += _BINARY_ANNOTATION_VALUE
+        _write_string(buf, value)
+    if annotation_type is not None:
+        buf += _BINARY_ANNOTATION_TYPE
+        buf += _pack_i32(annotation_type)
+    if host_bytes is not None:
+        buf += _BINARY_ANNOTATION_HOST
+        buf += host_bytes
+    buf += _FIELD_STOP
+
+
+def _write_zipkin_span(buf, span, endpoint_bytes):
+    """
+    Writes a single jaeger Span as a Zipkin Span struct.
+
+    Produces exactly the same bytes as make_zipkin_spans() followed by
+    TBinaryProtocol serialization, but without creating the intermediate
+    thrift objects and without mutating the span's logs and tags.
+    """
+    hi, lo = extract_from_trace_id(span.trace_id)
+    buf += _SPAN_TRACE_ID
+    buf += _pack_i64(id_to_int(lo))
+    if span.operation_name is not None:
+        buf += _SPAN_NAME
+        _write_string(buf, span.operation_name)
+    buf += _SPAN_ID
+    buf += _pack_i64(id_to_int(span.span_id))
+    parent_id = id_to_int(span.parent_id)
+    if parent_id:
+        buf += _SPAN_PARENT_ID
+        buf += _pack_i64(parent_id)
+
+    is_rpc = span.is_rpc()
+    logs = span.logs
+    buf += _SPAN_ANNOTATIONS
+    buf += _pack_list_begin(TType.STRUCT, len(logs) + 2 if is_rpc else len(logs))
+    for log in logs:
+        _write_annotation(buf, log.timestamp, log.value, endpoint_bytes)
+
+    tags = span.tags
+    if is_rpc:
+        is_client = span.is_rpc_client()
+        _write_annotation(
+            buf, timestamp_micros(span.end_time),
+            zipkin_constants.CLIENT_RECV if is_client else zipkin_constants.SERVER_SEND,
+            endpoint_bytes)
+        _write_annotation(
+            buf, timestamp_micros(span.start_time),
+            zipkin_constants.CLIENT_SEND if is_client else zipkin_constants.SERVER_RECV,
+            endpoint_bytes)
+        buf += _SPAN_BINARY_ANNOTATIONS
+        if span.peer:
+            buf += _pack_list_begin(TType.STRUCT, len(tags) + 1)
+        else:
+            buf += _pack_list_begin(TType.STRUCT, len(tags))
+    else:
+        buf += _SPAN_BINARY_ANNOTATIONS
+        buf += _pack_list_begin(TType.STRUCT, len(tags) + 1)
+    for tag in tags:
+        host = tag.host
+        _write_binary_annotation(
+            buf, tag.key, tag.value, tag.annotation_type,
+            encode_endpoint(host) if host is not None else None)
+    if is_rpc:
+        if span.peer:
+            peer = make_endpoint(
+                ipv4=span.peer.get('ipv4', 0),
+                port=span.peer.get('port', 0),
+                service_name=span.peer.get('service_name', ''))
+            _write_binary_annotation(
+                buf,
+                zipkin_constants.SERVER_ADDR if is_client else zipkin_constants.CLIENT_ADDR,
+                '0x01', zipkin_types.AnnotationType.BOOL, encode_endpoint(peer))
+    else:
+        _write_binary_annotation(
+            buf, zipkin_constants.LOCAL_COMPONENT,
+            span.component or span.tracer.service_name,
+            zipkin_types.AnnotationType.STRING, endpoint_bytes)
+
+    buf += _SPAN_DEBUG
+    buf += _BOOL_TRUE if span.is_debug() else _BOOL_FALSE
+    buf += _SPAN_TIMESTAMP
+    buf += _pack_i64(timestamp_micros(span.start_time))
+    buf += _SPAN_DURATION
+    buf += _pack_i64(timestamp_micros(span.end_time - span.start_time))
+    buf += _SPAN_TRACE_ID_HIGH
+    buf += _pack_i64(id_to_int(hi))
+    buf += _FIELD_STOP
+
+
+def zipkin_spans_in_bytes(spans):
+    """
+    Returns TBinaryProtocol encoded list of Zipkin spans.
+
+    Equivalent to ``thrift_objs_in_bytes(make_zipkin_spans(spans))``, but
+    writes jaeger spans straight into a single buffer instead of building
+    and then walking intermediate zipkin_types objects.
+
+    :param spans: jaeger spans to encode
+    :returns: Zipkin spans list in TBinaryProtocol format bytes.
+    """
+    buf = bytearray(_pack_list_begin(TType.STRUCT, len(spans)))
+    tracer = endpoint_bytes = None
+    for span in spans:
+        if span.tracer is not tracer:
+            tracer = span.tracer
+            _, endpoint_bytes = tracer_endpoint(tracer)
+        with span.update_lock:
+            _write_zipkin_span(buf, span, endpoint_bytes)
+    return bytes(buf)
+
+
+# Size of the list header written in front of encoded Zipkin spans.
+LIST_HEADER_SIZE = len(_pack_list_begin(TType.STRUCT, 0))
+
+
+def zipkin_span_in_bytes(span, accelerated=None):
+    """
+    Returns a single jaeger span encoded as a TBinaryProtocol Zipkin Span
+    struct, to be joined into a batch by encoded_spans_in_bytes().
+
+    :param span: jaeger span to encode
+    :param accelerated: whether to encode with fastbinary, defaults to
+        ACCELERATED
+    """
+    if accelerated is None:
+        accelerated = ACCELERATED
+    if accelerated:
+        zipkin_span, = make_zipkin_spans([span])
+        return fastbinary.encode_binary(
+            zipkin_span, (zipkin_types.Span, zipkin_types.Span.thrift_spec))
+    buf = bytearray()
+    _, endpoint_bytes = tracer_endpoint(span.tracer)
+    with span.update_lock:
+        _write_zipkin_span(buf, span, endpoint_bytes)
+    return bytes(buf)
+
+
+def encoded_spans_in_bytes(encoded_spans):
+    """
+    Returns a TBinaryProtocol list of Zipkin spans already encoded by
+    zipkin_span_in_bytes().
+
+    :param encoded_spans: list of encoded Zipkin Span structs
+    """
+    return _pack_list_begin(TType.STRUCT, len(encoded_spans)) + \
+        b''.join(encoded_spans)
+
+
+# TCompactProtocol counterpart of the direct encoder above: field ids are
+# written as deltas, integers as zigzag varints and booleans in the field
+# header, which makes spans about a third smaller. No Zipkin struct has field
+# ids above 15, so field headers always take the one byte short form,
+# written inline as (fid - last_fid) << 4 | type.
+_COMPACT_BOOL_TRUE = 1
+_COMPACT_BOOL_FALSE = 2
+_COMPACT_I16 = 4
+_COMPACT_I32 = 5
+_COMPACT_I64 = 6
+_COMPACT_BINARY = 8
+_COMPACT_LIST = 9
+_COMPACT_STRUCT = 12
+
+# binary_annotations (8) always follows annotations (6)
+_COMPACT_SPAN_BINARY_ANNOTATIONS = 2 << 4 | _COMPACT_LIST
+
+
+def _write_compact_varint(buf, value):
+    while value > 0x7f:
+        buf.append(value & 0x7f | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _write_compact_i32(buf, value):
+    _write_compact_varint(buf, (value << 1 ^ value >> 31) & 0xffffffff)
+
+
+def _write_compact_i64(buf, value):
+    # the varint loop is inlined, IDs and timestamps take 8 to 10 bytes
+    value = (value << 1 ^ value >> 63) & 0xffffffffffffffff
+    while value > 0x7f:
+        buf.append(value & 0x7f | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _write_compact_string(buf, value):
+    if isinstance(value, six.text_type):
+        value = value.encode('utf-8')
+    size = len(value)
+    if size < 0x80:
+        buf.append(size)
+    else:
+        _write_compact_varint(buf, size)
+    buf.extend(value)
+
+
+def _write_compact_list_begin(buf, size):
+    if size < 15:
+        buf.append(size << 4 | _COMPACT_STRUCT)
+    else:
+        buf.append(0xf0 | _COMPACT_STRUCT)
+        _write_compact_varint(buf, size)
+
+
+def encode_endpoint_compact(endpoint):
+    """
+    Returns a Zipkin Endpoint struct in TCompactProtocol format bytes.
+
+    :param endpoint: a Zipkin thrift Endpoint
+    """
+    buf = bytearray()
+    fid = 0
+    if endpoint.ipv4 is not None:
+        buf.append((1 - fid) << 4 | _COMPACT_I32)
+        fid = 1
+        _write_compact_i32(buf, endpoint.ipv4)
+    if endpoint.port is not None:
+        buf.append((2 - fid) << 4 | _COMPACT_I16)
+        fid = 2
+        _write_compact_i32(buf, endpoint.port)
+    if endpoint.service_name is not None:
+        buf.append((3 - fid) << 4 | _COMPACT_BINARY)
+        fid = 3
+        _write_compact_string(buf, endpoint.service_name)
+    if endpoint.ipv6 is not None:
+        buf.append((4 - fid) << 4 | _COMPACT_BINARY)
+        fid = 4
+        _write_compact_string(buf, endpoint.ipv6)
+    buf += _FIELD_STOP
+    return bytes(buf)
+
+
+# (ip_address, service_name) -> TCompactProtocol encoded Endpoint
+_tracer_compact_endpoints = {}
+
+
+def tracer_endpoint_compact(tracer):
+    """
+    Returns the TCompactProtocol encoding of a tracer's Zipkin Endpoint,
+    see tracer_endpoint().
+
+    :param tracer: tracer with ip_address and service_name attributes
+    """
+    key = (tracer.ip_address, tracer.service_name)
+    cached = _tracer_compact_endpoints.get(key)
+    if cached is None:
+        endpoint, _ = tracer_endpoint(tracer)
+        cached = _tracer_compact_endpoints.setdefault(
+            key, encode_endpoint_compact(endpoint))
+    return cached
+
+
+def _write_compact_annotation(buf, timestamp, value, host_bytes):
+    fid = 0
+    if timestamp is not None:
+        buf.append((1 - fid) << 4 | _COMPACT_I64)
+        fid = 1
+        _write_compact_i64(buf, timestamp)
+    if value is not None:
+        buf.append((2 - fid) << 4 | _COMPACT_BINARY)
+        fid = 2
+        _write_compact_string(buf, value)
+    if host_bytes is not None:
+        buf.append((3 - fid) << 4 | _COMPACT_STRUCT)
+        fid = 3
+        buf += host_bytes
+    buf += _FIELD_STOP
+
+
+def _write_compact_binary_annotation(buf, key, value, annotation_type,
+                                     host_bytes):
+    fid = 0
+    if key is not None:
+        buf.append((1 - fid) << 4 | _COMPACT_BINARY)
+        fid = 1
+        _write_compact_string(buf, key)
+    if value is not None:
+        buf.append((2 - fid) << 4 | _COMPACT_BINARY)
+        fid = 2
+        _write_compact_string(buf, value)
+    if annotation_type is not None:
+        buf.append((3 - fid) << 4 | _COMPACT_I32)
+        fid = 3
+        _write_compact_i32(buf, annotation_type)
+    if host_bytes is not None:
+        buf.append((4 - fid) << 4 | _COMPACT_STRUCT)
+        fid = 4
+        buf += host_bytes
+    buf += _FIELD_STOP
+
+
+def _write_zipkin_span_compact(buf, span, endpoint_bytes):
+    """
+    Writes a single jaeger Span as a TCompactProtocol Zipkin Span struct,
+    the same bytes as make_zipkin_spans() followed by TCompactProtocol
+    serialization.
+    """
+    hi, lo = extract_from_trace_id(span.trace_id)
+    buf.append(1 << 4 | _COMPACT_I64)
+    fid = 1
+    _write_compact_i64(buf, id_to_int(lo))
+    if span.operation_name is not None:
+        buf.append((3 - fid) << 4 | _COMPACT_BINARY)
+        fid = 3
+        _write_compact_string(buf, span.operation_name)
+    buf.append((4 - fid) << 4 | _COMPACT_I64)
+    fid = 4
+    _write_compact_i64(buf, id_to_int(span.span_id))
+    parent_id = id_to_int(span.parent_id)
+    if parent_id:
+        buf.append((5 - fid) << 4 | _COMPACT_I64)
+        fid = 5
+        _write_compact_i64(buf, parent_id)
+
+    is_rpc = span.is_rpc()
+    logs = span.logs
+    buf.append((6 - fid) << 4 | _COMPACT_LIST)
+    _write_compact_list_begin(buf, len(logs) + 2 if is_rpc else len(logs))
+    for log in logs:
+        _write_compact_annotation(buf, log.timestamp, log.value, endpoint_bytes)
+
+    tags = span.tags
+    if is_rpc:
+        is_client = span.is_rpc_client()
+        _write_compact_annotation(
+            buf, timestamp_micros(span.end_time),
+            zipkin_constants.CLIENT_RECV if is_client else zipkin_constants.SERVER_SEND,
+            endpoint_bytes)
+        _write_compact_annotation(
+            buf, timestamp_micros(span.start_time),
+            zipkin_constants.CLIENT_SEND if is_client else zipkin_constants.SERVER_RECV,
+            endpoint_bytes)
+        buf.append(_COMPACT_SPAN_BINARY_ANNOTATIONS)
+        _write_compact_list_begin(buf, len(tags) + 1 if span.peer else len(tags))
+    else:
+        buf.append(_COMPACT_SPAN_BINARY_ANNOTATIONS)
+        _write_compact_list_begin(buf, len(tags) + 1)
+    for tag in tags:
+        host = tag.host
+        _write_compact_binary_annotation(
+            buf, tag.key, tag.value, tag.annotation_type,
+            encode_endpoint_compact(host) if host is not None else None)
+    if is_rpc:
+        if span.peer:
+            peer = make_endpoint(
+                ipv4=span.peer.get('ipv4', 0),
+                port=span.peer.get('port', 0),
+                service_name=span.peer.get('service_name', ''))
+            _write_compact_binary_annotation(
+                buf,
+                zipkin_constants.SERVER_ADDR if is_client else zipkin_constants.CLIENT_ADDR,
+                '0x01', zipkin_types.AnnotationType.BOOL,
+                encode_endpoint_compact(peer))
+    else:
+        _write_compact_binary_annotation(
+            buf, zipkin_constants.LOCAL_COMPONENT,
+            span.component or span.tracer.service_name,
+            zipkin_types.AnnotationType.STRING, endpoint_bytes)
+
+    # fields 8 to 12 are always written, one after the other
+    buf.append(1 << 4 | (
+        _COMPACT_BOOL_TRUE if span.is_debug() else _COMPACT_BOOL_FALSE))
+    buf.append(1 << 4 | _COMPACT_I64)
+    _write_compact_i64(buf, timestamp_micros(span.start_time))
+    buf.append(1 << 4 | _COMPACT_I64)
+    _write_compact_i64(buf, timestamp_micros(span.end_time - span.start_time))
+    buf.append(1 << 4 | _COMPACT_I64)
+    _write_compact_i64(buf, id_to_int(hi))
+    buf += _FIELD_STOP
+
+
+def zipkin_spans_in_compact_bytes(spans):
+    """
+    Returns TCompactProtocol encoded list of Zipkin spans, equivalent to
+    ``thrift_objs_in_bytes(make_zipkin_spans(spans), compact=True)``.
+
+    :param spans: jaeger spans to encode
+    """
+    buf = bytearray()
+    _write_compact_list_begin(buf, len(spans))
+    tracer = endpoint_bytes = None
+    for span in spans:
+        if span.tracer is not tracer:
+            tracer = span.tracer
+            endpoint_bytes = tracer_endpoint_compact(tracer)
+        with span.update_lock:
+            _write_zipkin_span_compact(buf, span, endpoint_bytes)
+    return bytes(buf)
+
+
+def zipkin_span_in_compact_bytes(span):
+    """
+    Returns a single jaeger span encoded as a TCompactProtocol Zipkin Span
+    struct, to be joined into a batch by encoded_spans_in_compact_bytes().
+
+    :param span: jaeger span to encode
+    """
+    buf = bytearray()
+    endpoint_bytes = tracer_endpoint_compact(span.tracer)
+    with span.update_lock:
+        _write_zipkin_span_compact(buf, span, endpoint_bytes)
+    return bytes(buf)
+
+
+def encoded_spans_in_compact_bytes(encoded_spans):
+    """
+    Returns a TCompactProtocol list of Zipkin spans already encoded by
+    zipkin_span_in_compact_bytes().
+
+    :param encoded_spans: list of encoded Zipkin Span structs
+    """
+    buf = bytearray()
+    _write_compact_list_begin(buf, len(encoded_spans))
+    return bytes(buf) + b''.join(encoded_spans)
@@ -1,22 +1,33 @@
 from __future__ import absolute_import
 
-import os
-import uuid
-from builtins import int
-
 import jaeger_client
 import six
 from jaeger_client import Span, SpanContext
 from jaeger_client.span import DEBUG_FLAG, SAMPLED_FLAG
 from opentracing.ext import tags as ext_tags
 
+from .id_generator import RandomIdPool, TraceIdGenerator
+
 
 class Tracer(jaeger_client.Tracer):
+    def __init__(self, *args, **kwargs):
+        """
+        Accepts the same arguments as jaeger_client.Tracer, plus:
+
+        :param trace_id_generator: (optional) a TraceIdGenerator, defaults
+            to 128 bit trace ids with a random high half
+        """
+        trace_id_generator = kwargs.pop('trace_id_generator', None)
+        super(Tracer, self).__init__(*args, **kwargs)
+        self.id_pool = RandomIdPool()
+        self.trace_id_generator = trace_id_generator or \
+            TraceIdGenerator(id_pool=self.id_pool)
+
     def random_trace_id(self):
-        return uuid.uuid1().int
+        return self.trace_id_generator.next_id()
 
     def random_id(self):
-        return int.from_bytes(os.urandom(8))
+        return self.id_pool.next_id()
 
     def start_span(self,
                    operation_name=None,
@@ -55,7 +66,7 @@ class Tracer(jaeger_client.Tracer):
         rpc_server = tags and \
             tags.get(ext_tags.SPAN_KIND) == ext_tags.SPAN_KIND_RPC_SERVER
 
-        if parent is None or parent.is_debug_id_container_only:
+        if parent is None or parent.trace_id is None:
             trace_id = self.random_trace_id()
             span_id = self.random_id()
             parent_id = None
@@ -69,10 +80,12 @@ class Tracer(jaeger_client.Tracer):
                     tags = tags or {}
                     for k, v in six.iteritems(sampler_tags):
                         tags[k] = v
-            else:  # have debug id
+            elif parent.is_debug_id_container_only:
                 flags = SAMPLED_FLAG | DEBUG_FLAG
                 tags = tags or {}
                 tags[self.debug_id_header] = parent.debug_id
+            else:  # have a sampling state alone, such as b3: 0
+                flags = parent.flags & SAMPLED_FLAG
         else:
             trace_id = parent.trace_id
             if rpc_server and self.one_span_per_rpc:
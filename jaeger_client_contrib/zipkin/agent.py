@@ -0,0 +1,151 @@
+from __future__ import absolute_import
+
+import socket
+
+from thrift.protocol.TBinaryProtocol import TBinaryProtocol
+from thrift.protocol.TCompactProtocol import TCompactProtocol
+from thrift.Thrift import TMessageType, TType
+from thrift.transport.TTransport import TMemoryBuffer
+
+from ..thrift import _write_compact_list_begin
+
+# jaeger-agent accepts Zipkin spans as compact encoded emitZipkinBatch calls
+# on this UDP port
+DEFAULT_AGENT_HOST = 'localhost'
+DEFAULT_AGENT_PORT = 5775
+# and Jaeger spans as compact encoded emitBatch calls on this one
+DEFAULT_AGENT_JAEGER_PORT = 6831
+DEFAULT_MAX_PACKET_SIZE = 65000
+
+# span formats the agent accepts
+FORMAT_ZIPKIN = 'zipkin'
+FORMAT_JAEGER = 'jaeger'
+
+# Thrift protocols of emitZipkinBatch calls. The agent's Zipkin port reads
+# compact, binary needs an agent configured with a zipkin-binary processor.
+PROTOCOL_COMPACT = 'compact'
+PROTOCOL_BINARY = 'binary'
+
+_PROTOCOLS = {
+    PROTOCOL_COMPACT: TCompactProtocol,
+    PROTOCOL_BINARY: TBinaryProtocol,
+}
+
+MAX_SEQID = (1 << 31) - 1
+_STRUCT_STOP = b'\x00'
+
+
+def _envelope(protocol, seqid, count):
+    """
+    Returns the start of an emitZipkinBatch message, up to the header of
+    its list of count spans.
+    """
+    transport = TMemoryBuffer()
+    protocol = _PROTOCOLS[protocol](transport)
+    protocol.writeMessageBegin('emitZipkinBatch', TMessageType.ONEWAY, seqid)
+    protocol.writeStructBegin('emitZipkinBatch_args')
+    protocol.writeFieldBegin('spans', TType.LIST, 1)
+    protocol.writeListBegin(TType.STRUCT, count)
+    return bytes(transport.getvalue())
+
+
+# encoded size of an emitZipkinBatch message in each protocol, in excess of
+# its spans
+AGENT_MESSAGE_OVERHEAD = dict(
+    (protocol, len(_envelope(protocol, MAX_SEQID, MAX_SEQID)) +
+     len(_STRUCT_STOP))
+    for protocol in _PROTOCOLS)
+
+
+def agent_zipkin_batch(encoded_spans, seqid=0, protocol=PROTOCOL_COMPACT):
+    """
+    Returns a jaeger-agent emitZipkinBatch message carrying spans already
+    encoded by zipkin_span_in_compact_bytes(), or zipkin_span_in_bytes()
+    for PROTOCOL_BINARY.
+
+    :param encoded_spans: list of encoded Zipkin Span structs
+    :param seqid: sequence id of the oneway call
+    :param protocol: PROTOCOL_COMPACT or PROTOCOL_BINARY
+    """
+    return _envelope(protocol, seqid, len(encoded_spans)) + \
+        b''.join(encoded_spans) + _STRUCT_STOP
+
+
+def _jaeger_envelope(seqid):
+    """
+    Returns the start of a compact emitBatch message, up to the header of
+    its Batch's process field.
+    """
+    transport = TMemoryBuffer()
+    protocol = TCompactProtocol(transport)
+    protocol.writeMessageBegin('emitBatch', TMessageType.ONEWAY, seqid)
+    protocol.writeStructBegin('emitBatch_args')
+    protocol.writeFieldBegin('batch', TType.STRUCT, 1)
+    protocol.writeStructBegin('Batch')
+    protocol.writeFieldBegin('process', TType.STRUCT, 1)
+    return bytes(transport.getvalue())
+
+
+# Batch field 2, the spans list, always follows the process (1)
+_BATCH_SPANS = b'\x19'
+_MAX_LIST_HEADER_SIZE = 6
+
+# encoded size of an emitBatch message in excess of its Process and spans
+AGENT_JAEGER_MESSAGE_OVERHEAD = len(_jaeger_envelope(MAX_SEQID)) + \
+    len(_BATCH_SPANS) + _MAX_LIST_HEADER_SIZE + 2 * len(_STRUCT_STOP)
+
+
+def agent_jaeger_batch(process, encoded_spans, seqid=0):
+    """
+    Returns a compact jaeger-agent emitBatch message carrying a Process and
+    spans already encoded by jaeger_span_in_compact_bytes().
+
+    :param process: Process struct from tracer_process_compact()
+    :param encoded_spans: list of encoded Jaeger Span structs
+    :param seqid: sequence id of the oneway call
+    """
+    buf = bytearray(_jaeger_envelope(seqid))
+    buf += process
+    buf += _BATCH_SPANS
+    _write_compact_list_begin(buf, len(encoded_spans))
+    return bytes(buf) + b''.join(encoded_spans) + _STRUCT_STOP + _STRUCT_STOP
+
+
+class AgentSender(object):
+    """
+    Sends emitZipkinBatch or emitBatch messages to a jaeger-agent over UDP,
+    for use as the reporters' transport_handler with the agent encodings.
+
+    Sending never blocks and keeps no connection state: a batch that does
+    not fit the socket buffer, or is refused, fails the send and is counted
+    as a reporter failure. The reporter's max_batch_bytes must not exceed
+    max_packet_size, so that batches are split into datagrams that fit.
+    """
+
+    def __init__(self, host=DEFAULT_AGENT_HOST, port=DEFAULT_AGENT_PORT,
+                 max_packet_size=DEFAULT_MAX_PACKET_SIZE):
+        """
+        :param host: jaeger-agent host, resolved once
+        :param port: jaeger-agent's UDP port for the encoding's messages
+        :param max_packet_size: the largest datagram to send
+        """
+        overhead = max(AGENT_MESSAGE_OVERHEAD.values())
+        if max_packet_size <= overhead:
+            raise ValueError('Max packet size must exceed %d' % overhead)
+        self.max_packet_size = max_packet_size
+        family, _, _, _, self._address = socket.getaddrinfo(
+            host, port, 0, socket.SOCK_DGRAM)[0]
+        self._socket = socket.socket(family, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    def __call__(self, message):
+        """
+        :param message: an emitZipkinBatch or emitBatch message
+        """
+        if len(message) > self.max_packet_size:
+            raise ValueError('Batch of %d bytes exceeds max packet size %d' %
+                             (len(message), self.max_packet_size))
+        self._socket.sendto(message, self._address)
+
+    def close(self):
+        self._socket.close()
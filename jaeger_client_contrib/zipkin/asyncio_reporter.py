@@ -0,0 +1,188 @@
+from __future__ import absolute_import
+
+import functools
+import time
+from concurrent.futures import Future
+
+from jaeger_client.constants import DEFAULT_FLUSH_INTERVAL
+from six.moves._thread import get_ident
+
+from .reporter import BaseZipkinReporter
+
+try:
+    import asyncio
+except ImportError:  # pragma: no cover
+    try:
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
+
+
+class AsyncioZipkinReporter(BaseZipkinReporter):
+    """
+    Submits spans from an asyncio event loop, for services that do not run
+    a Tornado IOLoop. On Python 2 the trollius backport is used.
+
+    report_span() may be called from any thread: it only appends to a
+    deque, and wakes the loop up once a full batch is buffered. Partial
+    batches are flushed by a timer every flush_interval.
+    """
+
+    def __init__(self, transport_handler, queue_capacity=100, batch_size=10,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, loop=None,
+                 error_reporter=None, metrics_factory=None,
+                 max_batch_bytes=None, **kwargs):
+        """
+        :param transport_handler: called on the loop with each encoded
+            batch. It may return a coroutine or a future, the next batch
+            is only sent once it has completed.
+        :param loop: which event loop to use, defaults to the current one
+
+        See BaseZipkinReporter for the other parameters.
+        """
+        if asyncio is None:  # pragma: no cover
+            raise RuntimeError('asyncio is not available, '
+                               'install trollius on Python 2')
+        super(AsyncioZipkinReporter, self).__init__(
+            transport_handler=transport_handler,
+            queue_capacity=queue_capacity,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            error_reporter=error_reporter,
+            metrics_factory=metrics_factory,
+            max_batch_bytes=max_batch_bytes,
+            **kwargs)
+
+        self.loop = loop or asyncio.get_event_loop()
+        self.stopped = False
+        self._sending = False
+        self._flushing = False
+        self._timer = None
+        self._closed = Future()
+        self._replay_timer = None
+        if self.flush_interval is not None:
+            self.loop.call_soon_threadsafe(self._schedule_flush)
+        if self.spool is not None:
+            self.loop.call_soon_threadsafe(self._schedule_replay)
+
+    def report_span(self, span):
+        buffered = self._admit(span)
+        if buffered is not None and (buffered + 1) % self.batch_size == 0:
+            self.loop.call_soon_threadsafe(self._drain)
+
+    def _schedule_flush(self):
+        if not self.stopped:
+            self._timer = self.loop.call_later(self.flush_interval,
+                                               self._on_flush_timer)
+
+    def _on_flush_timer(self):
+        self._drain(flush=True)
+        self._schedule_flush()
+
+    def _schedule_replay(self):
+        if not self.stopped:
+            self._replay_timer = self.loop.call_later(
+                self.spool_replay_interval, self._on_replay_timer)
+
+    def _on_replay_timer(self):
+        self._replay_spool()
+        self._schedule_replay()
+
+    def _drain(self, flush=False):
+        """
+        Submit buffered spans in batches, one send at a time.
+
+        :param flush: whether to also submit a trailing partial batch
+        """
+        if flush:
+            self._flushing = True
+        while not self._sending:
+            spans = self._take_batch(self._flushing)
+            if not spans:
+                break
+            self._submit(spans)
+        if not self._buffered() and self._carry is None:
+            self._flushing = False
+            if self.stopped and not self._sending:
+                self._finish()
+
+    def _submit(self, spans):
+        start = time.time()
+        try:
+            result = self._send(spans)
+        except Exception as e:
+            self._on_submit_error(len(spans), e)
+            return
+        if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+            self._sending = True
+            future = asyncio.ensure_future(result, loop=self.loop)
+            future.add_done_callback(
+                functools.partial(self._on_sent, len(spans), start))
+        else:
+            self.metrics.reporter_success(len(spans))
+            if self.batching is not None:
+                self._adapt_batching(len(spans), time.time() - start)
+
+    def _on_sent(self, count, start, future):
+        self._sending = False
+        if self.batching is not None:
+            self._adapt_batching(count, time.time() - start)
+        if future.cancelled():
+            self._on_submit_error(count, 'send cancelled')
+        elif future.exception() is not None:
+            self._on_submit_error(count, future.exception())
+        else:
+            self.metrics.reporter_success(count)
+        self._drain()
+
+    def _on_submit_error(self, count, e):
+        self.metrics.reporter_failure(count)
+        self.error_reporter.error(
+            'Failed to submit trace to transport: %s', e)
+
+    def _send(self, spans):
+        """Send spans out from the loop.
+
+        Any exceptions thrown, or set on the returned future, are caught
+        and counted as failures.
+
+        :param spans: jaeger spans, or spans already encoded by
+            _encode_span() if max_batch_bytes is set
+        :return: whatever transport_handler returned
+        """
+        return self._send_message(self._encode_batch(spans))
+
+    def _watch_send(self, result, message):
+        # coroutines are watched through the Future that will run them
+        if asyncio.iscoroutine(result):
+            result = asyncio.ensure_future(result, loop=self.loop)
+        return super(AsyncioZipkinReporter, self)._watch_send(result, message)
+
+    def _finish(self):
+        if self._closed.done():
+            return
+        for timer in (self._timer, self._replay_timer):
+            if timer is not None:
+                timer.cancel()
+        self._timer = self._replay_timer = None
+        self.logger.info('Span publisher exists')
+        self._closed.set_result(True)
+
+    def _on_loop_thread(self):
+        # asyncio has no public way to tell which thread runs a loop, both
+        # asyncio and trollius loops keep it in _thread_id while running
+        return getattr(self.loop, '_thread_id', None) == get_ident()
+
+    def close(self):
+        """
+        Ensure that all buffered spans are submitted.
+
+        Returns an asyncio Future when called from the loop, so that it can
+        be awaited, and a concurrent.futures.Future otherwise. Either is
+        completed once the buffer is empty.
+        """
+        self.stopped = True
+        self.loop.call_soon_threadsafe(self._drain, True)
+        if self._on_loop_thread():
+            return asyncio.wrap_future(self._closed, loop=self.loop)
+        return self._closed
@@ -0,0 +1,86 @@
+from __future__ import absolute_import, division
+
+import time
+
+
+class AdaptiveBatching(object):
+    """
+    Tunes a reporter's batch size and flush interval to the rate spans are
+    reported at and the time batches take to send.
+
+    Under load, batches grow towards max_batch_size so that they go out no
+    more often than every min_flush_interval, and no faster than they can
+    be sent. With little traffic, batches stay at min_batch_size and
+    partial batches are flushed after at most max_flush_interval, which
+    bounds how long a span waits in the reporter.
+    """
+
+    def __init__(self, min_batch_size=10, max_batch_size=500,
+                 min_flush_interval=0.1, max_flush_interval=1.0,
+                 smoothing=0.3):
+        """
+        :param min_batch_size: the smallest batch size to use
+        :param max_batch_size: the largest batch size to use
+        :param min_flush_interval: the shortest time to aim for between
+            sends, in seconds
+        :param max_flush_interval: the longest time a partial batch may
+            wait to be flushed, in seconds
+        :param smoothing: weight of each observation in the moving averages
+            of the arrival rate and send time, between 0 and 1
+        """
+        if not 0 < min_batch_size <= max_batch_size:
+            raise ValueError('Batch sizes must satisfy 0 < min <= max')
+        if not 0 < min_flush_interval <= max_flush_interval:
+            raise ValueError('Flush intervals must satisfy 0 < min <= max')
+        if not 0 < smoothing <= 1:
+            raise ValueError('Smoothing must be between 0 and 1')
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.min_flush_interval = min_flush_interval
+        self.max_flush_interval = max_flush_interval
+        self.smoothing = smoothing
+        # moving averages of spans reported per second and of the seconds
+        # a batch takes to send
+        self.rate = None
+        self.send_time = None
+        self.batch_size = min_batch_size
+        self.flush_interval = max_flush_interval
+        self._last_observed = time.time()
+
+    def observe(self, spans, send_time=None, now=None):
+        """
+        Records a sent batch and updates batch_size and flush_interval.
+
+        The reporters send batches as spans arrive, so spans sent over time
+        measure the arrival rate. While a backlog is drained, they measure
+        how fast it can be sent instead, which grows batches just as well.
+
+        :param spans: how many spans were sent since the previous call, or
+            since the AdaptiveBatching was created
+        :param send_time: seconds the batch took to send, or None if
+            nothing was sent
+        :param now: the current time, defaults to time.time()
+        """
+        now = time.time() if now is None else now
+        smoothing = self.smoothing
+        last = self._last_observed
+        self._last_observed = now
+        if now > last:
+            rate = spans / (now - last)
+            self.rate = rate if self.rate is None else \
+                self.rate + smoothing * (rate - self.rate)
+        if send_time is not None:
+            self.send_time = send_time if self.send_time is None else \
+                self.send_time + smoothing * (send_time - self.send_time)
+        if not self.rate:
+            return
+        # send no more often than every min_flush_interval, and leave the
+        # transport time to keep up
+        interval = max(self.min_flush_interval, 2 * (self.send_time or 0))
+        self.batch_size = int(min(max(self.rate * interval,
+                                      self.min_batch_size),
+                                  self.max_batch_size))
+        # a partial batch is due by the time a full one would have arrived
+        self.flush_interval = min(max(self.batch_size / self.rate,
+                                      self.min_flush_interval),
+                                  self.max_flush_interval)
@@ -17,6 +17,7 @@ from __future__ import absolute_import
 import six
 from jaeger_client import SpanContext
 from jaeger_client.codecs import Codec
+from opentracing import SpanContextCorruptedException
 
 
 TRACE_ID_NAME = 'X-B3-TraceId'
@@ -24,6 +25,9 @@ SPAN_ID_NAME = 'X-B3-SpanId'
 PARENT_SPAN_ID_NAME = 'X-B3-ParentSpanId'
 SAMPLED_NAME = 'X-B3-Sampled'
 FLAGS_NAME = 'X-B3-Flags'
+# {TraceId}-{SpanId}-{SamplingState}-{ParentSpanId}, where only the first
+# two are required, or only {SamplingState}
+SINGLE_HEADER_NAME = 'b3'
 # NOTE: uber's flags aren't the same as B3/Finagle ones
 SAMPLED_FLAG = 1
 DEBUG_FLAG = 2
@@ -61,7 +65,48 @@ def _extract_flags(v, span_context):
         span_context.flags |= DEBUG_FLAG
 
 
+# SamplingState of the single header -> flags, debug implies sampled
+_SINGLE_HEADER_FLAGS = {
+    '0': 0,
+    '1': SAMPLED_FLAG,
+    'd': SAMPLED_FLAG | DEBUG_FLAG,
+}
+
+
+def _extract_single_header(v):
+    """
+    :return: the SpanContext of a b3 header. One that only carries a
+        sampling state has no trace id: a debug id container for d, else a
+        context whose flags Tracer.start_span takes over the sampler's
+        decision
+    """
+    fields = v.split('-')
+    count = len(fields)
+    try:
+        if count == 1 and fields[0] in _SINGLE_HEADER_FLAGS:
+            if fields[0] == 'd':
+                return SpanContext.with_debug_id(v)
+            return SpanContext(trace_id=None, span_id=None, parent_id=None,
+                               flags=_SINGLE_HEADER_FLAGS[fields[0]])
+        if 2 <= count <= 4:
+            return SpanContext(
+                trace_id=from_lower_hex(fields[0]),
+                span_id=from_lower_hex(fields[1]),
+                parent_id=from_lower_hex(fields[3]) if count == 4 else None,
+                flags=_SINGLE_HEADER_FLAGS[fields[2]] if count > 2 else 0)
+    except (KeyError, ValueError):
+        pass
+    raise SpanContextCorruptedException(
+        'malformed %s header %s' % (SINGLE_HEADER_NAME, v))
+
+
 class B3Codec(Codec):
+    """
+    Propagates span contexts in Zipkin's B3 headers: the X-B3-* ones, or
+    with single_header, the b3 one alone. Either is extracted, the b3 header
+    taking precedence when both are present.
+    """
+
     _extractors = {
         TRACE_ID_NAME.lower(): _extract_trace_id,
         SPAN_ID_NAME.lower(): _extract_span_id,
@@ -70,7 +115,25 @@ class B3Codec(Codec):
         FLAGS_NAME.lower(): _extract_flags,
     }
 
+    def __init__(self, single_header=False):
+        """
+        :param single_header: whether to inject the b3 header rather than
+            the X-B3-* ones
+        """
+        self.single_header = single_header
+
     def inject(self, span_context, carrier):
+        if self.single_header:
+            flags = span_context.flags
+            header = '%s-%s-%s' % (
+                to_lower_hex(span_context.trace_id),
+                to_lower_hex(span_context.span_id),
+                'd' if flags & DEBUG_FLAG else
+                '1' if flags & SAMPLED_FLAG else '0')
+            if span_context.parent_id:
+                header += '-' + to_lower_hex(span_context.parent_id)
+            carrier[SINGLE_HEADER_NAME] = header
+            return
         carrier[TRACE_ID_NAME] = to_lower_hex(span_context.trace_id)
         if span_context.parent_id:
             carrier[PARENT_SPAN_ID_NAME] = to_lower_hex(
@@ -82,10 +145,17 @@ class B3Codec(Codec):
             carrier[FLAGS_NAME] = '1'
 
     def extract(self, carrier):
+        # one lookup rather than a scan of the carrier, case insensitive
+        # for HTTPHeaders
+        single_header = carrier.get(SINGLE_HEADER_NAME)
+        if single_header is not None:
+            return _extract_single_header(single_header)
         span_context = SpanContext(trace_id=None, span_id=None,
                                    parent_id=None, flags=0)
         for k, v in six.iteritems(carrier):
             k = k.lower()
+            if k == SINGLE_HEADER_NAME and v is not None:
+                return _extract_single_header(v)
             extractor = self._extractors.get(k)
             if six.callable(extractor) and v is not None:
                 extractor(v, span_context)
@@ -0,0 +1,70 @@
+from __future__ import absolute_import
+
+import time
+import zlib
+
+COMPRESSION_GZIP = 'gzip'
+# a zlib stream, which is what HTTP calls the deflate content coding
+COMPRESSION_DEFLATE = 'deflate'
+
+_WBITS = {
+    COMPRESSION_GZIP: 16 + zlib.MAX_WBITS,
+    COMPRESSION_DEFLATE: zlib.MAX_WBITS,
+}
+
+
+class CompressedMessage(bytes):
+    """
+    An encoded batch that has been compressed. content_encoding tells
+    transports which HTTP Content-Encoding it is in; messages that were not
+    compressed are plain bytes.
+    """
+    content_encoding = None
+
+
+class Compressor(object):
+    """Compresses encoded batches and reports how well it pays off."""
+
+    def __init__(self, method, metrics_factory, level=6, min_bytes=1024):
+        """
+        :param method: COMPRESSION_GZIP or COMPRESSION_DEFLATE
+        :param metrics_factory: where to report the compression ratio and
+            time
+        :param level: zlib compression level, 1 (fastest) to 9 (smallest)
+        :param min_bytes: batches smaller than this are sent uncompressed
+        """
+        if method not in _WBITS:
+            raise ValueError('Unknown compression %s' % method)
+        if not 0 <= level <= 9:
+            raise ValueError('Compression level must be between 0 and 9')
+        self.method = method
+        self.level = level
+        self.min_bytes = min_bytes
+        self._wbits = _WBITS[method]
+        self.ratio = metrics_factory.create_gauge(
+            name='jaeger.reporter.compression_ratio')
+        self.time = metrics_factory.create_timer(
+            name='jaeger.reporter.compression_time')
+        self.bytes_in = metrics_factory.create_counter(
+            name='jaeger.reporter.compression_bytes', tags={'compressed': 'false'})
+        self.bytes_out = metrics_factory.create_counter(
+            name='jaeger.reporter.compression_bytes', tags={'compressed': 'true'})
+
+    def compress(self, message):
+        """
+        :param message: an encoded batch
+        :return: a CompressedMessage, or message itself if it is smaller
+            than min_bytes
+        """
+        if len(message) < self.min_bytes:
+            return message
+        start = time.time()
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, self._wbits)
+        compressed = CompressedMessage(
+            compressor.compress(message) + compressor.flush())
+        self.time((time.time() - start) * 1000000)
+        compressed.content_encoding = self.method
+        self.bytes_in(len(message))
+        self.bytes_out(len(compressed))
+        self.ratio(float(len(message)) / len(compressed))
+        return compressed
@@ -0,0 +1,211 @@
+from __future__ import absolute_import
+
+import itertools
+
+from ..thrift import (ACCELERATED, LIST_HEADER_SIZE, encoded_spans_in_bytes,
+                      make_zipkin_spans, thrift_objs_in_bytes,
+                      zipkin_span_in_bytes, zipkin_span_in_compact_bytes,
+                      zipkin_spans_in_bytes)
+from .agent import (AGENT_JAEGER_MESSAGE_OVERHEAD, AGENT_MESSAGE_OVERHEAD,
+                    MAX_SEQID, PROTOCOL_BINARY, PROTOCOL_COMPACT,
+                    agent_jaeger_batch, agent_zipkin_batch)
+from .jaeger_thrift import jaeger_span_in_compact_bytes, tracer_process_compact
+from .json_v2 import (encoded_spans_in_json, zipkin_v2_span_in_json,
+                      zipkin_v2_spans_in_json)
+from .proto3 import (encoded_spans_in_proto3, zipkin_v2_span_in_proto3,
+                     zipkin_v2_spans_in_proto3)
+
+ENCODING_THRIFT = 'thrift'
+ENCODING_JSON_V2 = 'json_v2'
+ENCODING_PROTO3 = 'proto3'
+ENCODING_AGENT = 'agent'
+ENCODING_AGENT_BINARY = 'agent_binary'
+ENCODING_AGENT_JAEGER = 'agent_jaeger'
+
+
+class ThriftEncoder(object):
+    """Zipkin v1 spans, as a TBinaryProtocol list of Span structs."""
+
+    name = ENCODING_THRIFT
+    content_type = 'application/x-thrift'
+    http_path = '/api/v1/spans'
+    # encoded size of a list of spans, in excess of the spans themselves
+    list_overhead = LIST_HEADER_SIZE
+    item_overhead = 0
+    # whether a batch must only hold the spans of one tracer
+    single_tracer = False
+
+    def __init__(self, accelerated=None):
+        """
+        :param accelerated: whether to encode with fastbinary, defaults to
+            ACCELERATED
+        """
+        self.accelerated = ACCELERATED if accelerated is None else accelerated
+
+    def encode_span(self, span):
+        return zipkin_span_in_bytes(span, accelerated=self.accelerated)
+
+    def encode_spans(self, spans):
+        # fastbinary beats the pure-Python direct encoder when it is usable
+        if self.accelerated:
+            return thrift_objs_in_bytes(make_zipkin_spans(spans),
+                                        accelerated=True)
+        return zipkin_spans_in_bytes(spans)
+
+    def join(self, encoded_spans):
+        return encoded_spans_in_bytes(encoded_spans)
+
+
+class JsonV2Encoder(object):
+    """Zipkin v2 spans, as a JSON array."""
+
+    name = ENCODING_JSON_V2
+    content_type = 'application/json'
+    http_path = '/api/v2/spans'
+    # brackets, and a comma per span but the last
+    list_overhead = 1
+    item_overhead = 1
+    single_tracer = False
+    accelerated = False
+
+    def encode_span(self, span):
+        return zipkin_v2_span_in_json(span)
+
+    def encode_spans(self, spans):
+        return zipkin_v2_spans_in_json(spans)
+
+    def join(self, encoded_spans):
+        return encoded_spans_in_json(encoded_spans)
+
+
+class Proto3Encoder(object):
+    """Zipkin v2 spans, as a zipkin.proto ListOfSpans message."""
+
+    name = ENCODING_PROTO3
+    content_type = 'application/x-protobuf'
+    http_path = '/api/v2/spans'
+    # spans are encoded along with their ListOfSpans field key and length
+    list_overhead = 0
+    item_overhead = 0
+    single_tracer = False
+    accelerated = False
+
+    def encode_span(self, span):
+        return zipkin_v2_span_in_proto3(span)
+
+    def encode_spans(self, spans):
+        return zipkin_v2_spans_in_proto3(spans)
+
+    def join(self, encoded_spans):
+        return encoded_spans_in_proto3(encoded_spans)
+
+
+class AgentEncoder(object):
+    """
+    Zipkin v1 spans, as a compact encoded jaeger-agent emitZipkinBatch call
+    to be sent by AgentSender.
+    """
+
+    name = ENCODING_AGENT
+    protocol = PROTOCOL_COMPACT
+    content_type = 'application/vnd.apache.thrift.compact'
+    # not accepted by the Zipkin collector
+    http_path = None
+    list_overhead = AGENT_MESSAGE_OVERHEAD[PROTOCOL_COMPACT]
+    item_overhead = 0
+    single_tracer = False
+    accelerated = False
+
+    def __init__(self):
+        self._seqids = itertools.count(1)
+
+    def encode_span(self, span):
+        return zipkin_span_in_compact_bytes(span)
+
+    def encode_spans(self, spans):
+        return self.join([self.encode_span(span) for span in spans])
+
+    def join(self, encoded_spans):
+        return agent_zipkin_batch(encoded_spans,
+                                  seqid=next(self._seqids) & MAX_SEQID,
+                                  protocol=self.protocol)
+
+
+class AgentBinaryEncoder(AgentEncoder):
+    """AgentEncoder for agents reading TBinaryProtocol Zipkin batches."""
+
+    name = ENCODING_AGENT_BINARY
+    protocol = PROTOCOL_BINARY
+    content_type = 'application/x-thrift'
+    list_overhead = AGENT_MESSAGE_OVERHEAD[PROTOCOL_BINARY]
+    accelerated = ACCELERATED
+
+    def encode_span(self, span):
+        return zipkin_span_in_bytes(span, accelerated=self.accelerated)
+
+
+class AgentJaegerEncoder(object):
+    """
+    Jaeger spans, as a compact encoded jaeger-agent emitBatch call to be
+    sent by AgentSender.
+
+    The service name and tracer tags are sent once per batch, in its
+    Process, rather than with every span. A batch must only hold the spans
+    of a single tracer, the reporters end batches where the tracer changes.
+    """
+
+    name = ENCODING_AGENT_JAEGER
+    content_type = 'application/vnd.apache.thrift.compact'
+    # not accepted by the Zipkin collector
+    http_path = None
+    item_overhead = 0
+    accelerated = False
+    single_tracer = True
+
+    def __init__(self):
+        self._seqids = itertools.count(1)
+        self._tracer = None
+        self._process = b''
+        self._process_tags = {}
+
+    @property
+    def list_overhead(self):
+        # grows by the size of the Process once the first span is encoded
+        return AGENT_JAEGER_MESSAGE_OVERHEAD + len(self._process)
+
+    def encode_span(self, span):
+        if span.tracer is not self._tracer:
+            self._process, self._process_tags = \
+                tracer_process_compact(span.tracer)
+            self._tracer = span.tracer
+        return jaeger_span_in_compact_bytes(span, self._process_tags)
+
+    def encode_spans(self, spans):
+        if any(span.tracer is not spans[0].tracer for span in spans):
+            raise ValueError('Spans of a batch must share their tracer')
+        return self.join([self.encode_span(span) for span in spans])
+
+    def join(self, encoded_spans):
+        return agent_jaeger_batch(self._process, encoded_spans,
+                                  seqid=next(self._seqids) & MAX_SEQID)
+
+
+ENCODERS = {
+    ENCODING_THRIFT: ThriftEncoder,
+    ENCODING_JSON_V2: JsonV2Encoder,
+    ENCODING_PROTO3: Proto3Encoder,
+    ENCODING_AGENT: AgentEncoder,
+    ENCODING_AGENT_BINARY: AgentBinaryEncoder,
+    ENCODING_AGENT_JAEGER: AgentJaegerEncoder,
+}
+
+
+def get_encoder(encoding):
+    """
+    :param encoding: one of the ENCODING_* names
+    :returns: a new encoder for it
+    """
+    try:
+        return ENCODERS[encoding]()
+    except KeyError:
+        raise ValueError('Unknown Zipkin encoding %s' % encoding)
@@ -0,0 +1,317 @@
+from __future__ import absolute_import
+
+import collections
+import logging
+import ssl
+import threading
+import time
+
+import tornado.gen
+import tornado.ioloop
+from jaeger_client import ioloop_util
+from jaeger_client.metrics import LegacyMetricsFactory, Metrics
+from jaeger_client.utils import ErrorReporter
+from six.moves.urllib.parse import urlsplit
+from tornado import httputil
+from tornado.concurrent import Future
+from tornado.http1connection import (HTTP1Connection,
+                                     HTTP1ConnectionParameters)
+from tornado.httpclient import HTTPError
+from tornado.iostream import StreamClosedError
+from tornado.tcpclient import TCPClient
+
+from .encoding import ENCODERS, ENCODING_THRIFT
+
+default_logger = logging.getLogger('jaeger_tracing')
+
+
+def _consume_exception(future):
+    # failures are counted and reported by the transport, so tornado need
+    # not log them again when the caller does not read the Future
+    future.exception()
+
+
+def _close_stream(future):
+    if future.exception() is None:
+        future.result().close()
+
+
+class _ResponseDelegate(httputil.HTTPMessageDelegate):
+    """Keeps the status of a collector response, discarding its body."""
+
+    code = None
+    reason = None
+
+    def headers_received(self, start_line, headers):
+        self.code = start_line.code
+        self.reason = start_line.reason
+
+
+class HTTPTransport(object):
+    """
+    Posts encoded batches to a Zipkin collector, for use as the reporters'
+    transport_handler.
+
+    Requests run on an IOLoop over a small pool of keep-alive HTTP/1.1
+    connections. At most max_connections requests are in flight at once,
+    up to max_pending more wait for a connection and batches beyond that
+    are dropped.
+    """
+
+    def __init__(self, url, encoding=ENCODING_THRIFT, io_loop=None,
+                 max_connections=2, max_pending=100, request_timeout=5.0,
+                 keep_alive=True, headers=None, error_reporter=None,
+                 metrics_factory=None, **kwargs):
+        """
+        :param url: collector URL. If it has no path, the collector's
+            endpoint for encoding is used, e.g. /api/v2/spans.
+        :param encoding: the reporter's encoding, which sets the
+            Content-Type of requests
+        :param io_loop: IOLoop to send from. If None, the transport runs
+            its own IOLoop in a background thread.
+        :param max_connections: how many requests may be in flight at once,
+            and how many idle connections are kept open
+        :param max_pending: how many batches may wait for a connection
+            before new ones are dropped
+        :param request_timeout: seconds allowed for connecting, sending a
+            batch and reading the response
+        :param keep_alive: whether to reuse connections between requests
+        :param headers: extra headers to send with every request
+        :param error_reporter:
+        :param metrics_factory: an instance of MetricsFactory class, or None.
+        :param kwargs:
+            'logger'
+        """
+        if ENCODERS.get(encoding, None) is None or \
+                ENCODERS[encoding].http_path is None:
+            raise ValueError('Unsupported Zipkin HTTP encoding %s' % encoding)
+        if max_connections < 1:
+            raise ValueError('Max connections must be at least 1')
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError('Invalid collector URL %s' % url)
+        encoder = ENCODERS[encoding]
+        self.url = url
+        self.content_type = encoder.content_type
+        self.max_connections = max_connections
+        self.max_pending = max_pending
+        self.request_timeout = request_timeout
+        self.keep_alive = keep_alive
+        self.logger = kwargs.get('logger', default_logger)
+        self.error_reporter = error_reporter or ErrorReporter(Metrics())
+        metrics_factory = metrics_factory or LegacyMetricsFactory(Metrics())
+
+        self._host = parts.hostname
+        self._port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self._ssl_options = ssl.create_default_context() \
+            if parts.scheme == 'https' else None
+        path = parts.path if parts.path not in ('', '/') else encoder.http_path
+        if parts.query:
+            path += '?' + parts.query
+        self._path = path
+        self._headers = {
+            'Host': parts.netloc.rpartition('@')[2],
+            'Content-Type': self.content_type,
+        }
+        if not keep_alive:
+            self._headers['Connection'] = 'close'
+        self._headers.update(headers or {})
+        self._params = HTTP1ConnectionParameters(no_keep_alive=not keep_alive)
+
+        self.requests_ok = metrics_factory.create_counter(
+            name='jaeger.reporter.http_requests', tags={'result': 'ok'})
+        self.requests_failed = metrics_factory.create_counter(
+            name='jaeger.reporter.http_requests', tags={'result': 'err'})
+        self.requests_dropped = metrics_factory.create_counter(
+            name='jaeger.reporter.http_requests', tags={'result': 'dropped'})
+        self.connections_new = metrics_factory.create_counter(
+            name='jaeger.reporter.http_connections', tags={'reused': 'false'})
+        self.connections_reused = metrics_factory.create_counter(
+            name='jaeger.reporter.http_connections', tags={'reused': 'true'})
+        self.request_time = metrics_factory.create_timer(
+            name='jaeger.reporter.http_time')
+
+        self._thread = None
+        if io_loop is None:
+            io_loop = tornado.ioloop.IOLoop(make_current=False)
+            self._thread = threading.Thread(target=io_loop.start,
+                                            name='jaeger-zipkin-http')
+            self._thread.daemon = True
+            self._thread.start()
+        self.io_loop = io_loop
+        self._tcp_client = TCPClient(io_loop=io_loop)
+        # open connections waiting for a request, most recently used last
+        self._idle = collections.deque()
+        # (message, future) waiting for a connection
+        self._pending = collections.deque()
+        self._active = 0
+        self._idle_waiters = []
+        self.stopped = False
+
+    def __call__(self, message):
+        """
+        Posts a batch to the collector. Safe to call from any thread.
+
+        :param message: an encoded batch, Content-Encoding is taken from
+            CompressedMessage.content_encoding
+        :return: Future completed once the collector has accepted the batch
+        """
+        if tornado.ioloop.IOLoop.current(instance=False) is self.io_loop:
+            return self._post(message)
+        return ioloop_util.submit(self._post, io_loop=self.io_loop,
+                                  message=message)
+
+    def _post(self, message):
+        future = Future()
+        future.add_done_callback(_consume_exception)
+        if self.stopped:
+            self.requests_dropped(1)
+            future.set_exception(
+                StreamClosedError('Zipkin HTTP transport is closed'))
+        elif self._active < self.max_connections:
+            self._active += 1
+            self.io_loop.spawn_callback(self._work, message, future)
+        elif len(self._pending) < self.max_pending:
+            self._pending.append((message, future))
+        else:
+            self.requests_dropped(1)
+            future.set_exception(
+                HTTPError(599, 'Too many pending Zipkin HTTP requests'))
+        return future
+
+    @tornado.gen.coroutine
+    def _work(self, message, future):
+        """Sends batches until none are pending, one at a time."""
+        while True:
+            start = time.time()
+            try:
+                yield self._request(message)
+            except Exception as e:
+                self.requests_failed(1)
+                self.error_reporter.error(
+                    'Failed to post spans to %s: %s', self.url, e)
+                future.set_exception(e)
+            else:
+                self.requests_ok(1)
+                future.set_result(True)
+            self.request_time((time.time() - start) * 1000000)
+            if not self._pending:
+                break
+            message, future = self._pending.popleft()
+        self._active -= 1
+        if not self._active:
+            waiters, self._idle_waiters = self._idle_waiters, []
+            for waiter in waiters:
+                waiter.set_result(True)
+
+    @tornado.gen.coroutine
+    def _request(self, message):
+        deadline = self.io_loop.time() + self.request_timeout
+        while True:
+            stream = self._checkout()
+            reused = stream is not None
+            if reused:
+                self.connections_reused(1)
+            else:
+                connecting = self._connect()
+                try:
+                    stream = yield tornado.gen.with_timeout(
+                        deadline, connecting, io_loop=self.io_loop,
+                        quiet_exceptions=(StreamClosedError, ssl.SSLError))
+                except tornado.gen.TimeoutError:
+                    # the connection attempt carries on, so close its
+                    # stream should it succeed after all
+                    connecting.add_done_callback(_close_stream)
+                    raise
+                self.connections_new(1)
+            delegate = _ResponseDelegate()
+            try:
+                keep_alive = yield tornado.gen.with_timeout(
+                    deadline, self._exchange(stream, message, delegate),
+                    io_loop=self.io_loop, quiet_exceptions=StreamClosedError)
+            except StreamClosedError:
+                stream.close()
+                if reused and delegate.code is None:
+                    # the collector closed the idle connection, the batch
+                    # was never seen so it is safe to send it again
+                    continue
+                raise
+            except Exception:
+                stream.close()
+                raise
+            if keep_alive and not stream.closed():
+                self._checkin(stream)
+            else:
+                stream.close()
+            if delegate.code is None:
+                raise HTTPError(599, 'No response from Zipkin collector')
+            if not 200 <= delegate.code < 300:
+                raise HTTPError(delegate.code, delegate.reason)
+            return
+
+    def _connect(self):
+        return self._tcp_client.connect(self._host, self._port,
+                                        ssl_options=self._ssl_options)
+
+    @tornado.gen.coroutine
+    def _exchange(self, stream, message, delegate):
+        """
+        Sends one request over stream and reads its response.
+
+        :return: whether the connection may be reused
+        """
+        connection = HTTP1Connection(stream, True, self._params)
+        headers = httputil.HTTPHeaders(self._headers)
+        headers['Content-Length'] = str(len(message))
+        content_encoding = getattr(message, 'content_encoding', None)
+        if content_encoding:
+            headers['Content-Encoding'] = content_encoding
+        connection.write_headers(
+            httputil.RequestStartLine('POST', self._path, 'HTTP/1.1'),
+            headers)
+        connection.write(message)
+        connection.finish()
+        keep_alive = yield connection.read_response(delegate)
+        raise tornado.gen.Return(keep_alive)
+
+    def _checkout(self):
+        while self._idle:
+            stream = self._idle.pop()
+            stream.set_close_callback(None)
+            if not stream.closed():
+                return stream
+        return None
+
+    def _checkin(self, stream):
+        if self.stopped or len(self._idle) >= self.max_connections:
+            stream.close()
+            return
+        self._idle.append(stream)
+        stream.set_close_callback(lambda: self._discard(stream))
+
+    def _discard(self, stream):
+        try:
+            self._idle.remove(stream)
+        except ValueError:
+            pass
+
+    def close(self):
+        """
+        Finishes the requests already submitted and closes all connections.
+        Returns Future that will be completed once it is done.
+        """
+        future = ioloop_util.submit(self._close, io_loop=self.io_loop)
+        if self._thread is not None:
+            future.add_done_callback(
+                lambda _: self.io_loop.add_callback(self.io_loop.stop))
+        return future
+
+    @tornado.gen.coroutine
+    def _close(self):
+        self.stopped = True
+        if self._active:
+            waiter = Future()
+            self._idle_waiters.append(waiter)
+            yield waiter
+        while self._idle:
+            self._idle.pop().close()
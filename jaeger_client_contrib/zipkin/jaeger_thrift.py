@@ -0,0 +1,231 @@
+from __future__ import absolute_import
+
+import json
+import socket
+import struct
+
+import six
+from jaeger_client.thrift import id_to_int, timestamp_micros
+from opentracing.ext import tags as ext_tags
+
+from ..thrift import (_COMPACT_BINARY, _COMPACT_BOOL_FALSE,
+                      _COMPACT_BOOL_TRUE, _COMPACT_I32, _COMPACT_I64,
+                      _COMPACT_LIST, _FIELD_STOP, _write_compact_i32,
+                      _write_compact_i64, _write_compact_list_begin,
+                      _write_compact_string, extract_from_trace_id)
+
+# Hand-written TCompactProtocol encoding of jaeger.thrift's Batch, Process,
+# Span, Log and Tag structs, which jaeger_client ships no types for. Spans
+# leave out the service name and endpoint Zipkin repeats in every span and
+# annotation: a batch names its Process once and spans only refer to it.
+# Like the Zipkin structs, none of these has field ids above 15, so field
+# headers are written inline as (fid - last_fid) << 4 | type.
+_COMPACT_DOUBLE = 7
+
+_pack_double = struct.Struct('<d').pack
+
+_dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+# Tag key, followed by the vType field and the header of the value field
+# of that type: vStr (3), vDouble (4), vBool (5) or vLong (6)
+_TAG_KEY = 1 << 4 | _COMPACT_BINARY
+_TAG_STRING = bytes(bytearray(
+    [1 << 4 | _COMPACT_I32, 0 << 1, 1 << 4 | _COMPACT_BINARY]))
+_TAG_DOUBLE = bytes(bytearray(
+    [1 << 4 | _COMPACT_I32, 1 << 1, 2 << 4 | _COMPACT_DOUBLE]))
+_TAG_BOOL_TRUE = bytes(bytearray(
+    [1 << 4 | _COMPACT_I32, 2 << 1, 3 << 4 | _COMPACT_BOOL_TRUE]))
+_TAG_BOOL_FALSE = bytes(bytearray(
+    [1 << 4 | _COMPACT_I32, 2 << 1, 3 << 4 | _COMPACT_BOOL_FALSE]))
+_TAG_LONG = bytes(bytearray(
+    [1 << 4 | _COMPACT_I32, 3 << 1, 4 << 4 | _COMPACT_I64]))
+
+_PROCESS_IP_TAG_KEY = 'ip'
+
+# span tags of the Span.peer entries
+_PEER_TAGS = (
+    (ext_tags.PEER_SERVICE, 'service_name'),
+    (ext_tags.PEER_HOST_IPV4, 'ipv4'),
+    (ext_tags.PEER_PORT, 'port'),
+)
+
+
+def _write_tag(buf, key, value):
+    buf.append(_TAG_KEY)
+    _write_compact_string(buf, key)
+    if isinstance(value, bool):
+        buf += _TAG_BOOL_TRUE if value else _TAG_BOOL_FALSE
+    elif isinstance(value, six.integer_types):
+        buf += _TAG_LONG
+        _write_compact_i64(buf, value)
+    elif isinstance(value, float):
+        buf += _TAG_DOUBLE
+        buf += _pack_double(value)
+    else:
+        if not isinstance(value, six.string_types):
+            value = str(value)
+        buf += _TAG_STRING
+        _write_compact_string(buf, value)
+    buf += _FIELD_STOP
+
+
+def _log_fields(value):
+    """
+    Returns the fields of a log. jaeger_client keeps key/value logs as JSON
+    objects, which are split back into one field per key.
+    """
+    if value and value[0] == '{':
+        try:
+            fields = json.loads(value)
+        except ValueError:
+            fields = None
+        if isinstance(fields, dict):
+            return sorted(
+                (key, field if isinstance(
+                    field, (six.string_types, six.integer_types, float))
+                 else _dumps(field))
+                for key, field in six.iteritems(fields))
+    return [('event', value or '')]
+
+
+def _span_tags(span, process_tags):
+    tags = []
+    for tag in span.tags:
+        if tag.host is not None:
+            # Zipkin address annotation, added by jaeger_client.thrift
+            continue
+        key = tag.key
+        value = tag.value
+        if process_tags.get(key) == value:
+            # tracer tag of a first-in-process span, sent with the Process
+            continue
+        if key == ext_tags.ERROR and value in ('True', 'true'):
+            value = True
+        tags.append((key, value))
+    if span.is_rpc():
+        tags.append((ext_tags.SPAN_KIND,
+                     ext_tags.SPAN_KIND_RPC_CLIENT if span.is_rpc_client()
+                     else ext_tags.SPAN_KIND_RPC_SERVER))
+    if span.component:
+        tags.append((ext_tags.COMPONENT, span.component))
+    peer = span.peer
+    if peer:
+        for key, name in _PEER_TAGS:
+            if name in peer:
+                tags.append((key, peer[name]))
+    return tags
+
+
+def _write_jaeger_span(buf, span, process_tags):
+    """Writes a single jaeger Span as a TCompactProtocol jaeger.thrift Span."""
+    hi, lo = extract_from_trace_id(span.trace_id)
+    # traceIdLow, traceIdHigh, spanId, parentSpanId and operationName are
+    # required and written one after the other
+    buf.append(1 << 4 | _COMPACT_I64)
+    _write_compact_i64(buf, id_to_int(lo))
+    buf.append(1 << 4 | _COMPACT_I64)
+    _write_compact_i64(buf, id_to_int(hi))
+    buf.append(1 << 4 | _COMPACT_I64)
+    _write_compact_i64(buf, id_to_int(span.span_id))
+    buf.append(1 << 4 | _COMPACT_I64)
+    _write_compact_i64(buf, id_to_int(span.parent_id) or 0)
+    buf.append(1 << 4 | _COMPACT_BINARY)
+    _write_compact_string(buf, span.operation_name or '')
+    # references (6) are left out, parentSpanId is the only reference
+    buf.append(2 << 4 | _COMPACT_I32)
+    _write_compact_i32(buf, span.flags)
+    buf.append(1 << 4 | _COMPACT_I64)
+    _write_compact_i64(buf, timestamp_micros(span.start_time))
+    buf.append(1 << 4 | _COMPACT_I64)
+    _write_compact_i64(buf, timestamp_micros(span.end_time - span.start_time))
+    fid = 9
+
+    tags = _span_tags(span, process_tags)
+    if tags:
+        buf.append((10 - fid) << 4 | _COMPACT_LIST)
+        fid = 10
+        _write_compact_list_begin(buf, len(tags))
+        for key, value in tags:
+            _write_tag(buf, key, value)
+    logs = span.logs
+    if logs:
+        buf.append((11 - fid) << 4 | _COMPACT_LIST)
+        _write_compact_list_begin(buf, len(logs))
+        for log in logs:
+            buf.append(1 << 4 | _COMPACT_I64)
+            _write_compact_i64(buf, log.timestamp)
+            buf.append(1 << 4 | _COMPACT_LIST)
+            fields = _log_fields(log.value)
+            _write_compact_list_begin(buf, len(fields))
+            for key, value in fields:
+                _write_tag(buf, key, value)
+            buf += _FIELD_STOP
+    buf += _FIELD_STOP
+
+
+def encode_process_compact(service_name, tags):
+    """
+    Returns a jaeger.thrift Process struct in TCompactProtocol format bytes.
+
+    :param service_name: the tracer's service name
+    :param tags: dictionary of process tags
+    """
+    buf = bytearray()
+    buf.append(1 << 4 | _COMPACT_BINARY)
+    _write_compact_string(buf, service_name)
+    if tags:
+        buf.append(1 << 4 | _COMPACT_LIST)
+        _write_compact_list_begin(buf, len(tags))
+        for key in sorted(tags):
+            _write_tag(buf, key, tags[key])
+    buf += _FIELD_STOP
+    return bytes(buf)
+
+
+# (service_name, ip_address, tags) -> (encoded Process, process tags)
+_tracer_processes = {}
+
+
+def tracer_process_compact(tracer):
+    """
+    Returns the TCompactProtocol encoded Process of a tracer: its service
+    name, ip address and tracer tags. Also returns the tracer tags as they
+    appear on spans, for jaeger_span_in_compact_bytes() to leave out.
+
+    :param tracer: tracer with service_name, ip_address and tags attributes
+    :returns: (bytes, dict) tuple
+    """
+    key = (tracer.service_name, tracer.ip_address,
+           tuple(sorted(six.iteritems(tracer.tags))))
+    cached = _tracer_processes.get(key)
+    if cached is None:
+        tags = dict(tracer.tags)
+        ip_address = tracer.ip_address
+        if isinstance(ip_address, six.integer_types) and ip_address:
+            ip_address = socket.inet_ntoa(
+                struct.pack('!I', ip_address & 0xffffffff))
+        if ip_address:
+            tags[_PROCESS_IP_TAG_KEY] = ip_address
+        # Span.set_tag() keeps tag values as strings of up to 256 chars
+        span_tags = dict((k, str(v)[:256]) for k, v in six.iteritems(tracer.tags))
+        cached = _tracer_processes.setdefault(
+            key, (encode_process_compact(tracer.service_name, tags),
+                  span_tags))
+    return cached
+
+
+def jaeger_span_in_compact_bytes(span, process_tags=None):
+    """
+    Returns a single jaeger span encoded as a TCompactProtocol jaeger.thrift
+    Span struct, to be sent in a batch by agent_jaeger_batch().
+
+    :param span: jaeger span to encode
+    :param process_tags: span tags carried by the batch's Process, from
+        tracer_process_compact(). Defaults to those of the span's tracer.
+    """
+    if process_tags is None:
+        _, process_tags = tracer_process_compact(span.tracer)
+    buf = bytearray()
+    with span.update_lock:
+        _write_jaeger_span(buf, span, process_tags)
+    return bytes(buf)
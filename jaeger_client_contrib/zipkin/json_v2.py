@@ -0,0 +1,149 @@
+from __future__ import absolute_import
+
+import json
+import socket
+import struct
+
+import six
+from jaeger_client.thrift import ipv4_to_int, timestamp_micros
+
+from .codecs import to_lower_hex
+from ..thrift_gen.zipkincore import constants as zipkin_constants
+
+_dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def _ipv4_to_str(ipv4):
+    if isinstance(ipv4, six.string_types):
+        ipv4 = ipv4_to_int(ipv4)
+    if not ipv4:
+        return None
+    return socket.inet_ntoa(struct.pack('!i', ipv4))
+
+
+def _make_endpoint(ipv4, port, service_name):
+    endpoint = {}
+    if service_name:
+        endpoint['serviceName'] = service_name.lower()
+    ipv4 = _ipv4_to_str(ipv4)
+    if ipv4:
+        endpoint['ipv4'] = ipv4
+    if port:
+        endpoint['port'] = int(port)
+    return endpoint
+
+
+# (ip_address, service_name) -> JSON encoded localEndpoint
+_tracer_endpoints = {}
+
+
+def tracer_endpoint_json(tracer):
+    """
+    Returns the Zipkin v2 localEndpoint of a tracer, JSON encoded once and
+    shared by all spans and batches.
+
+    :param tracer: tracer with ip_address and service_name attributes
+    """
+    key = (tracer.ip_address, tracer.service_name)
+    cached = _tracer_endpoints.get(key)
+    if cached is None:
+        cached = _tracer_endpoints.setdefault(key, _dumps(_make_endpoint(
+            ipv4=tracer.ip_address, port=0, service_name=tracer.service_name)))
+    return cached
+
+
+def _write_json_span(buf, span, endpoint_json):
+    """
+    Appends the Zipkin v2 JSON object of a span to buf, a list of strings.
+    Only tags, whose keys are not known upfront, go through a dict.
+    """
+    buf.append('{"traceId":"')
+    buf.append(to_lower_hex(span.trace_id))
+    if span.parent_id:
+        buf.append('","parentId":"{:016x}'.format(span.parent_id))
+    buf.append('","id":"{:016x}"'.format(span.span_id))
+    tags = dict((tag.key, tag.value) for tag in span.tags)
+    remote_endpoint = None
+    if span.is_rpc():
+        buf.append(',"kind":"CLIENT"' if span.is_rpc_client()
+                   else ',"kind":"SERVER"')
+        if span.peer:
+            remote_endpoint = _make_endpoint(
+                ipv4=span.peer.get('ipv4', 0),
+                port=span.peer.get('port', 0),
+                service_name=span.peer.get('service_name', ''))
+    else:
+        tags[zipkin_constants.LOCAL_COMPONENT] = \
+            span.component or span.tracer.service_name
+    if span.operation_name is not None:
+        buf.append(',"name":')
+        buf.append(_dumps(span.operation_name))
+    buf.append(',"timestamp":%d,"duration":%d' % (
+        timestamp_micros(span.start_time),
+        timestamp_micros(span.end_time - span.start_time)))
+    if span.is_debug():
+        buf.append(',"debug":true')
+    buf.append(',"localEndpoint":')
+    buf.append(endpoint_json)
+    if remote_endpoint is not None:
+        buf.append(',"remoteEndpoint":')
+        buf.append(_dumps(remote_endpoint))
+    if span.logs:
+        sep = ',"annotations":['
+        for log in span.logs:
+            buf.append('%s{"timestamp":%d,"value":' % (sep, log.timestamp))
+            buf.append(_dumps(log.value))
+            buf.append('}')
+            sep = ','
+        buf.append(']')
+    if tags:
+        buf.append(',"tags":')
+        buf.append(_dumps(tags))
+    buf.append('}')
+
+
+def zipkin_v2_span_in_json(span):
+    """
+    Returns a single jaeger span as a Zipkin v2 JSON object, to be joined
+    into a batch by encoded_spans_in_json().
+
+    :param span: jaeger span to encode
+    :returns: UTF-8 encoded bytes
+    """
+    endpoint_json = tracer_endpoint_json(span.tracer)
+    buf = []
+    with span.update_lock:
+        _write_json_span(buf, span, endpoint_json)
+    return ''.join(buf).encode('utf-8')
+
+
+def zipkin_v2_spans_in_json(spans):
+    """
+    Returns a list of jaeger spans as a Zipkin v2 JSON array, as accepted
+    by the collector's POST /api/v2/spans.
+
+    :param spans: jaeger spans to encode
+    :returns: UTF-8 encoded bytes
+    """
+    buf = ['[']
+    tracer = endpoint_json = None
+    for span in spans:
+        if span.tracer is not tracer:
+            tracer = span.tracer
+            endpoint_json = tracer_endpoint_json(tracer)
+        if len(buf) > 1:
+            buf.append(',')
+        with span.update_lock:
+            _write_json_span(buf, span, endpoint_json)
+    buf.append(']')
+    return ''.join(buf).encode('utf-8')
+
+
+def encoded_spans_in_json(encoded_spans):
+    """
+    Returns a Zipkin v2 JSON array of spans already encoded by
+    zipkin_v2_span_in_json().
+
+    :param encoded_spans: list of encoded Zipkin v2 spans
+    """
+    return b'[' + b','.join(encoded_spans) + b']'
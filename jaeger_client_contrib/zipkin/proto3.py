@@ -0,0 +1,251 @@
+from __future__ import absolute_import
+
+import struct
+
+import six
+from jaeger_client.thrift import ipv4_to_int, timestamp_micros
+
+from ..thrift_gen.zipkincore import constants as zipkin_constants
+
+# Hand-written encoder for zipkin.proto's ListOfSpans, so that reporting
+# spans as protobuf does not need the protobuf runtime.
+
+_WIRE_VARINT = 0
+_WIRE_FIXED64 = 1
+_WIRE_LENGTH_DELIMITED = 2
+
+
+def _key(field_number, wire_type):
+    return struct.pack('!B', field_number << 3 | wire_type)
+
+
+_pack_fixed64 = struct.Struct('<Q').pack
+_pack_id = struct.Struct('!Q').pack
+_pack_trace_id_128 = struct.Struct('!QQ').pack
+_pack_ipv4 = struct.Struct('!i').pack
+
+_LIST_OF_SPANS_SPANS = _key(1, _WIRE_LENGTH_DELIMITED)
+
+_SPAN_TRACE_ID = _key(1, _WIRE_LENGTH_DELIMITED)
+_SPAN_PARENT_ID = _key(2, _WIRE_LENGTH_DELIMITED)
+_SPAN_ID = _key(3, _WIRE_LENGTH_DELIMITED)
+_SPAN_KIND = _key(4, _WIRE_VARINT)
+_SPAN_NAME = _key(5, _WIRE_LENGTH_DELIMITED)
+_SPAN_TIMESTAMP = _key(6, _WIRE_FIXED64)
+_SPAN_DURATION = _key(7, _WIRE_VARINT)
+_SPAN_LOCAL_ENDPOINT = _key(8, _WIRE_LENGTH_DELIMITED)
+_SPAN_REMOTE_ENDPOINT = _key(9, _WIRE_LENGTH_DELIMITED)
+_SPAN_ANNOTATIONS = _key(10, _WIRE_LENGTH_DELIMITED)
+_SPAN_TAGS = _key(11, _WIRE_LENGTH_DELIMITED)
+_SPAN_DEBUG = _key(12, _WIRE_VARINT)
+
+_ENDPOINT_SERVICE_NAME = _key(1, _WIRE_LENGTH_DELIMITED)
+_ENDPOINT_IPV4 = _key(2, _WIRE_LENGTH_DELIMITED)
+_ENDPOINT_PORT = _key(4, _WIRE_VARINT)
+
+_ANNOTATION_TIMESTAMP = _key(1, _WIRE_FIXED64)
+_ANNOTATION_VALUE = _key(2, _WIRE_LENGTH_DELIMITED)
+
+# map<string, string> entries
+_TAG_KEY = _key(1, _WIRE_LENGTH_DELIMITED)
+_TAG_VALUE = _key(2, _WIRE_LENGTH_DELIMITED)
+
+_KIND_CLIENT = 1
+_KIND_SERVER = 2
+
+
+def _write_varint(buf, value):
+    if 0 <= value < 0x80:
+        buf.append(value)
+        return
+    if value < 0:
+        # int32 and int64 fields encode negative values in ten bytes
+        value += 1 << 64
+    while value > 0x7f:
+        buf.append(value & 0x7f | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _write_bytes(buf, value):
+    _write_varint(buf, len(value))
+    # extend() rather than +=, python-future's newbytes hijacks __radd__
+    buf.extend(value)
+
+
+def _utf8(value):
+    if isinstance(value, six.text_type):
+        return value.encode('utf-8')
+    return value
+
+
+def _write_string(buf, value):
+    _write_bytes(buf, _utf8(value))
+
+
+def encode_endpoint(ipv4, port, service_name):
+    """
+    Returns a zipkin.proto Endpoint message.
+
+    :param ipv4: IPv4 address as a string or a signed 32 bit integer
+    :param port: port number, 0 if unknown
+    :param service_name: service name, lower-cased as in Zipkin v1
+    """
+    buf = bytearray()
+    if service_name:
+        buf += _ENDPOINT_SERVICE_NAME
+        _write_string(buf, service_name.lower())
+    if isinstance(ipv4, six.string_types):
+        ipv4 = ipv4_to_int(ipv4)
+    if ipv4:
+        buf += _ENDPOINT_IPV4
+        _write_bytes(buf, _pack_ipv4(ipv4))
+    port = int(port or 0)
+    if port:
+        buf += _ENDPOINT_PORT
+        _write_varint(buf, port)
+    return bytes(buf)
+
+
+# (ip_address, service_name) -> encoded local_endpoint field
+_tracer_endpoints = {}
+
+
+def tracer_endpoint_proto(tracer):
+    """
+    Returns the local_endpoint field of a tracer's spans, encoded once and
+    shared by all spans and batches.
+
+    :param tracer: tracer with ip_address and service_name attributes
+    """
+    key = (tracer.ip_address, tracer.service_name)
+    cached = _tracer_endpoints.get(key)
+    if cached is None:
+        buf = bytearray(_SPAN_LOCAL_ENDPOINT)
+        _write_bytes(buf, encode_endpoint(
+            ipv4=tracer.ip_address, port=0, service_name=tracer.service_name))
+        cached = _tracer_endpoints.setdefault(key, bytes(buf))
+    return cached
+
+
+def _write_tag(buf, key, value):
+    key = _utf8(key)
+    value = _utf8(value)
+    buf += _SPAN_TAGS
+    if len(key) + len(value) + 4 < 0x80:
+        # the common case, every length, that of the entry included, fits
+        # in a single byte varint
+        buf.append(len(key) + len(value) + 4)
+        buf += _TAG_KEY
+        buf.append(len(key))
+        buf.extend(key)
+        buf += _TAG_VALUE
+        buf.append(len(value))
+        buf.extend(value)
+        return
+    entry = bytearray(_TAG_KEY)
+    _write_bytes(entry, key)
+    entry += _TAG_VALUE
+    _write_bytes(entry, value)
+    _write_bytes(buf, entry)
+
+
+def _write_span(buf, span, endpoint_field):
+    """
+    Writes a single jaeger Span as a ListOfSpans entry: the spans field
+    key, the message length and the zipkin.proto Span message.
+    """
+    msg = bytearray()
+    trace_id = span.trace_id
+    msg += _SPAN_TRACE_ID
+    if trace_id >> 64:
+        _write_bytes(msg, _pack_trace_id_128(
+            trace_id >> 64, trace_id & 0xffffffffffffffff))
+    else:
+        _write_bytes(msg, _pack_id(trace_id))
+    if span.parent_id:
+        msg += _SPAN_PARENT_ID
+        _write_bytes(msg, _pack_id(span.parent_id))
+    msg += _SPAN_ID
+    _write_bytes(msg, _pack_id(span.span_id))
+    is_rpc = span.is_rpc()
+    if is_rpc:
+        is_client = span.is_rpc_client()
+        msg += _SPAN_KIND
+        _write_varint(msg, _KIND_CLIENT if is_client else _KIND_SERVER)
+    if span.operation_name:
+        msg += _SPAN_NAME
+        _write_string(msg, span.operation_name)
+    msg += _SPAN_TIMESTAMP
+    msg += _pack_fixed64(timestamp_micros(span.start_time))
+    duration = timestamp_micros(span.end_time - span.start_time)
+    if duration:
+        msg += _SPAN_DURATION
+        _write_varint(msg, duration)
+    msg += endpoint_field
+    if is_rpc and span.peer:
+        msg += _SPAN_REMOTE_ENDPOINT
+        _write_bytes(msg, encode_endpoint(
+            ipv4=span.peer.get('ipv4', 0),
+            port=span.peer.get('port', 0),
+            service_name=span.peer.get('service_name', '')))
+    for log in span.logs:
+        annotation = bytearray(_ANNOTATION_TIMESTAMP)
+        annotation += _pack_fixed64(log.timestamp)
+        if log.value:
+            annotation += _ANNOTATION_VALUE
+            _write_string(annotation, log.value)
+        msg += _SPAN_ANNOTATIONS
+        _write_bytes(msg, annotation)
+    for tag in span.tags:
+        _write_tag(msg, tag.key, tag.value)
+    if not is_rpc:
+        _write_tag(msg, zipkin_constants.LOCAL_COMPONENT,
+                   span.component or span.tracer.service_name)
+    if span.is_debug():
+        msg += _SPAN_DEBUG
+        _write_varint(msg, 1)
+    buf += _LIST_OF_SPANS_SPANS
+    _write_bytes(buf, msg)
+
+
+def zipkin_v2_span_in_proto3(span):
+    """
+    Returns a single jaeger span as a ListOfSpans entry. Entries are
+    joined into a ListOfSpans message by plain concatenation.
+
+    :param span: jaeger span to encode
+    """
+    buf = bytearray()
+    endpoint_field = tracer_endpoint_proto(span.tracer)
+    with span.update_lock:
+        _write_span(buf, span, endpoint_field)
+    return bytes(buf)
+
+
+def zipkin_v2_spans_in_proto3(spans):
+    """
+    Returns a list of jaeger spans as a zipkin.proto ListOfSpans message,
+    as accepted by the collector's POST /api/v2/spans.
+
+    :param spans: jaeger spans to encode
+    """
+    buf = bytearray()
+    tracer = endpoint_field = None
+    for span in spans:
+        if span.tracer is not tracer:
+            tracer = span.tracer
+            endpoint_field = tracer_endpoint_proto(tracer)
+        with span.update_lock:
+            _write_span(buf, span, endpoint_field)
+    return bytes(buf)
+
+
+def encoded_spans_in_proto3(encoded_spans):
+    """
+    Returns a ListOfSpans message of spans already encoded by
+    zipkin_v2_span_in_proto3().
+
+    :param encoded_spans: list of encoded ListOfSpans entries
+    """
+    return b''.join(encoded_spans)
@@ -14,31 +14,87 @@
 
 from __future__ import absolute_import
 
+import collections
+import functools
 import logging
+import threading
+import time
+from concurrent.futures import Future
 
 import six
 import tornado.gen
 import tornado.ioloop
-import tornado.queues
+import tornado.concurrent
+import tornado.locks
 from jaeger_client import ioloop_util
 from jaeger_client.constants import DEFAULT_FLUSH_INTERVAL
 from jaeger_client.metrics import LegacyMetricsFactory, Metrics
 from jaeger_client.reporter import NullReporter, ReporterMetrics
 from jaeger_client.utils import ErrorReporter
+from opentracing.ext import tags as ext_tags
 
-from ..thrift import make_zipkin_spans, thrift_objs_in_bytes
+from .compression import Compressor
+from .encoding import ENCODING_THRIFT, get_encoder
 
 
 default_logger = logging.getLogger('jaeger_tracing')
 
+# classes of spans kept under pressure by priority shedding, in order of
+# precedence, and of the ordinary spans shed first
+SHED_CLASS_DEBUG = 'debug'
+SHED_CLASS_ERROR = 'error'
+SHED_CLASS_ROOT = 'root'
+SHED_CLASS_ORDINARY = 'ordinary'
+_SHED_CLASSES = (SHED_CLASS_DEBUG, SHED_CLASS_ERROR, SHED_CLASS_ROOT,
+                 SHED_CLASS_ORDINARY)
+# priority_class() -> index in _SHED_CLASSES
+_SHED_RANKS = {SHED_CLASS_DEBUG: 0, SHED_CLASS_ERROR: 1, SHED_CLASS_ROOT: 2,
+               None: 3}
 
-class ZipkinReporter(NullReporter):
-    """Receives completed spans from Tracer and submits them out of process."""
+
+def is_local_root(span):
+    """
+    :return: whether span is the first span of its trace in this process: a
+        root span, or a server span whose parent is in the caller
+    """
+    return span.parent_id is None or (
+        span.is_rpc() and not span.is_rpc_client())
+
+
+def is_error(span):
+    """
+    :return: whether span has an error tag set to true
+    """
+    for tag in span.tags:
+        if tag.key == ext_tags.ERROR and tag.value in ('True', 'true'):
+            return True
+    return False
+
+
+def priority_class(span):
+    """
+    :return: the priority class of a finished span, or None for ordinary
+        spans
+    """
+    if span.is_debug():
+        return SHED_CLASS_DEBUG
+    if is_error(span):
+        return SHED_CLASS_ERROR
+    if is_local_root(span):
+        return SHED_CLASS_ROOT
+    return None
+
+
+class BaseZipkinReporter(NullReporter):
+    """Batching, encoding and metrics shared by the Zipkin reporters."""
 
     def __init__(self, transport_handler, queue_capacity=100, batch_size=10,
-                 flush_interval=DEFAULT_FLUSH_INTERVAL, io_loop=None,
-                 error_reporter=None, metrics_factory=None,
-                 **kwargs):
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, error_reporter=None,
+                 metrics_factory=None, max_batch_bytes=None,
+                 encoding=ENCODING_THRIFT, compression=None,
+                 compression_level=6, compression_min_bytes=1024, spool=None,
+                 spool_replay_rate=10, spool_retry_interval=5.0,
+                 priority_shedding=False, batching=None, **kwargs):
         """
         :param transport_handler: Callback function that takes a message
             parameter and handles logging it
@@ -46,26 +102,341 @@ class ZipkinReporter(NullReporter):
             starting to drop spans
         :param batch_size: how many spans we can submit at once to Collector
         :param flush_interval: how often the auto-flush is called (in seconds)
-        :param io_loop: which IOLoop to use.
         :param error_reporter:
         :param metrics_factory: an instance of MetricsFactory class, or None.
+        :param max_batch_bytes: if set, spans are encoded as they are taken
+            off the queue and a batch is also closed once its encoded size
+            would exceed this many bytes. Spans that do not fit in a batch on
+            their own are dropped.
+        :param encoding: which wire format to encode spans in, see
+            jaeger_client_contrib.zipkin.encoding
+        :param compression: if set, 'gzip' or 'deflate' to compress
+            batches with. Compressed batches are handed to transport_handler
+            as CompressedMessage, max_batch_bytes still bounds their size
+            before compression.
+        :param compression_level: zlib compression level, 1 to 9
+        :param compression_min_bytes: batches smaller than this are not
+            compressed
+        :param spool: if set, a Spool that keeps the batches which fail to
+            send, including those a transport rejects for having too many
+            in flight, to be sent again once the transport recovers
+        :param spool_replay_rate: how many spooled batches may be sent again
+            per second
+        :param spool_retry_interval: seconds to hold back replaying after a
+            send has failed
+        :param priority_shedding: if set, spans are not simply dropped once
+            queue_capacity spans are buffered. A debug, error or
+            first-in-process span takes the place of the latest span of
+            the lowest class below its own, ordinary spans first, and
+            higher classes are sent first.
+        :param batching: if set, an AdaptiveBatching that takes over
+            batch_size and flush_interval, tuning them to the traffic
         :param kwargs:
             'logger'
         :return:
         """
-        from threading import Lock
-
         self.transport_handler = transport_handler
         self.queue_capacity = queue_capacity
+        self.batching = batching
+        # adaptive batches stay well below the queue capacity, so that the
+        # consumer wakes up before spans have to be dropped
+        self.max_adaptive_batch_size = max(1, queue_capacity // 2)
+        if batching is not None:
+            batch_size = min(batching.batch_size,
+                             self.max_adaptive_batch_size)
+            flush_interval = batching.flush_interval
         self.batch_size = batch_size
+        self.flush_interval = flush_interval or None
         self.metrics_factory = metrics_factory or \
             LegacyMetricsFactory(Metrics())
         self.metrics = ReporterMetrics(self.metrics_factory)
         self.error_reporter = error_reporter or ErrorReporter(Metrics())
         self.logger = kwargs.get('logger', default_logger)
+        self.encoder = get_encoder(encoding)
+        self.compressor = Compressor(
+            compression, self.metrics_factory, level=compression_level,
+            min_bytes=compression_min_bytes) if compression else None
+        self.metrics_factory.create_gauge(
+            name='jaeger.reporter.thrift_accelerated')(
+                int(self.encoder.accelerated))
 
         if queue_capacity < batch_size:
             raise ValueError('Queue capacity cannot be less than batch size')
+        list_overhead = self.encoder.list_overhead
+        if max_batch_bytes is not None and max_batch_bytes <= list_overhead:
+            raise ValueError('Max batch bytes must exceed %d' % list_overhead)
+        self.max_batch_bytes = max_batch_bytes
+        # spans of each class of _SHED_CLASSES, the ordinary ones in
+        # _buffer, which holds all spans without priority_shedding
+        self._queues = tuple(collections.deque() for _ in _SHED_CLASSES)
+        self._buffer = self._queues[-1]
+        # encoded span that did not fit in the previous batch, and its tracer
+        self._carry = None
+        self._carry_tracer = None
+        self.spans_reported = 0
+        self.spans_dropped = 0
+        self.priority_shedding = priority_shedding
+        self.spans_shed = dict(
+            (shed_class, self.metrics_factory.create_counter(
+                name='jaeger.reporter.spans_shed', tags={'class': shed_class}))
+            for shed_class in _SHED_CLASSES)
+
+        if spool is not None and spool_replay_rate <= 0:
+            raise ValueError('Spool replay rate must be positive')
+        self.spool = spool
+        self.spool_replay_rate = spool_replay_rate
+        self.spool_retry_interval = spool_retry_interval
+        # how often to check the spool for batches to replay
+        self.spool_replay_interval = min(1.0, 1.0 / spool_replay_rate)
+        self._replay_allowance = 0.0
+        self._replay_time = time.time()
+        # no replaying before this time, set when a send fails
+        self._replay_after = 0
+        self.spool_replayed = self.metrics_factory.create_counter(
+            name='jaeger.reporter.spool_replayed')
+
+    def _adapt_batching(self, spans, send_time):
+        """
+        Updates batch_size and flush_interval after a batch is sent.
+
+        :param spans: how many spans the batch had
+        :param send_time: seconds spent sending it
+        """
+        batching = self.batching
+        batching.observe(spans, send_time)
+        self.batch_size = min(batching.batch_size,
+                              self.max_adaptive_batch_size)
+        self.flush_interval = batching.flush_interval
+
+    def _buffered(self):
+        return sum(len(queue) for queue in self._queues)
+
+    def load(self):
+        """
+        Reports how loaded the reporter is, for AdaptiveSampler. The totals
+        are updated without a lock and may miss a few concurrent spans.
+
+        :return: (spans reported, spans dropped, occupancy) tuple of the
+            running totals of spans passed to report_span() and of those
+            dropped, and of the fraction of queue_capacity buffered
+        """
+        return (self.spans_reported, self.spans_dropped,
+                self._buffered() / float(self.queue_capacity))
+
+    def _admit(self, span):
+        """
+        Buffers a finished span, or drops it if the reporter is stopped or
+        queue_capacity spans are already buffered. The capacity check is
+        not atomic with the append, concurrent callers may overshoot
+        queue_capacity by a few spans.
+
+        :return: how many spans were buffered before, or None if the span
+            was dropped
+        """
+        buffered = self._buffered()
+        self.spans_reported += 1
+        if self.stopped:
+            self.spans_dropped += 1
+            self.metrics.reporter_dropped(1)
+            return None
+        if not self.priority_shedding:
+            if buffered >= self.queue_capacity:
+                self.spans_dropped += 1
+                self.metrics.reporter_dropped(1)
+                return None
+            self._buffer.append(span)
+            return buffered
+        rank = _SHED_RANKS[priority_class(span)]
+        queues = self._queues
+        if buffered >= self.queue_capacity:
+            self.spans_dropped += 1
+            self.metrics.reporter_dropped(1)
+            # the latest span of the lowest class present below this one's
+            # makes room for it, as if the order they arrived in had been
+            # swapped
+            for lower in range(len(queues) - 1, rank, -1):
+                if queues[lower]:
+                    queues[lower].pop()
+                    self.spans_shed[_SHED_CLASSES[lower]](1)
+                    break
+            else:
+                self.spans_shed[_SHED_CLASSES[rank]](1)
+                return None
+            buffered -= 1
+        queues[rank].append(span)
+        return buffered
+
+    def _take_batch(self, flush):
+        """
+        Take the next batch off the buffer.
+
+        :param flush: whether a partial batch may be taken
+        :return: the spans to submit, or None if there are not enough
+        """
+        # spans of a higher class go first
+        queues = self._queues if self.priority_shedding else (self._buffer,)
+        pending = self._buffered() + (self._carry is not None)
+        if not pending or (not flush and pending < self.batch_size):
+            return None
+        encoder = self.encoder
+        item_overhead = encoder.item_overhead
+        # with the agent_jaeger encoding the spans of a batch share the
+        # Process of their tracer, so a batch ends where the tracer changes
+        single_tracer = encoder.single_tracer
+        tracer = self._carry_tracer
+        spans = []
+        batch_bytes = 0
+        if self._carry is not None:
+            spans.append(self._carry)
+            batch_bytes += len(self._carry) + item_overhead
+            self._carry = None
+        while len(spans) < self.batch_size:
+            for queue in queues:
+                if queue:
+                    span = queue.popleft()
+                    break
+            else:
+                break
+            if single_tracer:
+                if spans and span.tracer is not tracer:
+                    queue.appendleft(span)
+                    break
+                tracer = span.tracer
+            if self.max_batch_bytes:
+                span = self._encode_span(span)
+                if span is None:
+                    continue
+                size = len(span) + item_overhead
+                # read after encoding, as the overhead of the agent_jaeger
+                # encoding depends on the spans' tracer
+                if spans and encoder.list_overhead + batch_bytes + size > \
+                        self.max_batch_bytes:
+                    self._carry = span
+                    self._carry_tracer = tracer
+                    break
+                batch_bytes += size
+            spans.append(span)
+        return spans
+
+    def _encode_span(self, span):
+        """
+        Encode a span for byte-budgeted batching.
+
+        :return: the encoded span, or None if it was dropped
+        """
+        encoder = self.encoder
+        try:
+            encoded = encoder.encode_span(span)
+        except Exception as e:
+            self.metrics.reporter_failure(1)
+            self.error_reporter.error('Failed to encode span: %s', e)
+            return None
+        if encoder.list_overhead + encoder.item_overhead + len(encoded) > \
+                self.max_batch_bytes:
+            self.metrics.reporter_dropped(1)
+            self.error_reporter.error(
+                'Dropped span of %d bytes, exceeds max batch bytes %d',
+                len(encoded), self.max_batch_bytes)
+            return None
+        return encoded
+
+    def _encode_batch(self, spans):
+        """
+        :param spans: jaeger spans, or spans already encoded by
+            _encode_span() if max_batch_bytes is set
+        :return: the message to hand to transport_handler
+        """
+        if self.max_batch_bytes:
+            message = self.encoder.join(spans)
+        else:
+            message = self.encoder.encode_spans(spans)
+        if self.compressor is not None:
+            message = self.compressor.compress(message)
+        return message
+
+    def _send_message(self, message):
+        """
+        Hands an encoded batch to transport_handler. With a spool, a batch
+        that fails to send, right away or once the Future returned by
+        transport_handler completes, is kept in the spool.
+
+        :return: whatever transport_handler returned
+        """
+        try:
+            result = self.transport_handler(message)
+        except Exception:
+            self._spool_message(message)
+            raise
+        if self.spool is not None:
+            result = self._watch_send(result, message)
+        return result
+
+    def _watch_send(self, result, message):
+        if hasattr(result, 'add_done_callback'):
+            result.add_done_callback(
+                functools.partial(self._on_watched_send, message))
+        return result
+
+    def _on_watched_send(self, message, future):
+        if future.cancelled() or future.exception() is not None:
+            self._spool_message(message)
+
+    def _spool_message(self, message):
+        if self.spool is not None:
+            self._replay_after = time.time() + self.spool_retry_interval
+            self.spool.append(message)
+
+    def _replay_spool(self):
+        """
+        Sends spooled batches again, at most spool_replay_rate per second
+        and not until spool_retry_interval after the last failed send.
+        Batches that fail again go back to the end of the spool.
+        """
+        now = time.time()
+        rate = self.spool_replay_rate
+        allowance = min(
+            self._replay_allowance + (now - self._replay_time) * rate,
+            max(rate, 1.0))
+        self._replay_time = now
+        while allowance >= 1 and now >= self._replay_after:
+            message = self.spool.pop()
+            if message is None:
+                # no burst of saved up allowance for the next outage
+                allowance = 0.0
+                break
+            allowance -= 1
+            self.spool_replayed(1)
+            try:
+                self._send_message(message)
+            except Exception as e:
+                self.error_reporter.error(
+                    'Failed to replay spooled batch: %s', e)
+        self._replay_allowance = allowance
+
+
+class ZipkinReporter(BaseZipkinReporter):
+    """Receives completed spans from Tracer and submits them out of process."""
+
+    def __init__(self, transport_handler, queue_capacity=100, batch_size=10,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, io_loop=None,
+                 error_reporter=None, metrics_factory=None,
+                 max_batch_bytes=None, **kwargs):
+        """
+        :param io_loop: which IOLoop to use.
+
+        See BaseZipkinReporter for the other parameters.
+        """
+        from threading import Lock
+
+        super(ZipkinReporter, self).__init__(
+            transport_handler=transport_handler,
+            queue_capacity=queue_capacity,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            error_reporter=error_reporter,
+            metrics_factory=metrics_factory,
+            max_batch_bytes=max_batch_bytes,
+            **kwargs)
 
         self.io_loop = io_loop
         if self.io_loop is None:
@@ -73,67 +444,80 @@ class ZipkinReporter(NullReporter):
         elif not six.callable(self.transport_handler):
             self.logger.error('Zipkin Reporter has no transport handler')
         else:
-            self.queue = tornado.queues.Queue(maxsize=queue_capacity)
-            self.stop = object()
             self.stopped = False
             self.stop_lock = Lock()
-            self.flush_interval = flush_interval or None
+            self._wakeup = tornado.locks.Event()
+            self._consumed = tornado.concurrent.Future()
+            # whether a callback to wake the consumer up is already pending
+            # for spans reported from other threads
+            self._handoff_scheduled = False
 
             self.io_loop.spawn_callback(self._consume_queue)
+            self._replay_timer = None
+            if self.spool is not None:
+                self._replay_timer = tornado.ioloop.PeriodicCallback(
+                    self._replay_spool, self.spool_replay_interval * 1000,
+                    io_loop=self.io_loop)
+                self.io_loop.add_callback(self._replay_timer.start)
 
     def report_span(self, span):
-        # We should not be calling `queue.put_nowait()` from random threads,
-        # only from the same IOLoop where the queue is consumed (T333431).
+        buffered = self._admit(span)
+        if buffered is None:
+            return
+        # The Event may only be touched from the IOLoop (T333431), other
+        # threads share one scheduled callback per wakeup.
         if tornado.ioloop.IOLoop.current(instance=False) == self.io_loop:
-            self._report_span_from_ioloop(span)
-        else:
-            self.io_loop.add_callback(self._report_span_from_ioloop, span)
+            # wake up on the first span to start the flush timer
+            if buffered == 0 or buffered + 1 >= self.batch_size:
+                self._wakeup.set()
+        elif not self._handoff_scheduled:
+            # the span is appended before the flag is read, so a callback
+            # that has already cleared the flag is guaranteed to see it
+            self._handoff_scheduled = True
+            self.io_loop.add_callback(self._wake_from_thread)
 
-    def _report_span_from_ioloop(self, span):
-        try:
-            with self.stop_lock:
-                stopped = self.stopped
-            if stopped:
-                self.metrics.reporter_dropped(1)
-            else:
-                self.queue.put_nowait(span)
-        except tornado.queues.QueueFull:
-            self.metrics.reporter_dropped(1)
+    def _wake_from_thread(self):
+        self._handoff_scheduled = False
+        self._wakeup.set()
 
     @tornado.gen.coroutine
     def _consume_queue(self):
-        spans = []
-        stopped = False
-        while not stopped:
-            while len(spans) < self.batch_size:
+        # when the oldest buffered span is due to be flushed
+        deadline = None
+        while True:
+            stopped = self.stopped
+            flush = stopped
+            buffered = self._buffered()
+            if not flush and buffered < self.batch_size:
+                if buffered and self.flush_interval and deadline is None:
+                    deadline = self.io_loop.time() + self.flush_interval
                 try:
-                    # using timeout allows periodic flush with smaller packet
-                    timeout = self.flush_interval + self.io_loop.time() \
-                        if self.flush_interval and spans else None
-                    span = yield self.queue.get(timeout=timeout)
+                    yield self._wakeup.wait(timeout=deadline)
                 except tornado.gen.TimeoutError:
+                    flush = True
+                self._wakeup.clear()
+            while True:
+                spans = self._take_batch(flush)
+                if not spans:
                     break
-                else:
-                    if span == self.stop:
-                        stopped = True
-                        self.queue.task_done()
-                        # don't return yet, submit accumulated spans first
-                        break
-                    else:
-                        spans.append(span)
-            if spans:
+                start = time.time()
                 yield self._submit(spans)
-                for _ in spans:
-                    self.queue.task_done()
-                spans = spans[:0]
+                if self.batching is not None:
+                    self._adapt_batching(len(spans), time.time() - start)
+            if not self._buffered() and self._carry is None:
+                deadline = None
+                if stopped:
+                    break
+            elif flush:
+                deadline = None
         self.logger.info('Span publisher exists')
+        self._consumed.set_result(True)
 
     @tornado.gen.coroutine
     def _submit(self, spans):
         if not spans:
             return
         try:
-            spans = make_zipkin_spans(spans)
             yield self._send(spans)
             self.metrics.reporter_success(len(spans))
         except Exception as e:
@@ -148,16 +532,16 @@ class ZipkinReporter(NullReporter):
         Any exceptions thrown will be caught above in the _submit exception
         handler.'''
 
-        :param spans:
+        :param spans: jaeger spans, or spans already encoded by
+            _encode_span() if max_batch_bytes is set
         :return:
         """
-        message = thrift_objs_in_bytes(spans)
-        self.transport_handler(message)
+        self._send_message(self._encode_batch(spans))
 
     def close(self):
         """
-        Ensure that all spans from the queue are submitted.
-        Returns Future that will be completed once the queue is empty.
+        Ensure that all buffered spans are submitted.
+        Returns Future that will be completed once the buffer is empty.
         """
         with self.stop_lock:
             self.stopped = True
@@ -166,5 +550,124 @@ class ZipkinReporter(NullReporter):
 
     @tornado.gen.coroutine
     def _flush(self):
-        yield self.queue.put(self.stop)
-        yield self.queue.join()
+        if self._replay_timer is not None:
+            self._replay_timer.stop()
+        self._wakeup.set()
+        yield self._consumed
+
+
+class ThreadedZipkinReporter(BaseZipkinReporter):
+    """
+    Submits spans from a background flusher thread, for processes without
+    a Tornado IOLoop (e.g. sync WSGI workers).
+
+    report_span() only appends to a deque, and wakes the flusher up once a
+    full batch is buffered, so callers never block on a lock held by the
+    flusher while it is sending.
+    """
+
+    def __init__(self, transport_handler, queue_capacity=100, batch_size=10,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, error_reporter=None,
+                 metrics_factory=None, max_batch_bytes=None, **kwargs):
+        """
+        See BaseZipkinReporter for the parameters. transport_handler is
+        called from the flusher thread.
+        """
+        super(ThreadedZipkinReporter, self).__init__(
+            transport_handler=transport_handler,
+            queue_capacity=queue_capacity,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            error_reporter=error_reporter,
+            metrics_factory=metrics_factory,
+            max_batch_bytes=max_batch_bytes,
+            **kwargs)
+
+        self.stopped = False
+        self._wakeup = threading.Event()
+        self._closed = Future()
+        self._thread = threading.Thread(target=self._run,
+                                        name='jaeger-zipkin-reporter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def report_span(self, span):
+        buffered = self._admit(span)
+        if buffered is not None and (buffered + 1) % self.batch_size == 0:
+            self._wakeup.set()
+
+    def _run(self):
+        last_flush = time.time()
+        while True:
+            timeout = self.flush_interval
+            if timeout is not None:
+                # wait out what is left of the interval since the last flush
+                timeout = max(0, timeout - (time.time() - last_flush))
+            if self.spool is not None and len(self.spool):
+                timeout = self.spool_replay_interval if timeout is None \
+                    else min(timeout, self.spool_replay_interval)
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            stopped = self.stopped
+            now = time.time()
+            flush = stopped or (self.flush_interval is not None and
+                                now - last_flush >= self.flush_interval)
+            try:
+                self._drain(flush)
+                if self.spool is not None and not stopped:
+                    self._replay_spool()
+            except Exception as e:  # pragma: no cover
+                self.error_reporter.error('Zipkin flusher failed: %s', e)
+            if flush:
+                last_flush = now
+            if stopped:
+                break
+        self.metrics.reporter_dropped(self._buffered())
+        for queue in self._queues:
+            queue.clear()
+        self.logger.info('Span publisher exists')
+        self._closed.set_result(True)
+
+    def _drain(self, flush):
+        """
+        Submit buffered spans in batches.
+
+        :param flush: whether to also submit a trailing partial batch
+        """
+        while True:
+            spans = self._take_batch(flush)
+            if not spans:
+                break
+            start = time.time()
+            self._submit(spans)
+            if self.batching is not None:
+                self._adapt_batching(len(spans), time.time() - start)
+
+    def _submit(self, spans):
+        try:
+            self._send(spans)
+            self.metrics.reporter_success(len(spans))
+        except Exception as e:
+            self.metrics.reporter_failure(len(spans))
+            self.error_reporter.error(
+                'Failed to submit trace to transport: %s', e)
+
+    def _send(self, spans):
+        """Send spans out from the flusher thread.
+
+        Any exceptions thrown will be caught above in the _submit exception
+        handler.
+
+        :param spans: jaeger spans, or spans already encoded by
+            _encode_span() if max_batch_bytes is set
+        """
+        self._send_message(self._encode_batch(spans))
+
+    def close(self):
+        """
+        Ensure that all buffered spans are submitted.
+        Returns Future that will be completed once the buffer is empty.
+        """
+        self.stopped = True
+        self._wakeup.set()
+        return self._closed
@@ -0,0 +1,247 @@
+from __future__ import absolute_import
+
+import collections
+import errno
+import fcntl
+import os
+import struct
+import tempfile
+import threading
+import zlib
+
+from jaeger_client.metrics import LegacyMetricsFactory, Metrics
+
+from .compression import COMPRESSION_DEFLATE, COMPRESSION_GZIP, CompressedMessage
+
+DEFAULT_SPOOL_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_SPOOL_SEGMENT_BYTES = 1024 * 1024
+
+_SEGMENT_SUFFIX = '.spool'
+_LOCK_FILE = 'lock'
+
+# length, crc32 and content encoding of the batch that follows
+_RECORD_HEADER = struct.Struct('!IIB')
+
+_CONTENT_ENCODINGS = (None, COMPRESSION_GZIP, COMPRESSION_DEFLATE)
+
+
+class Spool(object):
+    """
+    A bounded on-disk FIFO of encoded batches, for the reporters to keep
+    the batches they fail to send until the transport recovers.
+
+    Batches are appended to segment files, and read back in order. A
+    segment is deleted once all its batches have been read, so an empty
+    spool takes no disk space. Batches that do not fit in max_bytes are
+    dropped.
+
+    The segments live in a subdirectory of directory that the Spool keeps
+    locked until it is closed, so that processes sharing directory, such
+    as prefork WSGI workers, each have their own and max_bytes applies to
+    each of them. A subdirectory left over by a process that is gone is
+    taken over by the next Spool, which replays its segments, including
+    batches that were already read from the first one: delivery is at
+    least once. The lock is shared with child processes forked afterwards,
+    so create the Spool in the process that uses it.
+
+    All methods are thread safe.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_SPOOL_MAX_BYTES,
+                 segment_bytes=DEFAULT_SPOOL_SEGMENT_BYTES,
+                 metrics_factory=None):
+        """
+        :param directory: where to keep segment files, created if missing
+        :param max_bytes: the most disk space the segment files may take
+        :param segment_bytes: size past which a new segment file is started
+        :param metrics_factory: an instance of MetricsFactory class, or None.
+        """
+        if segment_bytes > max_bytes:
+            raise ValueError('Segment bytes cannot exceed max bytes')
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        self.directory = directory
+        self.slot, self._lock_fd = _claim_slot(directory)
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        metrics_factory = metrics_factory or LegacyMetricsFactory(Metrics())
+        self.writes_ok = metrics_factory.create_counter(
+            name='jaeger.reporter.spool_writes', tags={'result': 'ok'})
+        self.writes_dropped = metrics_factory.create_counter(
+            name='jaeger.reporter.spool_writes', tags={'result': 'dropped'})
+        self.reads_ok = metrics_factory.create_counter(
+            name='jaeger.reporter.spool_reads', tags={'result': 'ok'})
+        self.reads_corrupt = metrics_factory.create_counter(
+            name='jaeger.reporter.spool_reads', tags={'result': 'corrupt'})
+        self.size_gauge = metrics_factory.create_gauge(
+            name='jaeger.reporter.spool_bytes')
+
+        self._lock = threading.Lock()
+        # [sequence number, size] of each segment, oldest first
+        self._segments = collections.deque()
+        for name in sorted(os.listdir(self.slot)):
+            seq, suffix = os.path.splitext(name)
+            if suffix == _SEGMENT_SUFFIX and seq.isdigit():
+                self._segments.append(
+                    [int(seq), os.path.getsize(self._path(int(seq)))])
+        self.bytes = sum(size for _, size in self._segments)
+        self._writer = None
+        self._reader = None
+        # offset of the next batch in the first segment
+        self._offset = 0
+        self.closed = False
+        self.size_gauge(self.bytes)
+
+    def _path(self, seq):
+        return os.path.join(self.slot, '%010d%s' % (seq, _SEGMENT_SUFFIX))
+
+    def __len__(self):
+        """The number of bytes of segments yet to be read."""
+        with self._lock:
+            return self.bytes - self._offset if self._segments else 0
+
+    def append(self, message):
+        """
+        :param message: an encoded batch, CompressedMessage is stored along
+            with its content_encoding
+        :return: whether the batch was spooled, rather than dropped
+        """
+        encoding = getattr(message, 'content_encoding', None)
+        record = _RECORD_HEADER.pack(
+            len(message), zlib.crc32(message) & 0xffffffff,
+            _CONTENT_ENCODINGS.index(encoding)) + bytes(message)
+        with self._lock:
+            if self.closed or self.bytes + len(record) > self.max_bytes:
+                self.writes_dropped(1)
+                return False
+            segments = self._segments
+            # segments left over by a previous process are never appended to
+            if self._writer is None or (
+                    segments[-1][1] and
+                    segments[-1][1] + len(record) > self.segment_bytes):
+                self._start_segment()
+            self._writer.write(record)
+            # flushed to the OS right away, so that the batch outlives a
+            # crash of this process
+            self._writer.flush()
+            segments[-1][1] += len(record)
+            self.bytes += len(record)
+            self.writes_ok(1)
+            self.size_gauge(self.bytes)
+        return True
+
+    def _start_segment(self):
+        seq = self._segments[-1][0] + 1 if self._segments else 0
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = open(self._path(seq), 'ab')
+        self._segments.append([seq, 0])
+
+    def pop(self):
+        """
+        Removes the oldest batch from the spool.
+
+        :return: the batch, or None if the spool is empty
+        """
+        with self._lock:
+            while self._segments and not self.closed:
+                seq, size = self._segments[0]
+                message = self._read(seq, size) \
+                    if self._offset < size else None
+                if self._offset >= size:
+                    # reclaim the space as soon as the segment is read
+                    self._remove_first_segment()
+                if message is not None:
+                    self.reads_ok(1)
+                    return message
+            return None
+
+    def _read(self, seq, size):
+        if self._reader is None:
+            self._reader = open(self._path(seq), 'rb')
+        self._reader.seek(self._offset)
+        header = self._reader.read(_RECORD_HEADER.size)
+        if len(header) == _RECORD_HEADER.size:
+            length, crc, encoding = _RECORD_HEADER.unpack(header)
+            message = self._reader.read(length)
+            if len(message) == length and encoding < len(
+                    _CONTENT_ENCODINGS) and \
+                    zlib.crc32(message) & 0xffffffff == crc:
+                self._offset += _RECORD_HEADER.size + length
+                if _CONTENT_ENCODINGS[encoding] is not None:
+                    message = CompressedMessage(message)
+                    message.content_encoding = _CONTENT_ENCODINGS[encoding]
+                return message
+        # a torn write or a damaged file, skip the rest of the segment
+        self.reads_corrupt(1)
+        self._offset = size
+        return None
+
+    def _remove_first_segment(self):
+        seq, size = self._segments.popleft()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if not self._segments and self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        os.remove(self._path(seq))
+        self._offset = 0
+        self.bytes -= size
+        self.size_gauge(self.bytes)
+
+    def close(self):
+        """Closes the segment files, keeping unread batches for next time."""
+        with self._lock:
+            self.closed = True
+            for f in (self._reader, self._writer):
+                if f is not None:
+                    f.close()
+            self._reader = self._writer = None
+            if self._lock_fd is not None:
+                # lets the next Spool take the segments over
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+
+def _claim_slot(directory):
+    """
+    Returns a subdirectory of directory that no other Spool uses, taking
+    over one left by a closed Spool or a process that is gone if there is
+    one, along with the descriptor of the lock file that keeps it ours.
+    """
+    while True:
+        for name in sorted(os.listdir(directory)):
+            slot = os.path.join(directory, name)
+            if os.path.isdir(slot):
+                fd = _lock_slot(slot)
+                if fd is not None:
+                    return slot, fd
+        slot = tempfile.mkdtemp(prefix='%d-' % os.getpid(), dir=directory)
+        fd = _lock_slot(slot)
+        # another process may have locked the new slot first
+        if fd is not None:
+            return slot, fd
+
+
+def _lock_slot(slot):
+    """
+    :return: the descriptor of the locked lock file of slot, or None if
+        another Spool holds the lock
+    """
+    fd = os.open(os.path.join(slot, _LOCK_FILE), os.O_RDWR | os.O_CREAT,
+                 0o644)
+    try:
+        # not inherited by programs this process runs
+        fcntl.fcntl(fd, fcntl.F_SETFD,
+                    fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except (IOError, OSError) as e:
+        os.close(fd)
+        if e.errno in (errno.EAGAIN, errno.EACCES):
+            return None
+        raise
+    return fd
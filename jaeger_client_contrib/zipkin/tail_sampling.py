@@ -0,0 +1,205 @@
+from __future__ import absolute_import
+
+import collections
+import threading
+import time
+
+from jaeger_client.metrics import LegacyMetricsFactory, Metrics
+from jaeger_client.reporter import NullReporter
+
+from .reporter import is_error, is_local_root
+
+DEFAULT_MAX_TRACES = 1000
+DEFAULT_MAX_SPANS = 10000
+DEFAULT_MAX_SPANS_PER_TRACE = 500
+DEFAULT_MAX_TRACE_AGE = 60.0
+
+# why spans left the buffer before their trace's local root finished
+EVICTED_MAX_TRACES = 'max_traces'
+EVICTED_MAX_SPANS = 'max_spans'
+EVICTED_MAX_TRACE_AGE = 'max_trace_age'
+EVICTED_MAX_SPANS_PER_TRACE = 'max_spans_per_trace'
+
+
+class _Trace(object):
+    """The buffered spans of a trace, and whether it is worth keeping."""
+
+    __slots__ = ('spans', 'keep', 'started')
+
+    def __init__(self, started):
+        self.spans = []
+        self.keep = False
+        self.started = started
+
+
+class TailSamplingReporter(NullReporter):
+    """
+    Holds back finished spans per trace until the local root span of the
+    trace finishes, that is its first span in this process, and then hands
+    all of them to reporter, or discards them all.
+
+    A trace is kept if any of its spans has an error tag, is a debug span or
+    took at least latency_threshold seconds, and otherwise with the given
+    probability. Like ProbabilisticSampler, the probability is applied to
+    the trace id, so that all the processes of a trace agree. Spans that
+    finish after their local root follow its decision, as long as it is
+    among the last max_traces decisions.
+
+    Only sampled spans reach reporters, so the tracer's sampler decides how
+    many traces are candidates, e.g. a const sampler for all of them.
+
+    The buffer holds at most max_traces traces, max_spans spans in total
+    and max_spans_per_trace spans of a trace, beyond which further spans of
+    the trace are dropped, except for its local root, which replaces the
+    last span buffered. Traces are decided early, on the spans buffered
+    so far, when they are the oldest and one of the first two limits is
+    reached, or when a new trace comes in and they have been buffered for
+    max_trace_age seconds.
+    """
+
+    def __init__(self, reporter, latency_threshold=None, probability=0.0,
+                 max_traces=DEFAULT_MAX_TRACES, max_spans=DEFAULT_MAX_SPANS,
+                 max_spans_per_trace=DEFAULT_MAX_SPANS_PER_TRACE,
+                 max_trace_age=DEFAULT_MAX_TRACE_AGE, metrics_factory=None):
+        """
+        :param reporter: the reporter to hand the spans of kept traces to
+        :param latency_threshold: seconds a span must take for its trace to
+            be kept, or None to keep no trace for its latency
+        :param probability: the chance to keep any other trace
+        :param max_traces: how many traces to buffer at most
+        :param max_spans: how many spans to buffer at most
+        :param max_spans_per_trace: how many spans of a trace to buffer at
+            most
+        :param max_trace_age: seconds after which a trace is decided without
+            waiting for its local root
+        :param metrics_factory: an instance of MetricsFactory class, or None.
+        """
+        if not 0.0 <= probability <= 1.0:
+            raise ValueError('Probability must be between 0.0 and 1.0')
+        if min(max_traces, max_spans, max_spans_per_trace) <= 0:
+            raise ValueError('Buffer limits must be positive')
+        self.reporter = reporter
+        self.latency_threshold = latency_threshold
+        self.probability = probability
+        self.boundary = probability * (1 << 64)
+        self.max_traces = max_traces
+        self.max_spans = max_spans
+        self.max_spans_per_trace = max_spans_per_trace
+        self.max_trace_age = max_trace_age
+
+        metrics_factory = metrics_factory or LegacyMetricsFactory(Metrics())
+        self.traces_kept = metrics_factory.create_counter(
+            name='jaeger.tail_sampling.traces', tags={'decision': 'kept'})
+        self.traces_discarded = metrics_factory.create_counter(
+            name='jaeger.tail_sampling.traces', tags={'decision': 'discarded'})
+        self.spans_kept = metrics_factory.create_counter(
+            name='jaeger.tail_sampling.spans', tags={'decision': 'kept'})
+        self.spans_discarded = metrics_factory.create_counter(
+            name='jaeger.tail_sampling.spans', tags={'decision': 'discarded'})
+        self.spans_evicted = dict(
+            (reason, metrics_factory.create_counter(
+                name='jaeger.tail_sampling.spans_evicted',
+                tags={'reason': reason}))
+            for reason in (EVICTED_MAX_TRACES, EVICTED_MAX_SPANS,
+                           EVICTED_MAX_TRACE_AGE, EVICTED_MAX_SPANS_PER_TRACE))
+        self.buffered_gauge = metrics_factory.create_gauge(
+            name='jaeger.tail_sampling.buffered_spans')
+
+        self._lock = threading.Lock()
+        # trace id -> _Trace, oldest first
+        self._traces = collections.OrderedDict()
+        # trace id -> whether it was kept, of the latest decisions
+        self._decisions = collections.OrderedDict()
+        self._buffered = 0
+
+    def report_span(self, span):
+        forward = []
+        with self._lock:
+            trace_id = span.trace_id
+            decision = self._decisions.get(trace_id)
+            if decision is not None:
+                # a span that finished after its local root
+                if decision:
+                    self.spans_kept(1)
+                    forward.append(span)
+                else:
+                    self.spans_discarded(1)
+            else:
+                trace = self._traces.get(trace_id)
+                if trace is None:
+                    self._make_room(forward)
+                    trace = self._traces[trace_id] = _Trace(time.time())
+                if not trace.keep and self._is_notable(span):
+                    trace.keep = True
+                local_root = is_local_root(span)
+                if len(trace.spans) < self.max_spans_per_trace:
+                    trace.spans.append(span)
+                    self._buffered += 1
+                else:
+                    self.spans_evicted[EVICTED_MAX_SPANS_PER_TRACE](1)
+                    if local_root:
+                        # the local root matters more than any of its
+                        # children, so it takes the place of the last one
+                        trace.spans[-1] = span
+                if local_root:
+                    forward.extend(self._decide(trace_id))
+                while self._buffered > self.max_spans:
+                    self._evict(EVICTED_MAX_SPANS, forward)
+            self.buffered_gauge(self._buffered)
+        for kept in forward:
+            self.reporter.report_span(kept)
+
+    def _is_notable(self, span):
+        if span.is_debug() or is_error(span):
+            return True
+        threshold = self.latency_threshold
+        return threshold is not None and \
+            span.end_time - span.start_time >= threshold
+
+    def _make_room(self, forward):
+        """Decides the oldest traces to make room for a new one."""
+        traces = self._traces
+        if traces:
+            expired = time.time() - self.max_trace_age
+            while traces and next(iter(traces.values())).started <= expired:
+                self._evict(EVICTED_MAX_TRACE_AGE, forward)
+        if len(traces) >= self.max_traces:
+            self._evict(EVICTED_MAX_TRACES, forward)
+
+    def _evict(self, reason, forward):
+        trace_id = next(iter(self._traces))
+        self.spans_evicted[reason](len(self._traces[trace_id].spans))
+        forward.extend(self._decide(trace_id))
+
+    def _decide(self, trace_id):
+        """
+        Decides a buffered trace and removes it from the buffer.
+
+        :return: its spans, if it is kept
+        """
+        trace = self._traces.pop(trace_id)
+        spans = trace.spans
+        self._buffered -= len(spans)
+        keep = trace.keep or (trace_id & 0xffffffffffffffff) < self.boundary
+        decisions = self._decisions
+        decisions[trace_id] = keep
+        if len(decisions) > self.max_traces:
+            decisions.popitem(last=False)
+        if keep:
+            self.traces_kept(1)
+            self.spans_kept(len(spans))
+            return spans
+        self.traces_discarded(1)
+        self.spans_discarded(len(spans))
+        return ()
+
+    def close(self):
+        """Decides the buffered traces, and closes reporter."""
+        forward = []
+        with self._lock:
+            while self._traces:
+                forward.extend(self._decide(next(iter(self._traces))))
+            self.buffered_gauge(0)
+        for kept in forward:
+            self.reporter.report_span(kept)
+        return self.reporter.close()
@@ -50,6 +50,9 @@ setup(
     ],
     test_suite='tests',
     extras_require={
+        'asyncio': [
+            'trollius; python_version < "3.4"',
+        ],
         'tests': [
             'mock==1.0.1',
             'pytest>=2.7,<3',
@@ -58,6 +61,7 @@ setup(
             'pytest-timeout',
             'pytest-tornado',
             'pytest-benchmark[histogram]>=3.0.0rc1',
+            'trollius; python_version < "3.4"',
             'flake8',
             'flake8-quotes',
             'codecov',
@@ -1,8 +1,10 @@
 import unittest
 
 from jaeger_client import ConstSampler, RateLimitingSampler
+from opentracing import Format
 
-from jaeger_client_contrib import Config, ProbabilisticSampler
+from jaeger_client_contrib import (AdaptiveSampler, Config, FileSampler,
+                                   PerOperationSampler, ProbabilisticSampler)
 
 
 class ConfigTests(unittest.TestCase):
@@ -38,6 +40,193 @@ class ConfigTests(unittest.TestCase):
         assert type(c.sampler) is RateLimitingSampler
         assert c.sampler.traces_per_second == 1234
 
+    def test_adaptive_sampler(self):
+        c = Config({'sampler': {'type': 'adaptive', 'param': 100}},
+                   service_name='x')
+        assert type(c.sampler) is AdaptiveSampler
+        assert c.sampler.target_spans_per_second == 100
+        assert c.sampler.rate == 1.0
+        c = Config({'sampler': {'type': 'adaptive', 'param': '100',
+                                'min_rate': '0.01', 'max_rate': '0.5'}},
+                   service_name='x')
+        assert (c.sampler.min_rate, c.sampler.max_rate) == (0.01, 0.5)
+        assert c.sampler.rate == 0.5
+
+    def test_per_operation_sampler(self):
+        c = Config({'sampler': {'type': 'per_operation', 'param': 0.01}},
+                   service_name='x')
+        sampler = c.sampler
+        assert type(sampler) is PerOperationSampler
+        assert sampler.default_rate == 0.01
+        assert sampler.lower_bound == 1.0 / 600
+        assert sampler.max_operations == 2000
+        assert sampler.operations == {}
+        c = Config({'sampler': {
+            'type': 'per_operation',
+            'param': '0.01',
+            'lower_bound': '0.1',
+            'max_operations': '100',
+            'operations': {
+                'health': '0.0001',
+                'checkout': {'rate': 1, 'lower_bound': 0},
+                'search': {'rate': 0.5},
+            }}}, service_name='x')
+        sampler = c.sampler
+        assert (sampler.lower_bound, sampler.max_operations) == (0.1, 100)
+        assert sampler.operations == {'health': (0.0001, 0.1),
+                                      'checkout': (1.0, 0.0),
+                                      'search': (0.5, 0.1)}
+
+    def test_file_sampler(self):
+        c = Config({'sampler': {'type': 'file',
+                                'param': '/nonexistent/sampling.json',
+                                'poll_interval': '1'}}, service_name='x')
+        sampler = c.sampler
+        assert type(sampler) is FileSampler
+        assert sampler.path == '/nonexistent/sampling.json'
+        assert sampler.poll_interval == 1
+
+    def test_reporter_max_batch_bytes(self):
+        c = Config({}, service_name='x')
+        assert c.reporter_max_batch_bytes is None
+        c = Config({'reporter_max_batch_bytes': '65000'}, service_name='x')
+        assert c.reporter_max_batch_bytes == 65000
+
+    def test_reporter_encoding(self):
+        c = Config({}, service_name='x')
+        assert c.reporter_encoding == 'thrift'
+        c = Config({'reporter_encoding': 'json_v2'}, service_name='x')
+        assert c.reporter_encoding == 'json_v2'
+
+    def test_reporter_compression(self):
+        c = Config({}, service_name='x')
+        assert c.reporter_compression is None
+        assert c.reporter_compression_level == 6
+        assert c.reporter_compression_min_bytes == 1024
+        c = Config({'reporter_compression': 'gzip',
+                    'reporter_compression_level': '1',
+                    'reporter_compression_min_bytes': '0'}, service_name='x')
+        assert c.reporter_compression == 'gzip'
+        assert c.reporter_compression_level == 1
+        assert c.reporter_compression_min_bytes == 0
+
+    def test_reporter_http_transport(self):
+        c = Config({}, service_name='x')
+        assert c.reporter_collector_url is None
+        assert c.reporter_http_max_connections == 2
+        assert c.reporter_http_timeout == 5.0
+        c = Config({'reporter_collector_url': 'http://zipkin:9411',
+                    'reporter_http_max_connections': '4',
+                    'reporter_http_timeout': '0.5'}, service_name='x')
+        assert c.reporter_collector_url == 'http://zipkin:9411'
+        assert c.reporter_http_max_connections == 4
+        assert c.reporter_http_timeout == 0.5
+
+    def test_reporter_agent(self):
+        c = Config({}, service_name='x')
+        assert c.reporter_agent_host is None
+        assert c.reporter_agent_port == 5775
+        assert c.reporter_agent_max_packet_size == 65000
+        assert c.reporter_agent_protocol == 'compact'
+        c = Config({'reporter_agent_host': 'jaeger-agent',
+                    'reporter_agent_port': '5776',
+                    'reporter_agent_max_packet_size': '1500'},
+                   service_name='x')
+        assert c.reporter_agent_host == 'jaeger-agent'
+        assert c.reporter_agent_port == 5776
+        assert c.reporter_agent_max_packet_size == 1500
+        c = Config({'reporter_agent_protocol': 'binary'}, service_name='x')
+        assert c.reporter_agent_protocol == 'binary'
+        with self.assertRaises(ValueError):
+            Config({'reporter_agent_protocol': 'json'},
+                   service_name='x').reporter_agent_protocol
+        assert c.reporter_agent_format == 'zipkin'
+        c = Config({'reporter_agent_format': 'jaeger'}, service_name='x')
+        assert c.reporter_agent_format == 'jaeger'
+        assert c.reporter_agent_port == 6831
+        with self.assertRaises(ValueError):
+            Config({'reporter_agent_format': 'json'},
+                   service_name='x').reporter_agent_format
+
+    def test_reporter_spool(self):
+        c = Config({}, service_name='x')
+        assert c.reporter_spool_dir is None
+        assert c.reporter_spool_max_bytes == 64 * 1024 * 1024
+        assert c.reporter_spool_replay_rate == 10
+        c = Config({'reporter_spool_dir': '/var/spool/jaeger',
+                    'reporter_spool_max_bytes': '1048576',
+                    'reporter_spool_replay_rate': '2.5'}, service_name='x')
+        assert c.reporter_spool_dir == '/var/spool/jaeger'
+        assert c.reporter_spool_max_bytes == 1048576
+        assert c.reporter_spool_replay_rate == 2.5
+
+    def test_reporter_priority_shedding(self):
+        c = Config({}, service_name='x')
+        assert not c.reporter_priority_shedding
+        c = Config({'reporter_priority_shedding': 'true'}, service_name='x')
+        assert c.reporter_priority_shedding
+
+    def test_reporter_batching(self):
+        assert Config({}, service_name='x').reporter_batching is None
+        c = Config({'reporter_adaptive_batching': True,
+                    'reporter_batch_size': 5,
+                    'reporter_flush_interval': 2,
+                    'reporter_max_batch_size': '1000'}, service_name='x')
+        batching = c.reporter_batching
+        assert batching.min_batch_size == 5
+        # batches stay well below the queue capacity
+        assert batching.max_batch_size == c.reporter_queue_size // 2
+        assert Config({}, service_name='x').reporter_max_batch_size == \
+            c.reporter_queue_size // 2
+        assert batching.min_flush_interval == 0.1
+        assert batching.max_flush_interval == 2
+        c = Config({'reporter_adaptive_batching': True,
+                    'reporter_min_flush_interval': '0.5'}, service_name='x')
+        assert c.reporter_batching.min_flush_interval == 0.5
+
+    def test_tail_sampling(self):
+        assert Config({}, service_name='x').tail_sampling is None
+        assert Config({'tail_sampling': {'enabled': 'false'}},
+                      service_name='x').tail_sampling is None
+        c = Config({'tail_sampling': {}}, service_name='x')
+        assert c.tail_sampling == dict(
+            latency_threshold=None, probability=0.0, max_traces=1000,
+            max_spans=10000, max_spans_per_trace=500, max_trace_age=60.0)
+        c = Config({'tail_sampling': {'latency_threshold': '0.25',
+                                      'probability': '0.01',
+                                      'max_traces': '50',
+                                      'max_spans': '800',
+                                      'max_spans_per_trace': '100',
+                                      'max_trace_age': '5'}},
+                   service_name='x')
+        assert c.tail_sampling == dict(
+            latency_threshold=0.25, probability=0.01, max_traces=50,
+            max_spans=800, max_spans_per_trace=100, max_trace_age=5.0)
+
+    def test_propagation(self):
+        assert Config({}, service_name='x').propagation == 'b3'
+        c = Config({'propagation': 'b3_single'}, service_name='x')
+        assert c.propagation == 'b3_single'
+        codec = c.create_tracer(reporter=None, sampler=None).codecs[
+            Format.HTTP_HEADERS]
+        assert codec.single_header
+        with self.assertRaises(ValueError):
+            Config({'propagation': 'w3c'}, service_name='x').propagation
+
+    def test_trace_id_generator(self):
+        c = Config({}, service_name='x')
+        assert c.generate_128bit_trace_id
+        assert not c.time_ordered_trace_id
+        generator = c.trace_id_generator
+        assert generator.trace_id_128bit
+        assert not generator.time_ordered
+
+        c = Config({'generate_128bit_trace_id': False,
+                    'time_ordered_trace_id': True}, service_name='x')
+        generator = c.trace_id_generator
+        assert not generator.trace_id_128bit
+        assert generator.time_ordered
+
     def test_bad_sampler(self):
         c = Config({'sampler': {'type': 'bad-sampler'}}, service_name='x')
         with self.assertRaises(ValueError):
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+import uuid
+from builtins import int
+
+import mock
+import pytest
+from jaeger_client_contrib.id_generator import RandomIdPool, TraceIdGenerator
+
+
+def test_random_id_pool_errors():
+    with pytest.raises(ValueError):
+        RandomIdPool(block_size=7)
+
+
+def test_random_id_pool():
+    pool = RandomIdPool(block_size=20)
+    assert pool.block_size == 16
+    assert '%s' % pool == 'RandomIdPool(16)'
+
+    with mock.patch('os.urandom', wraps=os.urandom) as mock_urandom:
+        ids = [pool.next_id() for _ in range(10)]
+        assert mock_urandom.call_count == 5
+        mock_urandom.assert_called_with(16)
+    assert len(set(ids)) == 10
+    for i in ids:
+        assert 0 <= i < (1 << 64)
+
+
+def test_random_id_pool_serves_urandom_bytes():
+    pool = RandomIdPool(block_size=16)
+    block = int.to_bytes(1, 8) + int.to_bytes(0xffffffffffffffff, 8)
+    with mock.patch('os.urandom', return_value=block):
+        assert sorted([pool.next_id(), pool.next_id()]) == \
+            [1, 0xffffffffffffffff]
+
+
+def test_random_id_pool_threads():
+    pool = RandomIdPool(block_size=64)
+    results = []
+
+    def generate():
+        results.append([pool.next_id() for _ in range(1000)])
+
+    threads = [threading.Thread(target=generate) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ids = [i for ids in results for i in ids]
+    assert len(ids) == 8000
+    assert len(set(ids)) == 8000
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork()')
+def test_random_id_pool_reseeds_after_fork():
+    pool = RandomIdPool()
+    pool.next_id()  # fill the buffer before forking
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        try:
+            os.write(write_fd, ('%x' % pool.next_id()).encode('ascii'))
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    child_id = int(os.read(read_fd, 64).decode('ascii'), 16)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    assert child_id != pool.next_id()
+
+
+def test_random_id_pool_no_syscall_per_id():
+    pool = RandomIdPool(block_size=16)
+    with mock.patch('os.getpid') as mock_getpid, \
+            mock.patch('os.urandom', wraps=os.urandom) as mock_urandom:
+        for _ in range(4):
+            pool.next_id()
+    assert not mock_getpid.called
+    assert mock_urandom.call_count == 2
+
+
+def test_random_id_pool_benchmark(benchmark):
+    pool = RandomIdPool()
+    benchmark(pool.next_id)
+
+
+def test_urandom_id_benchmark(benchmark):
+    benchmark(lambda: int.from_bytes(os.urandom(8)))
+
+
+def test_trace_id_generator():
+    generator = TraceIdGenerator(trace_id_128bit=False)
+    assert '%s' % generator == 'TraceIdGenerator(64, False)'
+    ids = [generator.next_id() for _ in range(100)]
+    assert all(0 <= i < (1 << 64) for i in ids)
+    assert len(set(ids)) == 100
+
+    generator = TraceIdGenerator()
+    assert '%s' % generator == 'TraceIdGenerator(128, False)'
+    ids = [generator.next_id() for _ in range(100)]
+    assert all(0 <= i < (1 << 128) for i in ids)
+    # both halves are random
+    assert len(set(i >> 64 for i in ids)) == 100
+    assert len(set(i & 0xffffffffffffffff for i in ids)) == 100
+
+
+def test_trace_id_generator_time_ordered():
+    generator = TraceIdGenerator(time_ordered=True)
+    with mock.patch('time.time', return_value=0x12345678):
+        trace_id = generator.next_id()
+    assert trace_id >> 96 == 0x12345678
+
+    with mock.patch('time.time', return_value=1000):
+        early = generator.next_id()
+    with mock.patch('time.time', return_value=1001):
+        late = generator.next_id()
+    assert early < late
+
+
+@pytest.mark.parametrize('trace_id_128bit,time_ordered', [
+    (False, False),
+    (True, False),
+    (True, True),
+])
+def test_trace_id_generator_benchmark(benchmark, trace_id_128bit,
+                                      time_ordered):
+    generator = TraceIdGenerator(trace_id_128bit=trace_id_128bit,
+                                 time_ordered=time_ordered)
+    benchmark(generator.next_id)
+
+
+def test_uuid1_trace_id_benchmark(benchmark):
+    benchmark(lambda: uuid.uuid1().int)
@@ -1,7 +1,15 @@
+import json
+import math
+import os
 import random
+import time
 
 import pytest
-from jaeger_client_contrib import ProbabilisticSampler
+from jaeger_client import ConstSampler
+
+from jaeger_client_contrib import (AdaptiveSampler, FileSampler,
+                                   PerOperationSampler, ProbabilisticSampler)
+from jaeger_client_contrib.id_generator import TraceIdGenerator
 
 MAX_INT = 1 << 63
 
@@ -51,3 +59,229 @@ def test_sampler_equality():
     prob3 = ProbabilisticSampler(rate=0.02)
     assert prob1 == prob2
     assert prob1 != prob3
+
+
+@pytest.mark.parametrize('trace_id_128bit,time_ordered', [
+    (False, False),
+    (True, False),
+    (True, True),
+])
+def test_probabilistic_sampler_rate_with_generated_ids(trace_id_128bit,
+                                                       time_ordered):
+    generator = TraceIdGenerator(trace_id_128bit=trace_id_128bit,
+                                 time_ordered=time_ordered)
+    n = 20000
+    trace_ids = [generator.next_id() for _ in range(n)]
+    for rate in (0.01, 0.1, 0.5, 0.9):
+        sampler = ProbabilisticSampler(rate)
+        sampled = sum(1 for t in trace_ids if sampler.is_sampled(t)[0])
+        # binomial distribution, allow 5 standard deviations
+        sigma = math.sqrt(n * rate * (1 - rate))
+        assert abs(sampled - n * rate) < 5 * sigma, \
+            'rate %s: sampled %d out of %d' % (rate, sampled, n)
+
+    # chi-square test of the sampled low 64 bits over 16 equal buckets
+    buckets = [0] * 16
+    for t in trace_ids:
+        buckets[(t & 0xffffffffffffffff) >> 60] += 1
+    expected = n / 16.0
+    chi2 = sum((b - expected) ** 2 / expected for b in buckets)
+    # 15 degrees of freedom, p = 0.001
+    assert chi2 < 37.7
+
+
+# adjustment times, in the future of the clock is_sampled() reads
+NOW = time.time() + 3600
+
+
+class FakeReporter(object):
+    def __init__(self):
+        self.reported = 0
+        self.dropped = 0
+        self.occupancy = 0.0
+
+    def load(self):
+        return self.reported, self.dropped, self.occupancy
+
+
+def _adaptive_sampler(**kwargs):
+    reporter = FakeReporter()
+    sampler = AdaptiveSampler(100, reporter=reporter, smoothing=1, **kwargs)
+    sampler.adjust(now=NOW)
+    return sampler, reporter
+
+
+def test_adaptive_sampler_errors():
+    for kwargs in (dict(target_spans_per_second=0), dict(min_rate=0),
+                   dict(min_rate=0.5, max_rate=0.1), dict(max_rate=1.1),
+                   dict(smoothing=0), dict(high_watermark=1)):
+        kwargs.setdefault('target_spans_per_second', 10)
+        with pytest.raises(AssertionError):
+            AdaptiveSampler(**kwargs)
+
+
+def test_adaptive_sampler_targets_throughput():
+    sampler, reporter = _adaptive_sampler()
+    assert sampler.rate == 1.0
+    assert sampler.is_sampled(MAX_INT)[0]
+    reporter.reported += 400
+    sampler.adjust(now=NOW + 1)
+    assert sampler.rate == 0.25
+    sampled, tags = sampler.is_sampled(1 << 62)
+    assert not sampled
+    assert tags == get_tags('probabilistic', 0.25)
+    # 100 spans per second at 0.25, still on target
+    reporter.reported += 200
+    sampler.adjust(now=NOW + 3)
+    assert sampler.rate == 0.25
+    # traffic halves
+    reporter.reported += 50
+    sampler.adjust(now=NOW + 4)
+    assert sampler.rate == 0.5
+
+
+def test_adaptive_sampler_limits():
+    sampler, reporter = _adaptive_sampler(min_rate=0.01, max_rate=0.5)
+    assert sampler.rate == 0.5
+    reporter.reported += 1000000
+    sampler.adjust(now=NOW + 1)
+    assert sampler.rate == 0.01
+    # no traffic at all
+    sampler.adjust(now=NOW + 2)
+    assert sampler.rate == 0.5
+
+
+def test_adaptive_sampler_backpressure():
+    sampler, reporter = _adaptive_sampler()
+    # on target, but the reporter dropped half of the spans
+    reporter.reported += 100
+    reporter.dropped += 50
+    sampler.adjust(now=NOW + 1)
+    assert sampler.rate == 0.5
+    # on target, but the queue is filling up
+    reporter.reported += 50
+    reporter.occupancy = 0.75
+    sampler.adjust(now=NOW + 2)
+    assert sampler.rate == 0.25
+
+
+def test_adaptive_sampler_smoothing():
+    reporter = FakeReporter()
+    sampler = AdaptiveSampler(100, reporter=reporter, smoothing=0.5)
+    sampler.adjust(now=NOW)
+    reporter.reported += 400
+    sampler.adjust(now=NOW + 1)
+    assert sampler.rate == 0.25
+    # 1600 spans per second at full rate, averaged with 400
+    reporter.reported += 400
+    sampler.adjust(now=NOW + 2)
+    assert sampler.rate == 0.1
+
+
+def test_adaptive_sampler_adjusts_when_sampling():
+    reporter = FakeReporter()
+    sampler = AdaptiveSampler(100, reporter=reporter, adjust_interval=0)
+    sampler.is_sampled(0)
+    reporter.reported += 1000000
+    time.sleep(0.01)
+    sampler.is_sampled(0)
+    assert sampler.rate < 1.0
+    assert str(sampler) == 'AdaptiveSampler(100)'
+
+
+def test_per_operation_sampler():
+    sampler = PerOperationSampler(
+        0.5, lower_bound=0,
+        operations={'health': 0.0, 'checkout': (1.0, 0)})
+    sampled, tags = sampler.is_sampled(MAX_INT - 10, 'other')
+    assert sampled
+    assert tags == get_tags('probabilistic', 0.5)
+    assert not sampler.is_sampled(MAX_INT + 10, 'other')[0]
+    assert not sampler.is_sampled(0, 'health')[0]
+    assert sampler.is_sampled(0xffffffffffffffff, 'checkout')[0]
+    assert '%s' % sampler == 'PerOperationSampler(0.5, 0)'
+    with pytest.raises(AssertionError):
+        PerOperationSampler(0.5, operations={'x': 2.0})
+
+
+def test_per_operation_sampler_lower_bound():
+    sampler = PerOperationSampler(0.0, lower_bound=1.0,
+                                  operations={'health': (0.0, 0)})
+    # one trace of each operation per second at least
+    assert [sampler.is_sampled(0, 'rare')[0] for _ in range(3)] == \
+        [True, False, False]
+    assert sampler.is_sampled(0, 'rare')[1] == get_tags('lowerbound', 0.0)
+    assert not sampler.is_sampled(0, 'health')[0]
+
+
+def test_per_operation_sampler_lru():
+    sampler = PerOperationSampler(0.0, lower_bound=1.0, max_operations=2)
+    assert sampler.is_sampled(0, 'a')[0]
+    assert sampler.is_sampled(0, 'b')[0]
+    # 'a' becomes the most recently used
+    assert not sampler.is_sampled(0, 'a')[0]
+    # and 'b' makes room for 'c'
+    assert sampler.is_sampled(0, 'c')[0]
+    assert list(sampler._samplers) == ['a', 'c']
+    assert not sampler.is_sampled(0, 'a')[0]
+    # 'b' starts over with a fresh lower bound
+    assert sampler.is_sampled(0, 'b')[0]
+    for i in range(100):
+        sampler.is_sampled(0, 'op%d' % i)
+    assert len(sampler._samplers) == 2
+
+
+def _write_strategy(path, sampler_config, mtime):
+    tmp = str(path) + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(sampler_config if isinstance(sampler_config, str)
+                else json.dumps(sampler_config))
+    os.utime(tmp, (mtime, mtime))
+    os.rename(tmp, str(path))
+
+
+def test_file_sampler(tmpdir):
+    path = tmpdir.join('sampling.json')
+    _write_strategy(path, {'type': 'probabilistic', 'param': 0.5}, 1000)
+    sampler = FileSampler(str(path), poll_interval=3600)
+    assert sampler.is_sampled(MAX_INT - 10)[1] == \
+        get_tags('probabilistic', 0.5)
+    assert not sampler.poll()
+    assert '%s' % sampler == 'FileSampler(%s)' % path
+
+    _write_strategy(path, {'type': 'per_operation', 'param': 0.0,
+                           'lower_bound': 0, 'operations': {'a': 1}}, 2000)
+    # not polled before poll_interval is up
+    assert sampler.is_sampled(MAX_INT - 10)[0]
+    assert sampler.poll()
+    assert not sampler.is_sampled(MAX_INT - 10)[0]
+    assert sampler.is_sampled(MAX_INT - 10, 'a')[0]
+
+    # broken files are ignored until they change again
+    _write_strategy(path, '{"type": "probabilistic", ', 3000)
+    assert not sampler.poll()
+    _write_strategy(path, {'type': 'sometimes'}, 4000)
+    assert not sampler.poll()
+    assert isinstance(sampler.sampler, PerOperationSampler)
+    _write_strategy(path, {'type': 'const', 'param': True}, 5000)
+    assert sampler.poll()
+    assert isinstance(sampler.sampler, ConstSampler)
+
+    # so are missing files
+    path.remove()
+    assert not sampler.poll()
+    assert isinstance(sampler.sampler, ConstSampler)
+    sampler.close()
+
+
+def test_file_sampler_polls_when_sampling(tmpdir):
+    path = tmpdir.join('sampling.json')
+    sampler = FileSampler(str(path), poll_interval=0)
+    # jaeger_client's default until the file appears
+    assert sampler.sampler.rate == 0.001
+    _write_strategy(path, {'type': 'adaptive', 'param': 100}, 1000)
+    reporter = object()
+    sampler.reporter = reporter
+    sampler.is_sampled(0)
+    assert isinstance(sampler.sampler, AdaptiveSampler)
+    assert sampler.sampler.reporter is reporter
@@ -1,3 +1,4 @@
+# -*- coding: utf-8 -*-
 from future import standard_library  # isort:skip
 standard_library.install_aliases()  # isort:skip
 from io import BytesIO  # isort:skip
@@ -5,10 +6,18 @@ from io import BytesIO  # isort:skip
 import os
 from builtins import int
 
+import mock
+import pytest
+
 from jaeger_client import Span, SpanContext
+from jaeger_client.span import DEBUG_FLAG
 from jaeger_client.thrift_gen.agent import Agent
+from jaeger_client.thrift_gen.zipkincore import \
+    ZipkinCollector as jaeger_zipkin_types
 from jaeger_client_contrib import thrift
+from jaeger_client_contrib.thrift_gen.zipkincore import ttypes as zipkin_types
 from opentracing import child_of
+from opentracing.ext import tags as ext_tags
 from thrift.protocol.TCompactProtocol import TCompactProtocol
 from thrift.transport.TTransport import TMemoryBuffer
 
@@ -104,3 +113,175 @@ def test_trace_ids(tracer):
     hi, lo = thrift.extract_from_trace_id(trace_id)
     assert thrift.id_to_int(hi) == -0x8000000000000000
     assert thrift.id_to_int(lo) == 0
+
+
+def _make_spans(tracer, count=1):
+    spans = []
+    for i in range(count):
+        root = tracer.start_span('root-span')
+        root.set_tag('bender', 'is great')
+        root.log_event('kiss-my-shiny-metal-...')
+        root.log_kv({'event': 'structured', 'x': 1})
+
+        client = tracer.start_span('client-span', child_of=root)
+        client.set_tag(ext_tags.SPAN_KIND, ext_tags.SPAN_KIND_RPC_CLIENT)
+        client.set_tag(ext_tags.PEER_HOST_IPV4, '127.0.0.1')
+        client.set_tag(ext_tags.PEER_PORT, 8080)
+        client.set_tag(ext_tags.PEER_SERVICE, 'downstream')
+        client.finish()
+
+        server = tracer.start_span(
+            'server-span', child_of=client,
+            tags={ext_tags.SPAN_KIND: ext_tags.SPAN_KIND_RPC_SERVER})
+        server.set_tag(ext_tags.COMPONENT, 'test')
+        server.finish()
+
+        local = tracer.start_span('local-span', child_of=root,
+                                  tags={ext_tags.COMPONENT: 'db'})
+        local.finish()
+        root.finish()
+        spans.extend([root, client, server, local])
+    return spans
+
+
+def test_zipkin_spans_in_compact_bytes(tracer):
+    spans = _make_spans(tracer)
+    wide = tracer.start_span('wide-span')
+    wide.context.trace_id = (1 << 128) - 1
+    wide.context.flags |= DEBUG_FLAG
+    for i in range(20):
+        # more annotations than fit in a one byte list header
+        wide.log_event('event-%d' % i)
+    wide.finish()
+    spans.append(wide)
+
+    encoded = thrift.zipkin_spans_in_compact_bytes(spans)
+    single = [thrift.zipkin_span_in_compact_bytes(span) for span in spans]
+    assert encoded == thrift.thrift_objs_in_bytes(
+        thrift.make_zipkin_spans(spans), compact=True)
+    assert encoded == thrift.encoded_spans_in_compact_bytes(single)
+    assert thrift.zipkin_spans_in_compact_bytes([]) == \
+        thrift.thrift_objs_in_bytes([], compact=True)
+
+
+def test_zipkin_spans_in_bytes(tracer):
+    spans = _make_spans(tracer)
+    wide = tracer.start_span('wide-span')
+    wide.context.trace_id = (1 << 128) - 1
+    wide.context.flags |= DEBUG_FLAG
+    wide.finish()
+    spans.append(wide)
+
+    encoded = thrift.zipkin_spans_in_bytes(spans)
+    assert encoded == thrift.thrift_objs_in_bytes(
+        thrift.make_zipkin_spans(spans))
+
+
+def test_zipkin_spans_in_bytes_unicode(tracer):
+    span = tracer.start_span(u'опер')
+    span.set_tag('unicode', u'привет')
+    span.finish()
+    encoded = thrift.zipkin_spans_in_bytes([span])
+    assert u'опер'.encode('utf-8') in encoded
+    assert u'привет'.encode('utf-8') in encoded
+
+
+def test_zipkin_spans_in_bytes_empty():
+    assert thrift.zipkin_spans_in_bytes([]) == thrift.thrift_objs_in_bytes([])
+
+
+def test_zipkin_spans_in_bytes_benchmark(tracer, benchmark):
+    spans = _make_spans(tracer, count=10)
+    benchmark(thrift.zipkin_spans_in_bytes, spans)
+
+
+def test_make_zipkin_spans_benchmark(tracer, benchmark):
+    spans = _make_spans(tracer, count=10)
+
+    def encode():
+        return thrift.thrift_objs_in_bytes(thrift.make_zipkin_spans(spans))
+
+    benchmark(encode)
+
+
+requires_fastbinary = pytest.mark.skipif(
+    not thrift.ACCELERATED, reason='fastbinary is not usable with this thrift')
+
+
+@requires_fastbinary
+def test_thrift_objs_in_bytes_accelerated(tracer):
+    zipkin_spans = thrift.make_zipkin_spans(_make_spans(tracer))
+    assert thrift.thrift_objs_in_bytes(zipkin_spans, accelerated=True) == \
+        thrift.thrift_objs_in_bytes(zipkin_spans, accelerated=False)
+
+
+def test_can_accelerate_fallback():
+    with mock.patch.object(thrift, 'fastbinary', None):
+        assert not thrift._can_accelerate()
+    with mock.patch.object(thrift, 'fastbinary', object()), \
+            mock.patch.object(thrift, 'TBinaryProtocolAccelerated',
+                              side_effect=TypeError()):
+        assert not thrift._can_accelerate()
+
+
+@pytest.mark.parametrize('accelerated', [False, requires_fastbinary(True)])
+def test_zipkin_span_in_bytes_does_not_mutate(tracer, accelerated):
+    for span in _make_spans(tracer):
+        logs, tags = span.logs[:], span.tags[:]
+        hosts = [log.host for log in logs]
+        encoded = thrift.zipkin_span_in_bytes(span, accelerated=accelerated)
+        assert (logs, tags) == (span.logs, span.tags)
+        assert hosts == [log.host for log in span.logs]
+        # e.g. for a CompositeReporter, which reports a span twice
+        assert encoded == thrift.zipkin_span_in_bytes(
+            span, accelerated=accelerated)
+
+
+@pytest.mark.parametrize('accelerated', [False, requires_fastbinary(True)])
+def test_thrift_objs_in_bytes_benchmark(tracer, benchmark, accelerated):
+    zipkin_spans = thrift.make_zipkin_spans(_make_spans(tracer, count=10))
+    benchmark(thrift.thrift_objs_in_bytes, zipkin_spans, accelerated)
+
+
+def test_tracer_endpoint(tracer):
+    endpoint, endpoint_bytes = thrift.tracer_endpoint(tracer)
+    assert endpoint.service_name == 'test_service_1'
+    assert endpoint_bytes == thrift.encode_endpoint(endpoint)
+    assert thrift.tracer_endpoint(tracer)[0] is endpoint
+    assert thrift.tracer_endpoint(tracer)[1] is endpoint_bytes
+
+    spans = _make_spans(tracer)
+    zipkin_spans = thrift.make_zipkin_spans(spans)
+    hosts = set(id(a.host) for s in zipkin_spans for a in s.annotations)
+    assert hosts == {id(endpoint)}
+
+
+def test_make_zipkin_spans_endpoints(tracer):
+    spans = _make_spans(tracer)
+    zipkin_spans = thrift.make_zipkin_spans(spans)
+    hosts = [a.host for s in zipkin_spans
+             for a in s.annotations + s.binary_annotations if a.host]
+    peers = [a.host for a in zipkin_spans[1].binary_annotations
+             if a.key == 'sa']
+    assert [(p.ipv4, p.port, p.service_name) for p in peers] == \
+        [(127 << 24 | 1, 8080, 'downstream')]
+    assert all(isinstance(h, zipkin_types.Endpoint) for h in hosts)
+    # jaeger_client's own Endpoint is left as it is
+    assert not hasattr(jaeger_zipkin_types.Endpoint, 'ipv6')
+
+
+def test_encoded_spans_in_bytes(tracer):
+    spans = _make_spans(tracer)
+    encoded = [thrift.zipkin_span_in_bytes(span, accelerated=False)
+               for span in spans]
+    assert len(thrift.encoded_spans_in_bytes([])) == thrift.LIST_HEADER_SIZE
+    assert thrift.encoded_spans_in_bytes(encoded) == \
+        thrift.zipkin_spans_in_bytes(spans)
+
+
+@requires_fastbinary
+def test_encoded_spans_in_bytes_accelerated(tracer):
+    expected = thrift.zipkin_spans_in_bytes(_make_spans(tracer))
+    encoded = [thrift.zipkin_span_in_bytes(span, accelerated=True)
+               for span in _make_spans(tracer)]
+    assert len(thrift.encoded_spans_in_bytes(encoded)) == len(expected)
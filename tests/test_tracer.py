@@ -1,4 +1,3 @@
-import uuid
 from builtins import int
 
 import mock
@@ -10,6 +9,8 @@ from jaeger_client import ConstSampler
 from jaeger_client.thrift import add_zipkin_annotations
 from jaeger_client_contrib.thrift_gen.zipkincore import constants as g
 from jaeger_client_contrib import Tracer
+from jaeger_client_contrib.id_generator import TraceIdGenerator
+from jaeger_client_contrib.zipkin.codecs import B3Codec
 from opentracing import Format, child_of
 from opentracing.ext import tags as ext_tags
 
@@ -21,10 +22,10 @@ def log_exists(span, value):
 def test_start_trace(tracer):
     assert type(tracer) is Tracer
     with mock.patch('os.urandom') as mock_urandom, mock.patch('time.time') as mock_timestamp, \
-            mock.patch('uuid.uuid1') as mock_uuid1:
+            mock.patch.object(tracer.trace_id_generator, 'next_id') as mock_trace_id:
         mock_urandom.return_value = int.to_bytes(12345, 8)
         mock_timestamp.return_value = 54321
-        mock_uuid1.return_value = uuid.UUID(int=987654321)
+        mock_trace_id.return_value = 987654321
 
         span = tracer.start_span('test')
         span.set_tag(ext_tags.SPAN_KIND, ext_tags.SPAN_KIND_RPC_SERVER)
@@ -47,6 +48,22 @@ def test_start_trace(tracer):
         tracer.reporter.assert_called_once()
 
 
+def test_trace_id_generator():
+    reporter = mock.MagicMock()
+    sampler = ConstSampler(True)
+    tracer = Tracer(service_name='x', reporter=reporter, sampler=sampler)
+    assert tracer.trace_id_generator.trace_id_128bit
+    assert tracer.trace_id_generator.id_pool is tracer.id_pool
+
+    generator = TraceIdGenerator(trace_id_128bit=False)
+    tracer = Tracer(service_name='x', reporter=reporter, sampler=sampler,
+                    trace_id_generator=generator)
+    assert tracer.trace_id_generator is generator
+    span = tracer.start_span('test')
+    assert span.trace_id < (1 << 64)
+    assert span.span_id != span.trace_id
+
+
 def test_forced_sampling(tracer):
     tracer.sampler = ConstSampler(False)
     span = tracer.start_span("test2",
@@ -55,6 +72,22 @@ def test_forced_sampling(tracer):
     assert span.is_debug()
 
 
+@pytest.mark.parametrize('header,sampled,debug', [
+    ('0', False, False),
+    ('1', True, False),
+    ('d', True, True),
+])
+def test_sampling_state_alone(tracer, header, sampled, debug):
+    tracer.sampler = ConstSampler(not sampled)
+    context = B3Codec().extract({'b3': header})
+    span = tracer.start_span('test', child_of=context)
+    assert span.trace_id is not None
+    assert span.parent_id is None
+    assert span.is_sampled() is sampled
+    assert span.is_debug() is debug
+    assert (tracer.debug_id_header in [t.key for t in span.tags]) is debug
+
+
 @pytest.mark.parametrize('mode', ['arg', 'ref'])
 def test_start_child(tracer, mode):
     root = tracer.start_span("test")
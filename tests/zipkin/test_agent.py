@@ -0,0 +1,164 @@
+import socket
+
+import pytest
+import tornado.gen
+from thrift.protocol.TBinaryProtocol import TBinaryProtocol
+from thrift.protocol.TCompactProtocol import TCompactProtocol
+from thrift.Thrift import TMessageType, TType
+from thrift.transport.TTransport import TMemoryBuffer
+from tornado.ioloop import IOLoop
+from tornado.testing import AsyncTestCase, gen_test
+
+from jaeger_client.thrift import id_to_int
+from jaeger_client_contrib.thrift import (zipkin_span_in_bytes,
+                                          zipkin_span_in_compact_bytes)
+from jaeger_client_contrib.thrift_gen.zipkincore import ttypes as zipkin_types
+from jaeger_client_contrib.zipkin.agent import (AGENT_MESSAGE_OVERHEAD,
+                                                MAX_SEQID, PROTOCOL_BINARY,
+                                                PROTOCOL_COMPACT, AgentSender,
+                                                agent_zipkin_batch)
+from jaeger_client_contrib.zipkin.encoding import (ENCODING_AGENT,
+                                                   ENCODING_AGENT_BINARY)
+from jaeger_client_contrib.zipkin.reporter import ZipkinReporter
+
+from ..test_thrift import _make_spans
+from .test_reporter import FakeMetricsFactory
+
+
+PROTOCOLS = {
+    PROTOCOL_COMPACT: (TCompactProtocol, zipkin_span_in_compact_bytes),
+    PROTOCOL_BINARY: (TBinaryProtocol, zipkin_span_in_bytes),
+}
+
+
+def _decode_batch(message, protocol=PROTOCOL_COMPACT):
+    """Decodes an emitZipkinBatch message the way jaeger-agent does."""
+    transport = TMemoryBuffer(message)
+    protocol = PROTOCOLS[protocol][0](transport)
+    name, message_type, seqid = protocol.readMessageBegin()
+    assert (name, message_type) == ('emitZipkinBatch', TMessageType.ONEWAY)
+    protocol.readStructBegin()
+    _, field_type, field_id = protocol.readFieldBegin()
+    assert (field_type, field_id) == (TType.LIST, 1)
+    item_type, count = protocol.readListBegin()
+    assert item_type == TType.STRUCT
+    spans = []
+    for _ in range(count):
+        span = zipkin_types.Span()
+        span.read(protocol)
+        spans.append(span)
+    protocol.readListEnd()
+    protocol.readFieldEnd()
+    assert protocol.readFieldBegin()[1] == TType.STOP
+    protocol.readStructEnd()
+    protocol.readMessageEnd()
+    assert not transport.read(1)
+    return seqid, spans
+
+
+@pytest.mark.parametrize('protocol', [PROTOCOL_COMPACT, PROTOCOL_BINARY])
+def test_agent_zipkin_batch(tracer, protocol):
+    spans = _make_spans(tracer, count=5)
+    ids = [id_to_int(span.span_id) for span in spans]
+    names = [span.operation_name for span in spans]
+    encode_span = PROTOCOLS[protocol][1]
+    encoded = [encode_span(span) for span in spans]
+    message = agent_zipkin_batch(encoded, seqid=7, protocol=protocol)
+    seqid, decoded = _decode_batch(message, protocol)
+    assert seqid == 7
+    assert [span.id for span in decoded] == ids
+    assert [span.name for span in decoded] == names
+
+    _, decoded = _decode_batch(
+        agent_zipkin_batch([], protocol=protocol), protocol)
+    assert decoded == []
+
+
+@pytest.mark.parametrize('protocol', [PROTOCOL_COMPACT, PROTOCOL_BINARY])
+def test_agent_message_overhead(tracer, protocol):
+    encode_span = PROTOCOLS[protocol][1]
+    encoded = [encode_span(span) for span in _make_spans(tracer)]
+    message = agent_zipkin_batch(encoded, seqid=MAX_SEQID, protocol=protocol)
+    size = AGENT_MESSAGE_OVERHEAD[protocol] + sum(len(span) for span in encoded)
+    assert 0 <= size - len(message) < 10
+
+
+class AgentSenderTest(AsyncTestCase):
+    def setUp(self):
+        super(AgentSenderTest, self).setUp()
+        self.agent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.agent.bind(('127.0.0.1', 0))
+        self.agent.settimeout(1)
+        self.sender = AgentSender(host='127.0.0.1',
+                                  port=self.agent.getsockname()[1],
+                                  max_packet_size=600)
+
+    def tearDown(self):
+        self.sender.close()
+        self.agent.close()
+        super(AgentSenderTest, self).tearDown()
+
+    def _received(self):
+        self.agent.setblocking(False)
+        messages = []
+        while True:
+            try:
+                messages.append(self.agent.recv(65536))
+            except socket.error:
+                return messages
+
+    def test_send(self):
+        self.sender(b'datagram')
+        assert self.agent.recv(65536) == b'datagram'
+        with pytest.raises(ValueError):
+            self.sender(b'x' * 601)
+
+    def test_max_packet_size_errors(self):
+        with pytest.raises(ValueError):
+            AgentSender(max_packet_size=AGENT_MESSAGE_OVERHEAD[PROTOCOL_BINARY])
+
+    @gen_test
+    def test_reporter_splits_batches(self):
+        yield self._check_reporter_splits_batches(ENCODING_AGENT,
+                                                  PROTOCOL_COMPACT)
+
+    @gen_test
+    def test_reporter_splits_batches_binary(self):
+        yield self._check_reporter_splits_batches(ENCODING_AGENT_BINARY,
+                                                  PROTOCOL_BINARY)
+
+    @tornado.gen.coroutine
+    def _check_reporter_splits_batches(self, encoding, protocol):
+        metrics_factory = FakeMetricsFactory()
+        reporter = ZipkinReporter(transport_handler=self.sender,
+                                  io_loop=IOLoop.current(),
+                                  batch_size=100,
+                                  metrics_factory=metrics_factory,
+                                  max_batch_bytes=600,
+                                  encoding=encoding)
+        spans = _make_spans(self.tracer, count=5)
+        oversized = self.tracer.start_span('oversized')
+        for i in range(3):
+            # string tags are truncated to 256 characters
+            oversized.set_tag('blob%d' % i, 'x' * 256)
+        oversized.finish()
+        for span in spans[:10] + [oversized] + spans[10:]:
+            reporter.report_span(span)
+        yield reporter.close()
+
+        messages = self._received()
+        assert len(messages) > 1
+        assert all(len(message) <= 600 for message in messages)
+        decoded = [span for message in messages
+                   for span in _decode_batch(message, protocol)[1]]
+        assert [span.id for span in decoded] == \
+            [id_to_int(span.span_id) for span in spans]
+        seqids = [_decode_batch(message, protocol)[0] for message in messages]
+        assert len(set(seqids)) == len(seqids)
+        counters = metrics_factory.counters
+        assert counters['jaeger.spans.dropped_true'] == 1
+        assert counters['jaeger.spans.reported_true'] == len(spans)
+
+    @pytest.fixture(autouse=True)
+    def _tracer(self, tracer):
+        self.tracer = tracer
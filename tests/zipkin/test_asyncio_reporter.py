@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+import unittest
+
+import mock
+import pytest
+from concurrent.futures import Future as ConcurrentFuture
+
+from jaeger_client.metrics import Metrics
+from jaeger_client.utils import ErrorReporter
+from jaeger_client_contrib.thrift import (LIST_HEADER_SIZE,
+                                          zipkin_span_in_bytes,
+                                          zipkin_spans_in_bytes)
+from jaeger_client_contrib.zipkin import asyncio_reporter
+from jaeger_client_contrib.zipkin.asyncio_reporter import \
+    AsyncioZipkinReporter
+
+from .test_reporter import FakeMetricsFactory, HardErrorReporter, _new_span
+
+asyncio = asyncio_reporter.asyncio
+
+
+@pytest.mark.skipif(asyncio is None, reason='asyncio is not available')
+class AsyncioReporterTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def _new_reporter(self, batch_size, flush=None, queue_cap=100,
+                      max_batch_bytes=None):
+        batches = []
+        reporter = AsyncioZipkinReporter(
+            transport_handler=batches.append,
+            loop=self.loop,
+            batch_size=batch_size,
+            flush_interval=flush,
+            metrics_factory=FakeMetricsFactory(),
+            error_reporter=HardErrorReporter(),
+            queue_capacity=queue_cap,
+            max_batch_bytes=max_batch_bytes)
+        sent = []
+        send = reporter._send
+
+        def capture(spans):
+            sent.append(list(spans))
+            return send(spans)
+
+        reporter._send = capture
+        return reporter, sent, batches
+
+    def _close(self, reporter):
+        # close() is called off the loop here, so it returns a
+        # concurrent.futures.Future
+        closed = asyncio.wrap_future(reporter.close(), loop=self.loop)
+        return self.loop.run_until_complete(closed)
+
+    def _run_until(self, fn, timeout=1.0):
+        """Run the loop until fn() returns truth, but not longer than timeout."""
+        deadline = time.time() + timeout
+        while not fn() and time.time() < deadline:
+            self.loop.call_later(0.001, self.loop.stop)
+            self.loop.run_forever()
+        return fn()
+
+    def test_submit_full_batches(self):
+        reporter, sent, batches = self._new_reporter(batch_size=2)
+        spans = [_new_span('%s' % i) for i in range(5)]
+        for span in spans:
+            reporter.report_span(span)
+
+        assert self._run_until(lambda: len(sent) == 2)
+        assert [2, 2] == [len(s) for s in sent]
+        assert batches[0] == zipkin_spans_in_bytes(spans[:2])
+
+        # partial batch waits for close() without a flush interval
+        self._run_until(lambda: False, timeout=0.01)
+        assert 2 == len(sent)
+        self._close(reporter)
+        assert [2, 2, 1] == [len(s) for s in sent]
+        counters = reporter.metrics_factory.counters
+        assert 5 == counters['jaeger.spans.reported_true']
+
+        # send after close
+        reporter.report_span(_new_span('6'))
+        assert 1 == counters['jaeger.spans.dropped_true']
+
+    def test_flush_interval(self):
+        reporter, sent, _ = self._new_reporter(batch_size=10, flush=0.005)
+        reporter.report_span(_new_span('1'))
+        assert self._run_until(lambda: len(sent) == 1)
+        assert 1 == len(sent[0])
+        self._close(reporter)
+
+    def test_report_from_other_threads(self):
+        reporter, sent, _ = self._new_reporter(batch_size=10, queue_cap=400)
+
+        def report():
+            for i in range(100):
+                reporter.report_span(_new_span('%s' % i))
+
+        threads = [threading.Thread(target=report) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._close(reporter)
+        assert 400 == sum(len(s) for s in sent)
+
+    def test_close_from_other_thread(self):
+        reporter, sent, _ = self._new_reporter(batch_size=10)
+        reporter.report_span(_new_span('1'))
+        closed = []
+        thread = threading.Thread(target=lambda: closed.append(reporter.close()))
+        thread.start()
+        thread.join()
+        assert isinstance(closed[0], ConcurrentFuture)
+        assert self._run_until(closed[0].done)
+        assert closed[0].result()
+        assert 1 == len(sent)
+
+    def test_close_on_loop(self):
+        reporter, sent, _ = self._new_reporter(batch_size=10)
+        reporter.report_span(_new_span('1'))
+        closed = []
+        self.loop.call_soon(lambda: closed.append(reporter.close()))
+        assert self._run_until(lambda: closed)
+        assert isinstance(closed[0], asyncio.Future)
+        assert self.loop.run_until_complete(closed[0])
+        assert 1 == len(sent)
+
+    def test_async_transport(self):
+        reporter, sent, _ = self._new_reporter(batch_size=1)
+        futures = []
+
+        def send(message):
+            futures.append(asyncio.Future(loop=self.loop))
+            return futures[-1]
+
+        reporter.transport_handler = send
+        for i in range(3):
+            reporter.report_span(_new_span('%s' % i))
+
+        # the next batch is only sent once the previous one completed
+        assert self._run_until(lambda: len(futures) == 1)
+        self._run_until(lambda: False, timeout=0.01)
+        assert 1 == len(futures)
+        futures[0].set_result(None)
+        assert self._run_until(lambda: len(futures) == 2)
+        futures[1].set_exception(ValueError())
+        reporter.error_reporter = ErrorReporter(
+            metrics=Metrics(), logger=logging.getLogger())
+        assert self._run_until(lambda: len(futures) == 3)
+
+        closed = reporter.close()
+        self._run_until(lambda: False, timeout=0.01)
+        assert not closed.done()
+        futures[2].set_result(None)
+        assert self._run_until(closed.done)
+        counters = reporter.metrics_factory.counters
+        assert 2 == counters['jaeger.spans.reported_true']
+        assert 1 == counters['jaeger.spans.reported_false']
+
+    def test_submit_failure(self):
+        reporter, _, _ = self._new_reporter(batch_size=1)
+        reporter.error_reporter = ErrorReporter(
+            metrics=Metrics(), logger=logging.getLogger())
+        reporter._send = mock.MagicMock(side_effect=ValueError())
+        reporter.report_span(_new_span('1'))
+        self._close(reporter)
+        counters = reporter.metrics_factory.counters
+        assert 1 == counters['jaeger.spans.reported_false']
+
+    def test_queue_full(self):
+        reporter, sent, _ = self._new_reporter(batch_size=10, queue_cap=10)
+        # the loop is not running, so nothing is drained
+        for i in range(12):
+            reporter.report_span(_new_span('%s' % i))
+        counters = reporter.metrics_factory.counters
+        assert 2 == counters['jaeger.spans.dropped_true']
+        self._close(reporter)
+        assert [10] == [len(s) for s in sent]
+
+    def test_max_batch_bytes(self):
+        size = len(zipkin_span_in_bytes(_new_span('0')))
+        reporter, sent, batches = self._new_reporter(
+            batch_size=10, max_batch_bytes=LIST_HEADER_SIZE + 2 * size + 1)
+        spans = [_new_span('%s' % i) for i in range(5)]
+        for span in spans:
+            reporter.report_span(span)
+        self._close(reporter)
+        assert [2, 2, 1] == [len(s) for s in sent]
+        assert batches[0] == zipkin_spans_in_bytes(spans[:2])
@@ -0,0 +1,123 @@
+import pytest
+import tornado.gen
+from tornado.ioloop import IOLoop
+
+from jaeger_client_contrib.zipkin.batching import AdaptiveBatching
+from jaeger_client_contrib.zipkin.reporter import (ThreadedZipkinReporter,
+                                                   ZipkinReporter)
+
+from .test_reporter import _new_span
+
+
+def _batching(**kwargs):
+    kwargs.setdefault('smoothing', 1)
+    batching = AdaptiveBatching(min_batch_size=10, max_batch_size=500,
+                                min_flush_interval=0.1,
+                                max_flush_interval=2.0, **kwargs)
+    # restart the clock at 0
+    batching.observe(0, now=0)
+    return batching
+
+
+def test_bounds():
+    for kwargs in (dict(min_batch_size=0), dict(min_batch_size=20,
+                                                max_batch_size=10),
+                   dict(min_flush_interval=0),
+                   dict(min_flush_interval=2, max_flush_interval=1),
+                   dict(smoothing=0)):
+        with pytest.raises(ValueError):
+            AdaptiveBatching(**kwargs)
+
+
+def test_low_load():
+    batching = _batching()
+    assert batching.rate is None
+    assert (batching.batch_size, batching.flush_interval) == (10, 2.0)
+    batching.observe(1, 0.01, now=1)
+    assert batching.rate == 1
+    # a full batch would take 10 seconds to arrive
+    assert (batching.batch_size, batching.flush_interval) == (10, 2.0)
+
+
+def test_moderate_load():
+    batching = _batching()
+    batching.observe(50, 0.01, now=1)
+    assert (batching.batch_size, batching.flush_interval) == (10, 0.2)
+
+
+def test_high_load():
+    batching = _batching()
+    batching.observe(2000, 0.01, now=1)
+    # sends are spaced by min_flush_interval
+    assert batching.batch_size == 200
+    assert batching.flush_interval == 0.1
+    batching.observe(20000, 0.01, now=2)
+    assert batching.batch_size == 500
+
+
+def test_slow_sends():
+    batching = _batching()
+    batching.observe(1000, 0.2, now=1)
+    # batches are large enough for the transport to keep up
+    assert batching.batch_size == 400
+    assert batching.flush_interval == 0.4
+
+
+def test_smoothing():
+    batching = _batching(smoothing=0.5)
+    batching.observe(100, 0.1, now=1)
+    batching.observe(300, 0.3, now=2)
+    assert batching.rate == 200
+    assert abs(batching.send_time - 0.2) < 1e-9
+
+
+def test_threaded_reporter_grows_batches():
+    sent = []
+    batching = AdaptiveBatching(min_batch_size=2, max_batch_size=100,
+                                min_flush_interval=0.05)
+    reporter = ThreadedZipkinReporter(transport_handler=sent.append,
+                                      queue_capacity=1000,
+                                      batching=batching)
+    assert (reporter.batch_size, reporter.flush_interval) == (2, 1.0)
+    for i in range(1000):
+        reporter.report_span(_new_span(str(i)))
+    reporter.close().result(timeout=1)
+    assert reporter.batch_size > 2
+    assert len(sent) < 500
+
+
+def test_batches_stay_below_queue_capacity():
+    batching = AdaptiveBatching(min_batch_size=1000, max_batch_size=1000)
+    reporter = ThreadedZipkinReporter(transport_handler=lambda message: None,
+                                      queue_capacity=100,
+                                      batching=batching)
+    # the consumer wakes up long before the queue is full
+    assert reporter.batch_size == 50
+    reporter._adapt_batching(10, 0.01)
+    assert reporter.batch_size == 50
+    reporter.close().result(timeout=1)
+
+
+def test_tornado_reporter_grows_batches():
+    sent = []
+    io_loop = IOLoop()
+    batching = AdaptiveBatching(min_batch_size=2, max_batch_size=50,
+                                min_flush_interval=0.001)
+    reporter = ZipkinReporter(transport_handler=sent.append,
+                              io_loop=io_loop, queue_capacity=1000,
+                              batching=batching)
+
+    @tornado.gen.coroutine
+    def report():
+        for i in range(1000):
+            reporter.report_span(_new_span(str(i)))
+            if i == 500:
+                yield tornado.gen.sleep(0.01)
+        yield reporter.close()
+
+    try:
+        io_loop.run_sync(report)
+    finally:
+        io_loop.close()
+    assert reporter.batch_size > 2
+    assert len(sent) < 500
@@ -2,7 +2,11 @@ from __future__ import absolute_import
 
 import unittest
 
+import pytest
 from jaeger_client import SpanContext
+from opentracing import SpanContextCorruptedException
+from tornado.httputil import HTTPHeaders
+
 from jaeger_client_contrib.zipkin import codecs
 
 
@@ -73,6 +77,58 @@ class TestB3Codec(unittest.TestCase):
         codec.inject(span_context, carrier)
         assert '1' != carrier.get(codecs.SAMPLED_FLAG)
 
+    def test_inject_single_header(self):
+        codec = codecs.B3Codec(single_header=True)
+        for flags, state in ((0, '0'), (codecs.SAMPLED_FLAG, '1'),
+                             (codecs.SAMPLED_FLAG | codecs.DEBUG_FLAG, 'd')):
+            carrier = {}
+            codec.inject(SpanContext(trace_id=1, span_id=2, parent_id=0,
+                                     flags=flags), carrier)
+            assert carrier == {'b3': '%s-%s-%s' % (
+                codecs.to_lower_hex(1), codecs.to_lower_hex(2), state)}
+        carrier = {}
+        trace_id = 0x463ac35c9f6413ad48485a3953bb6124
+        codec.inject(SpanContext(trace_id=trace_id, span_id=2, parent_id=1,
+                                 flags=codecs.SAMPLED_FLAG), carrier)
+        assert carrier == {'b3': '463ac35c9f6413ad48485a3953bb6124-'
+                                 '0000000000000002-1-0000000000000001'}
+        context = codec.extract(carrier)
+        assert (context.trace_id, context.span_id, context.parent_id,
+                context.flags) == (trace_id, 2, 1, codecs.SAMPLED_FLAG)
+
+    def test_extract_single_header(self):
+        codec = codecs.B3Codec()
+        context = codec.extract({'b3': '0000000000000001-0000000000000002'})
+        assert (context.trace_id, context.span_id, context.parent_id,
+                context.flags) == (1, 2, None, 0)
+        context = codec.extract(HTTPHeaders(
+            {'B3': '0000000000000001-0000000000000002-d'}))
+        assert context.flags == codecs.SAMPLED_FLAG | codecs.DEBUG_FLAG
+        # a sampling state alone carries no trace id, but keeps the decision
+        context = codec.extract({'b3': '0'})
+        assert (context.trace_id, context.flags) == (None, 0)
+        assert not context.is_debug_id_container_only
+        context = codec.extract({'b3': '1'})
+        assert (context.trace_id, context.flags) == \
+            (None, codecs.SAMPLED_FLAG)
+        assert codec.extract({'b3': 'd'}).is_debug_id_container_only
+        for header in ('', '1-2-3', '1-x', '1-2-1-y', '1-2-1-3-4'):
+            with pytest.raises(SpanContextCorruptedException):
+                codec.extract({'b3': header})
+
+    def test_extract_either_format(self):
+        codec = codecs.B3Codec(single_header=True)
+        carrier = self._make_b3_carrier(trace_id=1, span_id=2, parent_id=1,
+                                        flags=codecs.SAMPLED_FLAG)
+        context = codec.extract(carrier)
+        assert (context.trace_id, context.span_id, context.parent_id,
+                context.flags) == (1, 2, 1, codecs.SAMPLED_FLAG)
+        # the single header takes precedence, whatever its case
+        carrier['B3'] = '0000000000000003-0000000000000004-0'
+        context = codec.extract(carrier)
+        assert (context.trace_id, context.span_id, context.flags) == \
+            (3, 4, 0)
+
     def _make_b3_carrier(self, trace_id, span_id, parent_id, flags):
         carrier = {}
         if trace_id is not None:
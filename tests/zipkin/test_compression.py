@@ -0,0 +1,67 @@
+import gzip
+import io
+import zlib
+
+import pytest
+
+from jaeger_client_contrib.thrift import zipkin_spans_in_bytes
+from jaeger_client_contrib.zipkin.compression import (COMPRESSION_DEFLATE,
+                                                      COMPRESSION_GZIP,
+                                                      CompressedMessage,
+                                                      Compressor)
+
+from ..test_thrift import _make_spans
+from .test_reporter import FakeMetricsFactory
+
+
+def _gunzip(data):
+    return gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+
+
+@pytest.mark.parametrize('method,decompress', [
+    (COMPRESSION_GZIP, _gunzip),
+    (COMPRESSION_DEFLATE, zlib.decompress),
+])
+def test_compress(tracer, method, decompress):
+    metrics_factory = FakeMetricsFactory()
+    compressor = Compressor(method, metrics_factory, min_bytes=0)
+    message = zipkin_spans_in_bytes(_make_spans(tracer))
+    compressed = compressor.compress(message)
+    assert isinstance(compressed, CompressedMessage)
+    assert compressed.content_encoding == method
+    assert decompress(compressed) == message
+    assert len(compressed) < len(message)
+
+    counters = metrics_factory.counters
+    assert counters['jaeger.reporter.compression_bytes.compressed_false'] == \
+        len(message)
+    assert counters['jaeger.reporter.compression_bytes.compressed_true'] == \
+        len(compressed)
+    assert metrics_factory.gauges['jaeger.reporter.compression_ratio'] == \
+        float(len(message)) / len(compressed)
+
+
+def test_compress_skips_small_batches():
+    metrics_factory = FakeMetricsFactory()
+    compressor = Compressor(COMPRESSION_GZIP, metrics_factory, min_bytes=100)
+    message = b'x' * 99
+    assert compressor.compress(message) is message
+    assert not metrics_factory.counters
+
+
+def test_compressor_errors():
+    with pytest.raises(ValueError):
+        Compressor('lzma', FakeMetricsFactory())
+    with pytest.raises(ValueError):
+        Compressor(COMPRESSION_GZIP, FakeMetricsFactory(), level=10)
+
+
+@pytest.mark.parametrize('level', [1, 6, 9])
+def test_compress_benchmark(tracer, benchmark, level):
+    compressor = Compressor(COMPRESSION_GZIP, FakeMetricsFactory(),
+                            level=level, min_bytes=0)
+    message = zipkin_spans_in_bytes(_make_spans(tracer, count=25))
+    benchmark.extra_info['batch_bytes'] = len(message)
+    benchmark.extra_info['ratio'] = \
+        float(len(message)) / len(compressor.compress(message))
+    benchmark(compressor.compress, message)
@@ -0,0 +1,55 @@
+import pytest
+
+from jaeger_client_contrib.zipkin.encoding import (ENCODING_AGENT,
+                                                   ENCODING_AGENT_BINARY,
+                                                   ENCODING_AGENT_JAEGER,
+                                                   ENCODING_JSON_V2,
+                                                   ENCODING_PROTO3,
+                                                   ENCODING_THRIFT,
+                                                   AgentBinaryEncoder,
+                                                   AgentEncoder,
+                                                   AgentJaegerEncoder,
+                                                   JsonV2Encoder,
+                                                   Proto3Encoder,
+                                                   ThriftEncoder, get_encoder)
+
+from ..test_thrift import _make_spans
+
+ENCODINGS = [ENCODING_THRIFT, ENCODING_JSON_V2, ENCODING_PROTO3]
+
+
+def test_get_encoder():
+    assert isinstance(get_encoder(ENCODING_THRIFT), ThriftEncoder)
+    assert isinstance(get_encoder(ENCODING_JSON_V2), JsonV2Encoder)
+    assert isinstance(get_encoder(ENCODING_PROTO3), Proto3Encoder)
+    assert isinstance(get_encoder(ENCODING_AGENT), AgentEncoder)
+    assert isinstance(get_encoder(ENCODING_AGENT_BINARY), AgentBinaryEncoder)
+    assert isinstance(get_encoder(ENCODING_AGENT_JAEGER), AgentJaegerEncoder)
+    with pytest.raises(ValueError):
+        get_encoder('xml')
+
+
+@pytest.mark.parametrize('encoding', ENCODINGS)
+def test_encoder_list_overhead(tracer, encoding):
+    encoder = get_encoder(encoding)
+    encoded = [encoder.encode_span(span) for span in _make_spans(tracer)]
+    size = encoder.list_overhead + \
+        sum(len(span) + encoder.item_overhead for span in encoded)
+    # the byte budget may overestimate by the item_overhead of one span
+    assert 0 <= size - len(encoder.join(encoded)) <= encoder.item_overhead
+
+
+@pytest.mark.parametrize(
+    'encoding', ENCODINGS + [ENCODING_AGENT, ENCODING_AGENT_BINARY,
+                             ENCODING_AGENT_JAEGER])
+def test_encode_spans_benchmark(tracer, benchmark, encoding):
+    spans = _make_spans(tracer, count=10)
+    encoder = get_encoder(encoding)
+    benchmark.extra_info['bytes_per_span'] = \
+        len(encoder.encode_spans(spans)) / float(len(spans))
+
+    def setup():
+        # accelerated thrift encoding appends annotations to the spans
+        return (_make_spans(tracer, count=10),), {}
+
+    benchmark.pedantic(encoder.encode_spans, setup=setup, rounds=200)
@@ -0,0 +1,301 @@
+import gc
+import gzip
+import io
+
+import mock
+import pytest
+import tornado.gen
+import tornado.web
+from tornado.httpclient import HTTPError
+from tornado.concurrent import Future
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
+from tornado.locks import Event
+from tornado.log import app_log
+from tornado.tcpserver import TCPServer
+from tornado.testing import AsyncTestCase, bind_unused_port, gen_test
+
+from jaeger_client_contrib.thrift import zipkin_spans_in_bytes
+from jaeger_client_contrib.zipkin.compression import (COMPRESSION_GZIP,
+                                                      Compressor)
+from jaeger_client_contrib.zipkin.encoding import (ENCODING_JSON_V2,
+                                                   ENCODING_PROTO3)
+from jaeger_client_contrib.zipkin.http_transport import HTTPTransport
+from jaeger_client_contrib.zipkin.reporter import ZipkinReporter
+
+from .test_reporter import FakeMetricsFactory, _new_span
+
+
+class FakeCollector(object):
+    """A stand-in Zipkin collector recording the batches posted to it."""
+
+    def __init__(self, status=202):
+        self.status = status
+        self.requests = []
+        # if set, requests are held until this Event is set
+        self.hold = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections = set()
+
+
+class SpansHandler(tornado.web.RequestHandler):
+    def initialize(self, collector):
+        self.collector = collector
+
+    @tornado.gen.coroutine
+    def post(self):
+        collector = self.collector
+        collector.connections.add(id(self.request.connection.stream))
+        collector.in_flight += 1
+        collector.max_in_flight = max(
+            collector.max_in_flight, collector.in_flight)
+        try:
+            if collector.hold is not None:
+                yield collector.hold.wait()
+            collector.requests.append(self.request)
+            self.set_status(collector.status)
+        finally:
+            collector.in_flight -= 1
+
+
+def _start_collector(io_loop, collector, **kwargs):
+    sock, port = bind_unused_port()
+    app = tornado.web.Application([
+        (r'/api/v[12]/spans', SpansHandler, {'collector': collector}),
+    ])
+    server = HTTPServer(app, io_loop=io_loop, **kwargs)
+    server.add_sockets([sock])
+    return server, 'http://127.0.0.1:%d' % port
+
+
+class ClosingCollector(TCPServer):
+    """Answers one request per connection, then hangs up without notice."""
+
+    @tornado.gen.coroutine
+    def handle_stream(self, stream, address):
+        yield stream.read_until(b'\r\n\r\n')
+        stream.write(b'HTTP/1.1 202 Accepted\r\nContent-Length: 0\r\n\r\n')
+        stream.close()
+
+
+class HTTPTransportTest(AsyncTestCase):
+    def setUp(self):
+        super(HTTPTransportTest, self).setUp()
+        self.collector = FakeCollector()
+        self.server, self.url = _start_collector(self.io_loop, self.collector)
+
+    def tearDown(self):
+        self.server.stop()
+        super(HTTPTransportTest, self).tearDown()
+
+    def _new_transport(self, **kwargs):
+        kwargs.setdefault('io_loop', self.io_loop)
+        kwargs.setdefault('metrics_factory', FakeMetricsFactory())
+        return HTTPTransport(self.url, **kwargs)
+
+    @gen_test
+    def test_post_thrift(self):
+        transport = self._new_transport()
+        message = zipkin_spans_in_bytes([_new_span('1')])
+        yield transport(message)
+        yield transport(message)
+
+        request, _ = self.collector.requests
+        assert request.path == '/api/v1/spans'
+        assert request.headers['Content-Type'] == 'application/x-thrift'
+        assert 'Content-Encoding' not in request.headers
+        assert request.body == message
+        # both requests went over the same connection
+        assert len(self.collector.connections) == 1
+        yield transport.close()
+
+    @gen_test
+    def test_metrics(self):
+        metrics_factory = FakeMetricsFactory()
+        transport = self._new_transport(metrics_factory=metrics_factory)
+        for _ in range(3):
+            yield transport(b'x')
+        yield transport.close()
+        counters = metrics_factory.counters
+        assert counters['jaeger.reporter.http_requests.result_ok'] == 3
+        assert counters['jaeger.reporter.http_connections.reused_false'] == 1
+        assert counters['jaeger.reporter.http_connections.reused_true'] == 2
+
+    @gen_test
+    def test_content_types(self):
+        for encoding, content_type in [
+                (ENCODING_JSON_V2, 'application/json'),
+                (ENCODING_PROTO3, 'application/x-protobuf')]:
+            transport = self._new_transport(encoding=encoding)
+            yield transport(b'[]')
+            yield transport.close()
+            request = self.collector.requests.pop()
+            assert request.path == '/api/v2/spans'
+            assert request.headers['Content-Type'] == content_type
+
+    @gen_test
+    def test_post_compressed(self):
+        transport = self._new_transport()
+        message = zipkin_spans_in_bytes([_new_span('1')])
+        compressor = Compressor(COMPRESSION_GZIP, FakeMetricsFactory(),
+                                min_bytes=0)
+        yield transport(compressor.compress(message))
+        yield transport.close()
+        request, = self.collector.requests
+        assert request.headers['Content-Encoding'] == 'gzip'
+        assert gzip.GzipFile(fileobj=io.BytesIO(request.body)).read() == \
+            message
+
+    @gen_test
+    def test_error_status(self):
+        self.collector.status = 500
+        metrics_factory = FakeMetricsFactory()
+        transport = self._new_transport(metrics_factory=metrics_factory)
+        with pytest.raises(HTTPError) as exc_info:
+            yield transport(b'x')
+        assert exc_info.value.code == 500
+        yield transport.close()
+        assert metrics_factory.counters[
+            'jaeger.reporter.http_requests.result_err'] == 1
+
+    @gen_test
+    def test_max_connections(self):
+        self.collector.hold = Event()
+        metrics_factory = FakeMetricsFactory()
+        transport = self._new_transport(
+            max_connections=2, max_pending=2, metrics_factory=metrics_factory)
+        futures = [transport(b'x') for _ in range(5)]
+        with pytest.raises(HTTPError):
+            yield futures[4]
+        assert metrics_factory.counters[
+            'jaeger.reporter.http_requests.result_dropped'] == 1
+        yield tornado.gen.sleep(0.01)
+        self.collector.hold.set()
+        yield futures[:4]
+        assert self.collector.max_in_flight == 2
+        assert len(self.collector.requests) == 4
+        assert len(self.collector.connections) == 2
+        yield transport.close()
+
+    @gen_test
+    def test_request_timeout(self):
+        self.collector.hold = Event()
+        transport = self._new_transport(request_timeout=0.01)
+        with pytest.raises(tornado.gen.TimeoutError):
+            yield transport(b'x')
+        assert not transport._idle
+        self.collector.hold.set()
+        yield transport.close()
+
+    @gen_test
+    def test_connect_timeout(self):
+        connecting = Future()
+        transport = self._new_transport(request_timeout=0.01)
+        transport._connect = lambda: connecting
+        with pytest.raises(tornado.gen.TimeoutError):
+            yield transport(b'x')
+        # a connection that succeeds after the timeout is not leaked
+        stream = mock.Mock()
+        connecting.set_result(stream)
+        stream.close.assert_called_once_with()
+        yield transport.close()
+
+    @gen_test
+    def test_failure_is_not_logged_again(self):
+        self.collector.status = 500
+        transport = self._new_transport()
+        with mock.patch.object(app_log, 'error') as log_error:
+            # the reporters do not read the Futures of failed sends
+            transport(b'x')
+            yield transport.close()
+            gc.collect()
+        assert len(self.collector.requests) == 1
+        assert not log_error.called
+
+    @gen_test
+    def test_no_keep_alive(self):
+        transport = self._new_transport(keep_alive=False)
+        yield transport(b'x')
+        yield transport(b'x')
+        yield transport.close()
+        assert len(self.collector.connections) == 2
+        assert self.collector.requests[0].headers['Connection'] == 'close'
+
+    @gen_test
+    def test_collector_closes_idle_connection(self):
+        server = ClosingCollector(io_loop=self.io_loop)
+        sock, port = bind_unused_port()
+        server.add_sockets([sock])
+        transport = HTTPTransport('http://127.0.0.1:%d/' % port,
+                                  io_loop=self.io_loop)
+        for _ in range(3):
+            yield transport(b'x')
+        yield transport.close()
+        server.stop()
+
+    @gen_test
+    def test_close(self):
+        transport = self._new_transport()
+        yield transport(b'x')
+        assert len(transport._idle) == 1
+        yield transport.close()
+        assert not transport._idle
+        with pytest.raises(StreamClosedError):
+            yield transport(b'x')
+
+    @gen_test
+    def test_own_io_loop(self):
+        transport = self._new_transport(io_loop=None)
+        yield transport(b'x')
+        yield transport.close()
+        transport._thread.join(1)
+        assert not transport._thread.is_alive()
+        assert len(self.collector.requests) == 1
+
+    @gen_test
+    def test_reporter(self):
+        transport = self._new_transport()
+        reporter = ZipkinReporter(transport_handler=transport,
+                                  io_loop=self.io_loop, batch_size=2)
+        spans = [_new_span('1'), _new_span('2')]
+        for span in spans:
+            reporter.report_span(span)
+        yield reporter.close()
+        yield transport.close()
+        request, = self.collector.requests
+        assert request.body == zipkin_spans_in_bytes(spans)
+
+    def test_invalid_arguments(self):
+        with pytest.raises(ValueError):
+            HTTPTransport('zipkin:9411', io_loop=self.io_loop)
+        with pytest.raises(ValueError):
+            HTTPTransport(self.url, encoding='xml', io_loop=self.io_loop)
+        with pytest.raises(ValueError):
+            HTTPTransport(self.url, max_connections=0, io_loop=self.io_loop)
+
+
+@pytest.mark.parametrize('keep_alive', [True, False])
+def test_post_batches_benchmark(benchmark, keep_alive):
+    io_loop = IOLoop(make_current=False)
+    server, url = _start_collector(io_loop, FakeCollector())
+    transport = HTTPTransport(url, io_loop=io_loop, keep_alive=keep_alive)
+    message = zipkin_spans_in_bytes([_new_span(str(i)) for i in range(10)])
+    batches = 100
+
+    @tornado.gen.coroutine
+    def post():
+        for _ in range(batches):
+            yield transport(message)
+
+    try:
+        # batches/sec is batches times the benchmark's OPS
+        benchmark.extra_info['batches'] = batches
+        benchmark.pedantic(io_loop.run_sync, args=(post,), rounds=10)
+    finally:
+        io_loop.run_sync(transport.close)
+        server.stop()
+        # let the collector see its connections closing
+        io_loop.run_sync(lambda: tornado.gen.sleep(0.01))
+        io_loop.close(all_fds=True)
@@ -0,0 +1,238 @@
+import json
+
+import mock
+import pytest
+import tornado.gen
+from opentracing.ext import tags as ext_tags
+from thrift.protocol.TCompactProtocol import TCompactProtocol
+from thrift.Thrift import TMessageType, TType
+from thrift.transport.TTransport import TMemoryBuffer
+from tornado.ioloop import IOLoop
+
+from jaeger_client import ConstSampler
+from jaeger_client.thrift import id_to_int
+from jaeger_client_contrib import Tracer
+from jaeger_client_contrib.thrift import extract_from_trace_id
+from jaeger_client_contrib.zipkin.agent import (AGENT_JAEGER_MESSAGE_OVERHEAD,
+                                                MAX_SEQID, agent_jaeger_batch)
+from jaeger_client_contrib.zipkin.encoding import (ENCODING_AGENT,
+                                                   ENCODING_AGENT_JAEGER,
+                                                   get_encoder)
+from jaeger_client_contrib.zipkin.jaeger_thrift import (
+    jaeger_span_in_compact_bytes, tracer_process_compact)
+from jaeger_client_contrib.zipkin.reporter import ZipkinReporter
+
+from ..test_thrift import _make_spans
+
+_READERS = {
+    TType.BOOL: 'readBool',
+    TType.DOUBLE: 'readDouble',
+    TType.I32: 'readI32',
+    TType.I64: 'readI64',
+    TType.STRING: 'readString',
+}
+
+
+def _read_value(protocol, ttype):
+    if ttype == TType.STRUCT:
+        return _read_struct(protocol)
+    if ttype == TType.LIST:
+        item_type, count = protocol.readListBegin()
+        items = [_read_value(protocol, item_type) for _ in range(count)]
+        protocol.readListEnd()
+        return items
+    return getattr(protocol, _READERS[ttype])()
+
+
+def _read_struct(protocol):
+    """Reads any struct as a dictionary of field id to value."""
+    fields = {}
+    protocol.readStructBegin()
+    while True:
+        _, ttype, fid = protocol.readFieldBegin()
+        if ttype == TType.STOP:
+            break
+        fields[fid] = _read_value(protocol, ttype)
+        protocol.readFieldEnd()
+    protocol.readStructEnd()
+    return fields
+
+
+def _decode(struct_bytes):
+    return _read_struct(TCompactProtocol(TMemoryBuffer(struct_bytes)))
+
+
+def _decode_batch(message):
+    """Decodes an emitBatch message the way jaeger-agent does."""
+    transport = TMemoryBuffer(message)
+    protocol = TCompactProtocol(transport)
+    name, message_type, seqid = protocol.readMessageBegin()
+    assert (name, message_type) == ('emitBatch', TMessageType.ONEWAY)
+    args = _read_struct(protocol)
+    protocol.readMessageEnd()
+    assert not transport.read(1)
+    return seqid, args[1]
+
+
+def _tags(tags):
+    """Returns Tag structs as a dictionary of key to value."""
+    return dict((tag[1], tag[max(tag)]) for tag in tags)
+
+
+def test_jaeger_span(tracer):
+    root, client, server, local = _make_spans(tracer)
+    root.set_tag(ext_tags.ERROR, True)
+    _, process_tags = tracer_process_compact(tracer)
+
+    decoded = _decode(jaeger_span_in_compact_bytes(root, process_tags))
+    hi, lo = extract_from_trace_id(root.trace_id)
+    assert decoded[1] == id_to_int(lo)
+    assert decoded[2] == id_to_int(hi)
+    assert decoded[3] == id_to_int(root.span_id)
+    assert decoded[4] == 0
+    assert decoded[5] == 'root-span'
+    assert decoded[7] == root.flags
+    assert decoded[9] == int((root.end_time - root.start_time) * 1000000)
+    tags = _tags(decoded[10])
+    assert tags['bender'] == 'is great'
+    assert tags[ext_tags.ERROR] is True
+    # tracer tags are sent with the Process rather than with its first span
+    assert 'jaeger.version' not in tags
+    event, structured = decoded[11]
+    assert _tags(event[2]) == {'event': 'kiss-my-shiny-metal-...'}
+    assert _tags(structured[2]) == {'event': 'structured', 'x': 1}
+
+    decoded = _decode(jaeger_span_in_compact_bytes(client))
+    assert decoded[4] == id_to_int(root.span_id)
+    assert _tags(decoded[10]) == {
+        ext_tags.SPAN_KIND: ext_tags.SPAN_KIND_RPC_CLIENT,
+        ext_tags.PEER_SERVICE: 'downstream',
+        ext_tags.PEER_HOST_IPV4: '127.0.0.1',
+        ext_tags.PEER_PORT: 8080,
+    }
+    assert 11 not in decoded
+
+    assert _tags(_decode(jaeger_span_in_compact_bytes(local))[10]) == \
+        {ext_tags.COMPONENT: 'db'}
+
+
+def test_log_fields(tracer):
+    span = tracer.start_span('logs')
+    span.log_kv({'event': 'x', 'nested': {'a': [1]}, 'ratio': 0.5})
+    span.log_event('{not json')
+    span.finish()
+    structured, event = _decode(jaeger_span_in_compact_bytes(span))[11]
+    assert _tags(structured[2]) == {
+        'event': 'x', 'nested': json.dumps({'a': [1]}, separators=(',', ':')),
+        'ratio': 0.5}
+    assert _tags(event[2]) == {'event': '{not json'}
+
+
+def test_tracer_process(tracer):
+    process, process_tags = tracer_process_compact(tracer)
+    assert tracer_process_compact(tracer)[0] is process
+    decoded = _decode(process)
+    assert decoded[1] == 'test_service_1'
+    tags = _tags(decoded[2])
+    assert tags['jaeger.version'] == tracer.tags['jaeger.version']
+    assert 'ip' in tags
+    assert process_tags['jaeger.version'] == tracer.tags['jaeger.version']
+
+
+def test_agent_jaeger_batch(tracer):
+    spans = _make_spans(tracer, count=5)
+    process, process_tags = tracer_process_compact(tracer)
+    encoded = [jaeger_span_in_compact_bytes(span, process_tags)
+               for span in spans]
+    message = agent_jaeger_batch(process, encoded, seqid=MAX_SEQID)
+    seqid, batch = _decode_batch(message)
+    assert seqid == MAX_SEQID
+    assert batch[1][1] == 'test_service_1'
+    assert [span[3] for span in batch[2]] == \
+        [id_to_int(span.span_id) for span in spans]
+
+    size = AGENT_JAEGER_MESSAGE_OVERHEAD + len(process) + \
+        sum(len(span) for span in encoded)
+    assert 0 <= size - len(message) < 10
+
+
+def test_encoder(tracer):
+    encoder = get_encoder(ENCODING_AGENT_JAEGER)
+    overhead = encoder.list_overhead
+    spans = _make_spans(tracer, count=2)
+    _, batch = _decode_batch(encoder.encode_spans(spans))
+    assert len(batch[2]) == len(spans)
+    assert encoder.list_overhead > overhead
+    _, batch = _decode_batch(encoder.join([]))
+    assert batch[2] == []
+
+
+def test_reporter_splits_batches(tracer):
+    messages = []
+    spans = _make_spans(tracer, count=5)
+
+    @tornado.gen.coroutine
+    def report():
+        reporter = ZipkinReporter(transport_handler=messages.append,
+                                  io_loop=IOLoop.current(),
+                                  batch_size=100,
+                                  max_batch_bytes=600,
+                                  encoding=ENCODING_AGENT_JAEGER)
+        for span in spans:
+            reporter.report_span(span)
+        yield reporter.close()
+
+    IOLoop.current().run_sync(report)
+    assert len(messages) > 1
+    # the first batch is split after its Process is known
+    assert all(len(message) <= 600 for message in messages)
+    decoded = [span for message in messages
+               for span in _decode_batch(message)[1][2]]
+    assert [span[3] for span in decoded] == \
+        [id_to_int(span.span_id) for span in spans]
+
+
+def test_encoder_rejects_mixed_tracers(tracer):
+    other = Tracer(service_name='other_service', reporter=mock.MagicMock(),
+                   sampler=ConstSampler(True))
+    spans = _make_spans(tracer) + _make_spans(other)
+    with pytest.raises(ValueError):
+        get_encoder(ENCODING_AGENT_JAEGER).encode_spans(spans)
+
+
+@pytest.mark.parametrize('max_batch_bytes', [None, 2000])
+def test_reporter_splits_batches_by_tracer(tracer, max_batch_bytes):
+    other = Tracer(service_name='other_service', reporter=mock.MagicMock(),
+                   sampler=ConstSampler(True))
+    messages = []
+    spans = _make_spans(tracer)[:3] + _make_spans(other)[:2] + \
+        _make_spans(tracer)[:1]
+
+    @tornado.gen.coroutine
+    def report():
+        reporter = ZipkinReporter(transport_handler=messages.append,
+                                  io_loop=IOLoop.current(),
+                                  batch_size=100,
+                                  max_batch_bytes=max_batch_bytes,
+                                  encoding=ENCODING_AGENT_JAEGER)
+        for span in spans:
+            reporter.report_span(span)
+        yield reporter.close()
+
+    IOLoop.current().run_sync(report)
+    batches = [_decode_batch(message)[1] for message in messages]
+    assert [(batch[1][1], len(batch[2])) for batch in batches] == \
+        [('test_service_1', 3), ('other_service', 2), ('test_service_1', 1)]
+
+
+@pytest.mark.parametrize('count', [1, 10])
+def test_smaller_than_zipkin(tracer, count):
+    span = tracer.start_span('many-tags-and-logs')
+    for i in range(20):
+        span.set_tag('tag%d' % i, 'value')
+        span.log_kv({'event': 'log', 'i': i})
+    span.finish()
+    zipkin = get_encoder(ENCODING_AGENT).encode_spans([span] * count)
+    jaeger = get_encoder(ENCODING_AGENT_JAEGER).encode_spans([span] * count)
+    # the endpoint Zipkin repeats in every annotation is only sent once
+    assert len(jaeger) < len(zipkin) * 0.8
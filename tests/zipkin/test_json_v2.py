@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import json
+
+from jaeger_client.span import DEBUG_FLAG
+from jaeger_client_contrib.zipkin import json_v2
+
+from ..test_thrift import _make_spans
+
+
+def test_zipkin_v2_spans_in_json(tracer):
+    root, client, server, local = _make_spans(tracer, count=1)
+    decoded = json.loads(
+        json_v2.zipkin_v2_spans_in_json([root, client, server, local]))
+    assert 4 == len(decoded)
+    endpoint = {'serviceName': 'test_service_1',
+                'ipv4': json_v2._ipv4_to_str(tracer.ip_address)}
+
+    assert decoded[0]['traceId'] == '%032x' % root.trace_id
+    assert decoded[0]['id'] == '%016x' % root.span_id
+    assert 'parentId' not in decoded[0]
+    assert decoded[0]['name'] == 'root-span'
+    assert decoded[0]['localEndpoint'] == endpoint
+    assert decoded[0]['timestamp'] == int(root.start_time * 1000000)
+    assert decoded[0]['duration'] == \
+        int((root.end_time - root.start_time) * 1000000)
+    assert [a['value'] for a in decoded[0]['annotations']] == \
+        [log.value for log in root.logs]
+    assert decoded[0]['tags']['bender'] == 'is great'
+    assert decoded[0]['tags']['lc'] == 'test_service_1'
+    assert 'kind' not in decoded[0]
+
+    assert decoded[1]['parentId'] == '%016x' % root.span_id
+    assert decoded[1]['kind'] == 'CLIENT'
+    assert decoded[1]['remoteEndpoint'] == {
+        'serviceName': 'downstream', 'ipv4': '127.0.0.1', 'port': 8080}
+    assert 'lc' not in decoded[1].get('tags', {})
+
+    assert decoded[2]['kind'] == 'SERVER'
+    assert 'remoteEndpoint' not in decoded[2]
+    assert decoded[3]['tags']['lc'] == 'db'
+
+
+def test_zipkin_v2_spans_in_json_ids(tracer):
+    span = tracer.start_span('wide-span')
+    span.context.trace_id = 1
+    span.context.span_id = (1 << 64) - 1
+    span.context.flags |= DEBUG_FLAG
+    span.finish()
+    decoded, = json.loads(json_v2.zipkin_v2_spans_in_json([span]))
+    assert decoded['traceId'] == '0000000000000001'
+    assert decoded['id'] == 'ffffffffffffffff'
+    assert decoded['debug'] is True
+
+
+def test_zipkin_v2_spans_in_json_unicode(tracer):
+    span = tracer.start_span(u'опер')
+    span.set_tag('unicode', u'привет')
+    span.finish()
+    decoded, = json.loads(json_v2.zipkin_v2_spans_in_json([span]))
+    assert decoded['name'] == u'опер'
+    assert decoded['tags']['unicode'] == u'привет'
+
+
+def test_zipkin_v2_spans_in_json_does_not_mutate(tracer):
+    span, = _make_spans(tracer, count=1)[1:2]
+    logs, tags = span.logs[:], span.tags[:]
+    json_v2.zipkin_v2_spans_in_json([span])
+    assert (logs, tags) == (span.logs, span.tags)
+
+
+def test_encoded_spans_in_json(tracer):
+    spans = _make_spans(tracer)
+    encoded = [json_v2.zipkin_v2_span_in_json(span) for span in spans]
+    assert json_v2.encoded_spans_in_json(encoded) == \
+        json_v2.zipkin_v2_spans_in_json(spans)
+    assert json_v2.encoded_spans_in_json([]) == b'[]'
+
+
+def test_tracer_endpoint_json(tracer):
+    assert json_v2.tracer_endpoint_json(tracer) is \
+        json_v2.tracer_endpoint_json(tracer)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import binascii
+import collections
+
+import pytest
+
+from jaeger_client import Span, SpanContext
+from jaeger_client.span import DEBUG_FLAG
+from jaeger_client.thrift import make_event
+from jaeger_client_contrib.zipkin import proto3
+from opentracing.ext import tags as ext_tags
+
+from ..test_thrift import _make_spans
+
+FakeTracer = collections.namedtuple(
+    'FakeTracer', ['ip_address', 'service_name'])
+
+# Golden ListOfSpans encodings of _golden_spans(), checked against the
+# protobuf runtime and zipkin.proto (SerializeToString(deterministic=True)).
+GOLDEN_LOCAL = (
+    '0a670a100102030405060708090a0b0c0d0e0f10120821222324252627281a0811'
+    '121314151617182a056c6f63616c3100c029f73d5405003890a10f420b0a037376'
+    '6312047f000001520c0948a82bf73d5405001201655a060a016b1201765a080a02'
+    '6c6312026462')
+GOLDEN_CLIENT = (
+    '0a4c0a0801020304050607081a08fffffffffffffffe20012a06636c69656e7431'
+    '00c029f73d54050038a0c21e420b0a0373766312047f0000014a100a04646f776e'
+    '12040a00000120ffff036001')
+
+
+def _golden_spans():
+    tracer = FakeTracer(ip_address=0x7f000001, service_name='Svc')
+    local = Span(context=SpanContext(
+        trace_id=0x0102030405060708090a0b0c0d0e0f10,
+        span_id=0x1112131415161718,
+        parent_id=0x2122232425262728, flags=1),
+        tracer=tracer, operation_name='local', start_time=1500000000.0)
+    local.set_tag('k', 'v')
+    local.set_tag(ext_tags.COMPONENT, 'db')
+    local.logs.append(make_event(1500000000.125, 'e'))
+    local.end_time = 1500000000.25
+
+    client = Span(context=SpanContext(
+        trace_id=0x0102030405060708, span_id=0xfffffffffffffffe,
+        parent_id=None, flags=1 | DEBUG_FLAG),
+        tracer=tracer, operation_name='client', start_time=1500000000.0,
+        tags={ext_tags.SPAN_KIND: ext_tags.SPAN_KIND_RPC_CLIENT})
+    client.set_tag(ext_tags.PEER_SERVICE, 'Down')
+    client.set_tag(ext_tags.PEER_HOST_IPV4, '10.0.0.1')
+    client.set_tag(ext_tags.PEER_PORT, 65535)
+    client.end_time = 1500000000.5
+    return local, client
+
+
+def test_zipkin_v2_spans_in_proto3_golden():
+    local, client = _golden_spans()
+    assert binascii.hexlify(
+        proto3.zipkin_v2_spans_in_proto3([local])) == GOLDEN_LOCAL.encode()
+    assert binascii.hexlify(
+        proto3.zipkin_v2_spans_in_proto3([client])) == GOLDEN_CLIENT.encode()
+    assert binascii.hexlify(proto3.zipkin_v2_spans_in_proto3(
+        [local, client])) == (GOLDEN_LOCAL + GOLDEN_CLIENT).encode()
+    assert proto3.zipkin_v2_spans_in_proto3([]) == b''
+
+
+@pytest.mark.parametrize('value,encoded', [
+    (0, '00'),
+    (1, '01'),
+    (127, '7f'),
+    (128, '8001'),
+    (300, 'ac02'),
+    ((1 << 64) - 1, 'ffffffffffffffffff01'),
+    (-1, 'ffffffffffffffffff01'),
+])
+def test_write_varint(value, encoded):
+    buf = bytearray()
+    proto3._write_varint(buf, value)
+    assert binascii.hexlify(bytes(buf)) == encoded.encode()
+
+
+@pytest.mark.parametrize('key,value,encoded', [
+    # the entry length is the last to fit in a single byte
+    ('k', 'v' * 122, '5a7f0a016b127a' + '76' * 122),
+    ('http.url', 'x' * 120,
+     '5a84010a08' + binascii.hexlify(b'http.url').decode() + '1278' +
+     '78' * 120),
+    ('k' * 127, 'v' * 127, '5a82020a7f' + '6b' * 127 + '127f' + '76' * 127),
+    ('k', 'v' * 256, '5a86020a016b128002' + '76' * 256),
+])
+def test_write_long_tag(key, value, encoded):
+    buf = bytearray()
+    proto3._write_tag(buf, key, value)
+    assert binascii.hexlify(bytes(buf)) == encoded.encode()
+
+
+def test_zipkin_v2_spans_in_proto3_unicode(tracer):
+    span = tracer.start_span(u'опер')
+    span.set_tag('unicode', u'привет')
+    span.finish()
+    encoded = proto3.zipkin_v2_spans_in_proto3([span])
+    assert u'опер'.encode('utf-8') in encoded
+    assert u'привет'.encode('utf-8') in encoded
+
+
+def test_encoded_spans_in_proto3(tracer):
+    spans = _make_spans(tracer)
+    encoded = [proto3.zipkin_v2_span_in_proto3(span) for span in spans]
+    assert proto3.encoded_spans_in_proto3(encoded) == \
+        proto3.zipkin_v2_spans_in_proto3(spans)
+
+
+def test_tracer_endpoint_proto(tracer):
+    assert proto3.tracer_endpoint_proto(tracer) is \
+        proto3.tracer_endpoint_proto(tracer)
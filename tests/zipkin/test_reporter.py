@@ -1,6 +1,9 @@
 import collections
 import logging
+import threading
 import time
+import unittest
+import zlib
 
 import mock
 import pytest
@@ -13,7 +16,19 @@ from jaeger_client import Span, SpanContext
 from jaeger_client.ioloop_util import future_result
 from jaeger_client.metrics import LegacyMetricsFactory, Metrics
 from jaeger_client.utils import ErrorReporter
-from jaeger_client_contrib.zipkin.reporter import ZipkinReporter
+from jaeger_client_contrib import thrift
+from jaeger_client_contrib.thrift import (LIST_HEADER_SIZE,
+                                          zipkin_span_in_bytes,
+                                          zipkin_spans_in_bytes)
+from jaeger_client_contrib.zipkin.asyncio_reporter import (
+    AsyncioZipkinReporter, asyncio)
+from jaeger_client_contrib.zipkin.compression import (COMPRESSION_DEFLATE,
+                                                      Compressor)
+from jaeger_client_contrib.zipkin.encoding import (ENCODING_JSON_V2,
+                                                   ThriftEncoder)
+from jaeger_client_contrib.zipkin.json_v2 import zipkin_v2_spans_in_json
+from jaeger_client_contrib.zipkin.reporter import (ThreadedZipkinReporter,
+                                                   ZipkinReporter)
 
 
 class FakeSender(object):
@@ -46,13 +61,27 @@ FakeTrace = collections.namedtuple(
 class FakeMetricsFactory(LegacyMetricsFactory):
     def __init__(self):
         super(FakeMetricsFactory, self).__init__(
-            Metrics(count=self._incr_count)
+            Metrics(count=self._incr_count, gauge=self._set_gauge)
         )
         self.counters = {}
+        self.gauges = {}
 
     def _incr_count(self, key, value):
         self.counters[key] = value + self.counters.get(key, 0)
 
+    def _set_gauge(self, key, value):
+        self.gauges[key] = value
+
+
+def _new_span(name, parent_id=None, flags=1):
+    tracer = FakeTrace(ip_address='127.0.0.1',
+                       service_name='reporter_test')
+    ctx = SpanContext(trace_id=1, span_id=1, parent_id=parent_id, flags=flags)
+    span = Span(context=ctx, tracer=tracer, operation_name=name)
+    span.start_time = time.time()
+    span.end_time = span.start_time + 0.001  # 1ms
+    return span
+
 
 class ReporterTest(AsyncTestCase):
     @pytest.yield_fixture
@@ -60,22 +89,19 @@ class ReporterTest(AsyncTestCase):
         yield
 
     def _new_span(self, name):
-        tracer = FakeTrace(ip_address='127.0.0.1',
-                           service_name='reporter_test')
-        ctx = SpanContext(trace_id=1, span_id=1, parent_id=None, flags=1)
-        span = Span(context=ctx, tracer=tracer, operation_name=name)
-        span.start_time = time.time()
-        span.end_time = span.start_time + 0.001  # 1ms
-        return span
-
-    def _new_reporter(self, batch_size, flush=None, queue_cap=100):
+        return _new_span(name)
+
+    def _new_reporter(self, batch_size, flush=None, queue_cap=100,
+                      max_batch_bytes=None, encoding='thrift'):
         reporter = ZipkinReporter(transport_handler=mock.MagicMock(),
                                   io_loop=IOLoop.current(),
                                   batch_size=batch_size,
                                   flush_interval=flush,
                                   metrics_factory=FakeMetricsFactory(),
                                   error_reporter=HardErrorReporter(),
-                                  queue_capacity=queue_cap)
+                                  queue_capacity=queue_cap,
+                                  max_batch_bytes=max_batch_bytes,
+                                  encoding=encoding)
         sender = FakeSender()
         reporter._send = sender
         return reporter, sender
@@ -108,6 +134,74 @@ class ReporterTest(AsyncTestCase):
         reporter.report_span(self._new_span('1'))
         assert 1 == reporter.metrics_factory.counters[span_dropped_key]
 
+    @gen_test
+    def test_send_encodes_spans(self):
+        reporter, _ = self._new_reporter(batch_size=2)
+        span = self._new_span('1')
+        yield ZipkinReporter._send(reporter, [span])
+        reporter.transport_handler.assert_called_once_with(
+            zipkin_spans_in_bytes([span]))
+        yield reporter.close()
+
+    @gen_test
+    def test_send_encodes_spans_without_acceleration(self):
+        reporter, _ = self._new_reporter(batch_size=2)
+        reporter.encoder = ThriftEncoder(accelerated=False)
+        span = self._new_span('1')
+        yield ZipkinReporter._send(reporter, [span])
+        reporter.transport_handler.assert_called_once_with(
+            zipkin_spans_in_bytes([span]))
+        yield reporter.close()
+
+    @gen_test
+    def test_send_encodes_spans_in_json(self):
+        reporter, _ = self._new_reporter(batch_size=2,
+                                         encoding=ENCODING_JSON_V2)
+        span = self._new_span('1')
+        yield ZipkinReporter._send(reporter, [span])
+        reporter.transport_handler.assert_called_once_with(
+            zipkin_v2_spans_in_json([span]))
+        yield reporter.close()
+
+    @gen_test
+    def test_submit_max_batch_bytes_in_json(self):
+        reporter, sender = self._new_reporter(
+            batch_size=10, encoding=ENCODING_JSON_V2, max_batch_bytes=1000)
+        count = [0]
+
+        def send(spans):
+            count[0] += 1
+            assert len(reporter._encode_batch(spans)) <= 1000
+            return future_result(True)
+
+        reporter._send = send
+        for i in range(10):
+            reporter.report_span(self._new_span('%s' % i))
+        yield reporter.close()
+        assert count[0] > 1
+        assert 10 == reporter.metrics_factory.counters[
+            'jaeger.spans.reported_true']
+
+    @gen_test
+    def test_send_compresses_spans(self):
+        reporter, _ = self._new_reporter(batch_size=2)
+        reporter.compressor = Compressor(
+            COMPRESSION_DEFLATE, reporter.metrics_factory, min_bytes=0)
+        span = self._new_span('1')
+        yield ZipkinReporter._send(reporter, [span])
+        message, = reporter.transport_handler.call_args[0]
+        assert message.content_encoding == COMPRESSION_DEFLATE
+        assert zlib.decompress(message) == zipkin_spans_in_bytes([span])
+        yield reporter.close()
+
+    @gen_test
+    def test_thrift_accelerated_gauge(self):
+        reporter, _ = self._new_reporter(batch_size=1)
+        gauge_key = 'jaeger.reporter.thrift_accelerated'
+        assert reporter.metrics_factory.gauges[gauge_key] == \
+            int(thrift.ACCELERATED)
+        yield reporter.close()
+
     @gen_test
     def test_submit_failure(self):
         reporter, sender = self._new_reporter(batch_size=1)
@@ -199,15 +293,379 @@ class ReporterTest(AsyncTestCase):
         reporter.batch_size = 3
         for i in range(10):
             reporter.report_span(self._new_span('%s' % i))
-        assert reporter.queue.qsize() == 10, 'queued 10 spans'
+        assert len(reporter._buffer) == 10, 'buffered 10 spans'
 
         # now unblock consumer
         sender.futures[0].set_result(1)
         yield self._wait_for(lambda: count[0] > 2)
 
         assert count[0] == 3, '9 out of 10 spans submitted in 3 batches'
-        assert reporter.queue._unfinished_tasks == 1, 'one span still pending'
+        assert len(reporter._buffer) == 1, 'one span still pending'
 
         yield reporter.close()
-        assert reporter.queue.qsize() == 0, 'all spans drained'
+        assert len(reporter._buffer) == 0, 'all spans drained'
         assert count[0] == 4, 'last span submitted in one extrac batch'
+
+    @gen_test
+    def test_report_from_other_thread(self):
+        reporter, sender = self._new_reporter(batch_size=10)
+        add_callback = mock.MagicMock(wraps=reporter.io_loop.add_callback)
+        reporter.io_loop.add_callback = add_callback
+
+        def report():
+            for i in range(10):
+                reporter.report_span(self._new_span('%s' % i))
+
+        thread = threading.Thread(target=report)
+        thread.start()
+        thread.join()
+        # one callback hands all spans over to the IOLoop
+        assert 1 == add_callback.call_count
+        yield self._wait_for(lambda: len(sender.futures) > 0)
+        assert 10 == len(sender.requests[0])
+        sender.futures[0].set_result(1)
+        yield reporter.close()
+
+    @gen_test
+    def test_close_after_report_from_other_thread(self):
+        reporter, _ = self._new_reporter(batch_size=10)
+        count = [0]
+
+        def send(spans):
+            count[0] += len(spans)
+            return future_result(True)
+
+        reporter._send = send
+        thread = threading.Thread(
+            target=lambda: reporter.report_span(self._new_span('1')))
+        thread.start()
+        thread.join()
+        # spans handed off before close() are still submitted
+        yield reporter.close()
+        assert 1 == count[0]
+        assert 'jaeger.spans.dropped_true' not in \
+            reporter.metrics_factory.counters
+
+    def _span_size(self):
+        return len(zipkin_span_in_bytes(self._new_span('0')))
+
+    def test_max_batch_bytes_errors(self):
+        with pytest.raises(ValueError):
+            self._new_reporter(batch_size=10, max_batch_bytes=LIST_HEADER_SIZE)
+
+    @gen_test
+    def test_submit_max_batch_bytes(self):
+        size = self._span_size()
+        reporter, sender = self._new_reporter(
+            batch_size=10, flush=0.005,
+            max_batch_bytes=LIST_HEADER_SIZE + 2 * size + 1)
+        for i in range(5):
+            reporter.report_span(self._new_span('%s' % i))
+
+        yield self._wait_for(lambda: len(sender.futures) > 0)
+        assert 1 == len(sender.futures)
+        assert 2 == len(sender.requests[0])
+        assert all(len(s) == size for s in sender.requests[0])
+        sender.futures[0].set_result(1)
+
+        yield self._wait_for(lambda: len(sender.futures) > 1)
+        assert 2 == len(sender.requests[1])
+        sender.futures[1].set_result(1)
+
+        # the last span only goes out after the flush interval
+        yield self._wait_for(lambda: len(sender.futures) > 2)
+        assert 1 == len(sender.requests[2])
+        sender.futures[2].set_result(1)
+
+        yield reporter.close()
+        assert 3 == len(sender.futures)
+        assert 5 == reporter.metrics_factory.counters['jaeger.spans.reported_true']
+
+    @gen_test
+    def test_close_flushes_carried_span(self):
+        size = self._span_size()
+        reporter, _ = self._new_reporter(
+            batch_size=10, max_batch_bytes=LIST_HEADER_SIZE + size)
+        count = [0]
+
+        def send(spans):
+            count[0] += len(spans)
+            return future_result(True)
+
+        reporter._send = send
+        for i in range(3):
+            reporter.report_span(self._new_span('%s' % i))
+        yield reporter.close()
+        assert 3 == count[0]
+        assert len(reporter._buffer) == 0
+
+    @gen_test
+    def test_drop_span_exceeding_max_batch_bytes(self):
+        size = self._span_size()
+        reporter, sender = self._new_reporter(
+            batch_size=10, max_batch_bytes=LIST_HEADER_SIZE + size - 1)
+        reporter.error_reporter = ErrorReporter(
+            metrics=Metrics(), logger=logging.getLogger())
+        reporter.report_span(self._new_span('1'))
+
+        # spans are encoded when their batch is taken, here on close()
+        yield reporter.close()
+        span_dropped_key = 'jaeger.spans.dropped_true'
+        assert 1 == reporter.metrics_factory.counters[span_dropped_key]
+        assert 0 == len(sender.futures)
+
+    @gen_test
+    def test_send_encoded_spans(self):
+        reporter, _ = self._new_reporter(batch_size=2, max_batch_bytes=1000)
+        spans = [self._new_span('1'), self._new_span('2')]
+        encoded = [reporter._encode_span(span) for span in spans]
+        yield ZipkinReporter._send(reporter, encoded)
+        reporter.transport_handler.assert_called_once_with(
+            zipkin_spans_in_bytes(spans))
+        yield reporter.close()
+
+
+def _wait_until(fn, timeout=1.0):
+    deadline = time.time() + timeout
+    while not fn() and time.time() < deadline:
+        time.sleep(0.001)
+    return fn()
+
+
+class ThreadedReporterTest(unittest.TestCase):
+    def _new_reporter(self, batch_size, flush=None, queue_cap=100,
+                      max_batch_bytes=None, **kwargs):
+        batches = []
+
+        def transport_handler(message):
+            batches.append(message)
+
+        reporter = ThreadedZipkinReporter(
+            transport_handler=transport_handler,
+            batch_size=batch_size,
+            flush_interval=flush,
+            metrics_factory=FakeMetricsFactory(),
+            error_reporter=HardErrorReporter(),
+            queue_capacity=queue_cap,
+            max_batch_bytes=max_batch_bytes,
+            **kwargs)
+        sent = []
+        send = reporter._send
+
+        def capture(spans):
+            sent.append(list(spans))
+            send(spans)
+
+        reporter._send = capture
+        self.addCleanup(reporter.close)
+        return reporter, sent, batches
+
+    def test_submit_full_batches(self):
+        reporter, sent, batches = self._new_reporter(batch_size=2)
+        spans = [_new_span('%s' % i) for i in range(5)]
+        for span in spans:
+            reporter.report_span(span)
+
+        assert _wait_until(lambda: len(sent) == 2)
+        assert [2, 2] == [len(s) for s in sent]
+        assert batches[0] == zipkin_spans_in_bytes(spans[:2])
+
+        # partial batch waits for close() without a flush interval
+        time.sleep(0.01)
+        assert 2 == len(sent)
+        assert reporter.close().result(timeout=1)
+        assert [2, 2, 1] == [len(s) for s in sent]
+        counters = reporter.metrics_factory.counters
+        assert 5 == counters['jaeger.spans.reported_true']
+
+        # send after close
+        reporter.report_span(_new_span('6'))
+        assert 1 == counters['jaeger.spans.dropped_true']
+
+    def test_flush_interval(self):
+        reporter, sent, _ = self._new_reporter(batch_size=10, flush=0.005)
+        reporter.report_span(_new_span('1'))
+        assert _wait_until(lambda: len(sent) == 1)
+        assert 1 == len(sent[0])
+
+    def test_flush_interval_after_wakeup(self):
+        reporter, sent, _ = self._new_reporter(batch_size=3, flush=0.3)
+        sent_at = []
+        send = reporter._send
+
+        def timed_send(spans):
+            sent_at.append(time.time())
+            send(spans)
+
+        reporter._send = timed_send
+        reporter.report_span(_new_span('1'))
+        assert _wait_until(lambda: len(sent) == 1)
+        flushed = sent_at[0]
+        reporter.report_span(_new_span('2'))
+        # a full batch wakes the flusher shortly before the next flush
+        time.sleep(0.2)
+        for i in range(3, 6):
+            reporter.report_span(_new_span('%s' % i))
+        assert _wait_until(lambda: len(sent) == 3)
+        assert [1, 3, 1] == [len(s) for s in sent]
+        # the partial batch left over goes out with the next flush, rather
+        # than a whole flush interval after the wakeup
+        assert sent_at[2] - flushed < 0.4
+
+    def test_queue_full(self):
+        reporter, sent, _ = self._new_reporter(batch_size=10, queue_cap=10)
+        release = threading.Event()
+        send = reporter._send
+
+        def blocking_send(spans):
+            send(spans)
+            release.wait(1)
+
+        reporter._send = blocking_send
+        for i in range(10):
+            reporter.report_span(_new_span('%s' % i))
+        # the flusher is now blocked sending the first batch
+        assert _wait_until(lambda: len(sent) == 1)
+        for i in range(12):
+            reporter.report_span(_new_span('%s' % i))
+        counters = reporter.metrics_factory.counters
+        assert 2 == counters['jaeger.spans.dropped_true']
+        assert reporter.load() == (22, 2, 1.0)
+        release.set()
+        reporter.close().result(timeout=1)
+        assert [10, 10] == [len(s) for s in sent]
+        assert reporter.load() == (22, 2, 0.0)
+
+    def test_priority_shedding(self):
+        reporter, sent, _ = self._new_reporter(
+            batch_size=5, queue_cap=5, priority_shedding=True)
+        release = threading.Event()
+        send = reporter._send
+
+        def blocking_send(spans):
+            send(spans)
+            release.wait(1)
+
+        reporter._send = blocking_send
+        for i in range(5):
+            reporter.report_span(_new_span('first%d' % i, parent_id=1))
+        # the flusher is now blocked sending the first batch
+        assert _wait_until(lambda: len(sent) == 1)
+        for i in range(5):
+            reporter.report_span(_new_span('child%d' % i, parent_id=1))
+        error = _new_span('error', parent_id=1)
+        error.set_tag('error', True)
+        priority_spans = [_new_span('debug', parent_id=1, flags=3), error,
+                          _new_span('root')]
+        for span in priority_spans:
+            reporter.report_span(span)
+        reporter.report_span(_new_span('child5', parent_id=1))
+        for i in range(3):
+            reporter.report_span(_new_span('root%d' % i))
+        # with only priority spans left, the latest root spans make room
+        error2 = _new_span('error2', parent_id=1)
+        error2.set_tag('error', True)
+        for span in (_new_span('debug2', parent_id=1, flags=3), error2):
+            reporter.report_span(span)
+        counters = reporter.metrics_factory.counters
+        # child5 was dropped, the other five ordinary spans made room
+        assert 6 == counters['jaeger.reporter.spans_shed.class_ordinary']
+        # root2 was dropped, root1 and root0 made room
+        assert 3 == counters['jaeger.reporter.spans_shed.class_root']
+        assert 9 == counters['jaeger.spans.dropped_true']
+        release.set()
+        reporter.close().result(timeout=1)
+        assert [span.operation_name for span in sent[1]] == \
+            ['debug', 'debug2', 'error', 'error2', 'root']
+        assert len(sent) == 2
+
+    def test_submit_failure(self):
+        reporter, _, _ = self._new_reporter(batch_size=1)
+        reporter.error_reporter = ErrorReporter(
+            metrics=Metrics(), logger=logging.getLogger())
+        reporter._send = mock.MagicMock(side_effect=ValueError())
+        reporter.report_span(_new_span('1'))
+        reporter.close().result(timeout=1)
+        counters = reporter.metrics_factory.counters
+        assert 1 == counters['jaeger.spans.reported_false']
+
+    def test_max_batch_bytes(self):
+        size = len(zipkin_span_in_bytes(_new_span('0')))
+        reporter, sent, batches = self._new_reporter(
+            batch_size=10, max_batch_bytes=LIST_HEADER_SIZE + 2 * size + 1)
+        spans = [_new_span('%s' % i) for i in range(5)]
+        for span in spans:
+            reporter.report_span(span)
+        reporter.close().result(timeout=1)
+        assert [2, 2, 1] == [len(s) for s in sent]
+        assert batches[0] == zipkin_spans_in_bytes(spans[:2])
+
+
+def _tornado_report(spans):
+    io_loop = IOLoop()
+    reporter = ZipkinReporter(transport_handler=lambda message: None,
+                              io_loop=io_loop, batch_size=100,
+                              queue_capacity=len(spans))
+
+    @tornado.gen.coroutine
+    def report():
+        for span in spans:
+            reporter.report_span(span)
+        yield reporter.close()
+
+    io_loop.run_sync(report)
+    io_loop.close()
+
+
+def _threaded_report(spans):
+    reporter = ThreadedZipkinReporter(transport_handler=lambda message: None,
+                                      batch_size=100,
+                                      queue_capacity=len(spans))
+    for span in spans:
+        reporter.report_span(span)
+    reporter.close().result()
+
+
+def _tornado_thread_report(spans):
+    io_loop = IOLoop(make_current=False)
+    thread = threading.Thread(target=io_loop.start)
+    thread.start()
+    reporter = ZipkinReporter(transport_handler=lambda message: None,
+                              io_loop=io_loop, batch_size=100,
+                              queue_capacity=len(spans))
+    for span in spans:
+        reporter.report_span(span)
+    reporter.close().result()
+    io_loop.add_callback(io_loop.stop)
+    thread.join()
+    io_loop.close()
+
+
+def _asyncio_report(spans):
+    if asyncio is None:
+        pytest.skip('asyncio is not available')
+    loop = asyncio.new_event_loop()
+    reporter = AsyncioZipkinReporter(transport_handler=lambda message: None,
+                                     loop=loop, batch_size=100,
+                                     queue_capacity=len(spans))
+
+    def report():
+        for span in spans:
+            reporter.report_span(span)
+        reporter.close().add_done_callback(lambda _: loop.stop())
+
+    loop.call_soon(report)
+    loop.run_forever()
+    loop.close()
+
+
+@pytest.mark.parametrize('report',
+                         [_tornado_report, _tornado_thread_report,
+                          _threaded_report, _asyncio_report],
+                         ids=['tornado', 'tornado-thread', 'threaded',
+                              'asyncio'])
+def test_reporter_throughput_benchmark(benchmark, report):
+    def setup():
+        return ([_new_span('%s' % i) for i in range(1000)],), {}
+
+    benchmark.pedantic(report, setup=setup, rounds=20)
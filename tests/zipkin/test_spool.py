@@ -0,0 +1,258 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import pytest
+import tornado.gen
+from tornado.concurrent import Future
+from tornado.httpclient import HTTPError
+from tornado.ioloop import IOLoop
+from tornado.testing import AsyncTestCase, gen_test
+
+from jaeger_client_contrib.zipkin.compression import (COMPRESSION_GZIP,
+                                                      CompressedMessage)
+from jaeger_client_contrib.zipkin.reporter import (ThreadedZipkinReporter,
+                                                   ZipkinReporter)
+from jaeger_client_contrib.zipkin.spool import Spool
+
+from .test_reporter import FakeMetricsFactory, _new_span, _wait_until
+
+
+class SpoolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.metrics_factory = FakeMetricsFactory()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _new_spool(self, **kwargs):
+        kwargs.setdefault('metrics_factory', self.metrics_factory)
+        return Spool(self.directory, **kwargs)
+
+    def _segments(self, spool):
+        return sorted(name for name in os.listdir(spool.slot)
+                      if name.endswith('.spool'))
+
+    def test_fifo(self):
+        spool = self._new_spool(segment_bytes=100)
+        messages = [('batch%d' % i).encode() * 10 for i in range(5)]
+        for message in messages:
+            assert spool.append(message)
+        # each 60 byte batch starts a new segment
+        assert len(self._segments(spool)) == 5
+        assert len(spool) == 5 * 69
+        assert [spool.pop() for _ in range(5)] == messages
+        assert spool.pop() is None
+        assert not spool
+        assert self._segments(spool) == []
+        assert self.metrics_factory.gauges['jaeger.reporter.spool_bytes'] == 0
+        counters = self.metrics_factory.counters
+        assert counters['jaeger.reporter.spool_writes.result_ok'] == 5
+        assert counters['jaeger.reporter.spool_reads.result_ok'] == 5
+
+    def test_interleaved(self):
+        spool = self._new_spool(segment_bytes=1024)
+        spool.append(b'1')
+        assert spool.pop() == b'1'
+        spool.append(b'2')
+        spool.append(b'3')
+        assert spool.pop() == b'2'
+        spool.append(b'4')
+        assert [spool.pop(), spool.pop(), spool.pop()] == [b'3', b'4', None]
+
+    def test_compressed_message(self):
+        spool = self._new_spool()
+        message = CompressedMessage(b'\x1f\x8b')
+        message.content_encoding = COMPRESSION_GZIP
+        spool.append(message)
+        spool.append(b'plain')
+        popped = spool.pop()
+        assert popped == message
+        assert popped.content_encoding == COMPRESSION_GZIP
+        assert getattr(spool.pop(), 'content_encoding', None) is None
+
+    def test_max_bytes(self):
+        spool = self._new_spool(max_bytes=100, segment_bytes=50)
+        assert spool.append(b'x' * 40)
+        assert spool.append(b'x' * 40)
+        assert not spool.append(b'x' * 40)
+        assert self.metrics_factory.counters[
+            'jaeger.reporter.spool_writes.result_dropped'] == 1
+        # space is reclaimed once a whole segment has been read
+        spool.pop()
+        assert spool.append(b'x' * 40)
+        with pytest.raises(ValueError):
+            self._new_spool(max_bytes=10, segment_bytes=20)
+
+    def test_replay_after_restart(self):
+        spool = self._new_spool(segment_bytes=20)
+        for message in (b'a' * 10, b'b' * 10, b'c' * 10):
+            spool.append(message)
+        assert spool.pop() == b'a' * 10
+        spool.close()
+        assert not spool.append(b'd')
+
+        spool = self._new_spool()
+        spool.append(b'e')
+        assert [spool.pop() for _ in range(4)] == \
+            [b'b' * 10, b'c' * 10, b'e', None]
+
+    def test_shared_directory(self):
+        # e.g. prefork workers with the same reporter_spool_dir
+        first = self._new_spool(segment_bytes=20)
+        second = self._new_spool(segment_bytes=20)
+        assert first.slot != second.slot
+        first.append(b'a' * 10)
+        second.append(b'b' * 10)
+        first.append(b'c' * 10)
+        assert [second.pop(), second.pop()] == [b'b' * 10, None]
+        assert len(self._segments(first)) == 2
+
+        # a new spool takes over the segments of a closed one
+        first.close()
+        third = self._new_spool()
+        assert third.slot == first.slot
+        assert [third.pop(), third.pop(), third.pop()] == \
+            [b'a' * 10, b'c' * 10, None]
+        assert len(os.listdir(self.directory)) == 2
+        second.close()
+        third.close()
+
+    def test_torn_write(self):
+        spool = self._new_spool(segment_bytes=20)
+        spool.append(b'a' * 10)
+        spool.append(b'b' * 10)
+        spool.close()
+        first = os.path.join(spool.slot, self._segments(spool)[0])
+        with open(first, 'r+b') as f:
+            f.truncate(15)
+
+        spool = self._new_spool()
+        assert spool.pop() == b'b' * 10
+        assert self.metrics_factory.counters[
+            'jaeger.reporter.spool_reads.result_corrupt'] == 1
+
+
+class FailingTransport(object):
+    """Fails sends with the Future it returns until told to recover."""
+
+    def __init__(self):
+        self.healthy = False
+        self.sent = []
+
+    def __call__(self, message):
+        future = Future()
+        if self.healthy:
+            self.sent.append(message)
+            future.set_result(True)
+        else:
+            future.set_exception(HTTPError(599, 'brownout'))
+        return future
+
+
+class SpoolReporterTest(AsyncTestCase):
+    def setUp(self):
+        super(SpoolReporterTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.spool = Spool(self.directory)
+
+    def tearDown(self):
+        self.spool.close()
+        shutil.rmtree(self.directory)
+        super(SpoolReporterTest, self).tearDown()
+
+    @gen_test
+    def test_failed_sends_are_replayed(self):
+        transport = FailingTransport()
+        metrics_factory = FakeMetricsFactory()
+        reporter = ZipkinReporter(transport_handler=transport,
+                                  io_loop=IOLoop.current(),
+                                  batch_size=1,
+                                  metrics_factory=metrics_factory,
+                                  spool=self.spool,
+                                  spool_replay_rate=100,
+                                  spool_retry_interval=0.05)
+        for i in range(3):
+            reporter.report_span(_new_span(str(i)))
+        yield tornado.gen.sleep(0.02)
+        assert self.spool and not transport.sent
+
+        transport.healthy = True
+        for _ in range(100):
+            if len(transport.sent) == 3:
+                break
+            yield tornado.gen.sleep(0.01)
+        assert not self.spool
+        assert metrics_factory.counters['jaeger.reporter.spool_replayed'] == 3
+        yield reporter.close()
+
+    @gen_test
+    def test_replay_rate(self):
+        transport = FailingTransport()
+        transport.healthy = True
+        for i in range(20):
+            self.spool.append(str(i).encode())
+        reporter = ZipkinReporter(transport_handler=transport,
+                                  io_loop=IOLoop.current(),
+                                  spool=self.spool,
+                                  spool_replay_rate=100)
+        yield tornado.gen.sleep(0.1)
+        # allowing for the timer's jitter
+        assert 5 <= len(transport.sent) <= 15
+        assert transport.sent == [str(i).encode()
+                                  for i in range(len(transport.sent))]
+        yield reporter.close()
+
+    def test_threaded_reporter(self):
+        sent = []
+        failing = [True]
+
+        def transport(message):
+            if failing[0]:
+                raise IOError('brownout')
+            sent.append(message)
+
+        reporter = ThreadedZipkinReporter(transport_handler=transport,
+                                          batch_size=1,
+                                          spool=self.spool,
+                                          spool_replay_rate=100,
+                                          spool_retry_interval=0.01)
+        reporter.report_span(_new_span('1'))
+        _wait_until(lambda: len(self.spool))
+        failing[0] = False
+        reporter.report_span(_new_span('2'))
+        _wait_until(lambda: len(sent) == 2)
+        reporter.close().result(1)
+        assert len(sent) == 2
+        assert not self.spool
+
+    def test_threaded_reporter_flush_interval(self):
+        # not replayed for the length of the test
+        self.spool.append(b'spooled')
+        sent_at = []
+        returned = threading.Event()
+
+        def slow_transport(message):
+            sent_at.append(time.time())
+            time.sleep(0.1)
+            returned.set()
+
+        reporter = ThreadedZipkinReporter(transport_handler=slow_transport,
+                                          batch_size=10,
+                                          flush_interval=0.05,
+                                          spool=self.spool,
+                                          spool_replay_rate=0.5)
+        reporter.report_span(_new_span('1'))
+        assert returned.wait(1)
+        # the next flush is already due when the slow send returns, the
+        # flusher must not wait for the next spool replay instead
+        time.sleep(0.01)
+        reported = time.time()
+        reporter.report_span(_new_span('2'))
+        assert _wait_until(lambda: len(sent_at) == 2)
+        assert sent_at[1] - reported < 0.5
+        reporter.close().result(1)
@@ -0,0 +1,150 @@
+import time
+
+import mock
+import pytest
+from jaeger_client import Span, SpanContext
+from jaeger_client.reporter import InMemoryReporter
+
+from jaeger_client_contrib.zipkin.tail_sampling import TailSamplingReporter
+
+from .test_reporter import FakeMetricsFactory, FakeTrace
+
+TRACER = FakeTrace(ip_address='127.0.0.1', service_name='tail_test')
+
+
+def _span(trace_id, span_id, parent_id=None, duration=0.001, flags=1):
+    ctx = SpanContext(trace_id=trace_id, span_id=span_id,
+                      parent_id=parent_id, flags=flags)
+    span = Span(context=ctx, tracer=TRACER, operation_name=str(span_id))
+    span.start_time = time.time()
+    span.end_time = span.start_time + duration
+    return span
+
+
+def _trace(trace_id, children=2, **kwargs):
+    """The spans of a local trace, in the order they finish."""
+    spans = [_span(trace_id, i + 2, parent_id=1) for i in range(children)]
+    return spans + [_span(trace_id, 1, **kwargs)]
+
+
+def _new_reporter(**kwargs):
+    downstream = InMemoryReporter()
+    metrics_factory = FakeMetricsFactory()
+    reporter = TailSamplingReporter(downstream,
+                                    metrics_factory=metrics_factory,
+                                    **kwargs)
+    return reporter, downstream, metrics_factory.counters
+
+
+def _report(reporter, spans):
+    for span in spans:
+        reporter.report_span(span)
+
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        TailSamplingReporter(None, probability=1.5)
+    with pytest.raises(ValueError):
+        TailSamplingReporter(None, max_spans_per_trace=0)
+
+
+def test_decides_when_local_root_finishes():
+    reporter, downstream, counters = _new_reporter(latency_threshold=0.5)
+    ordinary = _trace(1)
+    _report(reporter, ordinary)
+    error = _trace(2)
+    error[0].set_tag('error', True)
+    slow = _trace(3, duration=1)
+    debug = _trace(4, flags=3)
+    for spans in (error, slow, debug):
+        forwarded = len(downstream.get_spans())
+        _report(reporter, spans[:-1])
+        assert len(downstream.get_spans()) == forwarded
+        reporter.report_span(spans[-1])
+    assert downstream.get_spans() == error + slow + debug
+    assert counters['jaeger.tail_sampling.traces.decision_kept'] == 3
+    assert counters['jaeger.tail_sampling.traces.decision_discarded'] == 1
+    assert counters['jaeger.tail_sampling.spans.decision_discarded'] == 3
+
+
+def test_probability_follows_trace_id():
+    reporter, downstream, _ = _new_reporter(probability=0.5)
+    kept = _trace(((1 << 63) - 10) | (5 << 64))
+    _report(reporter, kept)
+    _report(reporter, _trace((1 << 63) + 10))
+    assert downstream.get_spans() == kept
+
+
+def test_late_spans_follow_decision():
+    reporter, downstream, counters = _new_reporter(max_traces=2)
+    kept = _trace(1, children=0, flags=3)
+    _report(reporter, kept)
+    _report(reporter, _trace(2, children=0))
+    late = _span(1, 2, parent_id=1)
+    reporter.report_span(late)
+    reporter.report_span(_span(2, 2, parent_id=1))
+    assert downstream.get_spans() == kept + [late]
+    assert counters['jaeger.tail_sampling.spans.decision_discarded'] == 2
+    # decisions are forgotten beyond max_traces
+    _report(reporter, _trace(3, children=0))
+    reporter.report_span(_span(1, 3, parent_id=1))
+    assert 1 in reporter._traces
+
+
+def test_max_spans_per_trace():
+    reporter, downstream, counters = _new_reporter(max_spans_per_trace=3)
+    spans = _trace(1, children=5, flags=3)
+    _report(reporter, spans)
+    # the local root is never dropped, it replaces the last child kept
+    assert downstream.get_spans() == spans[:2] + spans[-1:]
+    assert counters[
+        'jaeger.tail_sampling.spans_evicted.reason_max_spans_per_trace'] == 3
+    assert counters['jaeger.tail_sampling.spans.decision_kept'] == 3
+    assert not reporter._buffered
+
+
+def test_max_traces():
+    reporter, downstream, counters = _new_reporter(max_traces=2)
+    error = _span(1, 2, parent_id=1)
+    error.set_tag('error', True)
+    reporter.report_span(error)
+    reporter.report_span(_span(2, 2, parent_id=1))
+    # the oldest trace is decided early on its spans so far
+    reporter.report_span(_span(3, 2, parent_id=1))
+    assert downstream.get_spans() == [error]
+    assert list(reporter._traces) == [2, 3]
+    assert counters[
+        'jaeger.tail_sampling.spans_evicted.reason_max_traces'] == 1
+
+
+def test_max_spans():
+    reporter, downstream, counters = _new_reporter(max_spans=4)
+    _report(reporter, _trace(1, children=3)[:-1])
+    _report(reporter, _trace(2, children=2)[:-1])
+    assert list(reporter._traces) == [2]
+    assert reporter._buffered == 2
+    assert counters['jaeger.tail_sampling.spans_evicted.reason_max_spans'] == 3
+
+
+def test_max_trace_age():
+    reporter, downstream, counters = _new_reporter(max_trace_age=10)
+    now = time.time()
+    with mock.patch('time.time', return_value=now):
+        reporter.report_span(_span(1, 2, parent_id=1))
+    with mock.patch('time.time', return_value=now + 5):
+        reporter.report_span(_span(2, 2, parent_id=1))
+    with mock.patch('time.time', return_value=now + 11):
+        reporter.report_span(_span(3, 2, parent_id=1))
+    assert list(reporter._traces) == [2, 3]
+    assert counters[
+        'jaeger.tail_sampling.spans_evicted.reason_max_trace_age'] == 1
+
+
+def test_close():
+    reporter, downstream, _ = _new_reporter()
+    debug = _span(1, 2, parent_id=1, flags=3)
+    reporter.report_span(debug)
+    reporter.report_span(_span(2, 2, parent_id=1))
+    assert reporter.close().result() is True
+    assert downstream.get_spans() == [debug]
+    assert not reporter._traces